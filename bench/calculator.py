@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Calculator throughput benchmark.
+
+Compares the previous restricted `eval` of the expression string (kept here as
+the reference implementation) with the cached AST-compiled evaluator, checks
+that both return the same values, checks that the NumPy mode either evaluates
+or rejects (with ValueError) every calculator function, and measures the NumPy
+mode that evaluates one expression over whole arrays.
+
+Usage:
+    python -m bench.calculator [--expressions 20000] [--distinct 200] [--array-size 100000]
+"""
+import sys
+import math
+import time
+import random
+import argparse
+import os
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.tools import CalculatorTool, MATH_FUNCTIONS, compile_expression, evaluate_expression
+
+
+def eval_reference(expression):
+    """The calculator's previous evaluation: restricted eval, parsed on every call."""
+    allowed_names = {'math': math, 'abs': abs, 'pow': pow, 'round': round}
+    return eval(expression, {"__builtins__": {}}, allowed_names)
+
+
+def random_expression(rng):
+    """A small arithmetic expression like those the calculator sees."""
+    terms = []
+    for _ in range(rng.randint(2, 5)):
+        number = rng.randint(1, 999)
+        terms.append(f"math.sqrt({number})" if rng.random() < 0.2 else str(number))
+    operators = [rng.choice("+-*/") for _ in terms[1:]]
+    return terms[0] + "".join(f" {op} {term}" for op, term in zip(operators, terms[1:]))
+
+
+def array_mode_failures(tool):
+    """Calculator functions the NumPy mode accepts but then fails to evaluate."""
+    x = np.linspace(0.1, 0.9, 5)
+    failures = []
+    for name in MATH_FUNCTIONS:
+        arguments = "x, x" if name in ("hypot", "pow", "min", "max") else "x"
+        try:
+            tool.evaluate_array(f"{name}({arguments})", x=x)
+        except ValueError:
+            pass  # Not available element-wise, and reported as such
+        except Exception as e:
+            failures.append(f"{name}: {type(e).__name__}: {e}")
+    return failures
+
+
+def per_second(fn, items):
+    """Return how many items per second `fn` processes."""
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return len(items) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calculator throughput benchmark")
+    parser.add_argument("--expressions", type=int, default=20000, help="Number of expressions evaluated")
+    parser.add_argument("--distinct", type=int, default=200, help="Number of distinct expressions among them")
+    parser.add_argument("--array-size", type=int, default=100000, help="Elements per array in the NumPy mode")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    distinct = [random_expression(rng) for _ in range(args.distinct)]
+    expressions = [rng.choice(distinct) for _ in range(args.expressions)]
+
+    mismatches = [e for e in distinct if not math.isclose(eval_reference(e), evaluate_expression(e))]
+    if mismatches:
+        print(f"Results differ for: {mismatches}")
+        return 1
+
+    tool = CalculatorTool()
+    failures = array_mode_failures(tool)
+    if failures:
+        print(f"Array mode fails for: {failures}")
+        return 1
+
+    compile_expression.cache_clear()
+    reference = per_second(eval_reference, expressions)
+    compiled = per_second(evaluate_expression, expressions)
+    start = time.perf_counter()
+    tool.run_batch(expressions)
+    batch = len(expressions) / (time.perf_counter() - start)
+
+    print(f"{'mode':<28} {'expr/s':>12} {'speed-up':>9}")
+    print(f"{'eval (reference)':<28} {reference:>12,.0f} {1.0:>8.1f}x")
+    print(f"{'AST compiled, cached':<28} {compiled:>12,.0f} {compiled / reference:>8.1f}x")
+    print(f"{'CalculatorTool.run_batch':<28} {batch:>12,.0f} {batch / reference:>8.1f}x")
+
+    x = np.linspace(1, 1000, args.array_size)
+    y = np.linspace(-5, 5, args.array_size)
+    expression = "sqrt(x) * 2 + y ** 2 / 3"
+    start = time.perf_counter()
+    tool.evaluate_array(expression, x=x, y=y)
+    vectorized = args.array_size / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for a, b in zip(x[:10000], y[:10000]):
+        evaluate_expression(expression, x=a, y=b)
+    scalar = 10000 / (time.perf_counter() - start)
+    print(f"{'array mode (scalar loop)':<28} {scalar:>12,.0f} {1.0:>8.1f}x")
+    print(f"{'array mode (NumPy)':<28} {vectorized:>12,.0f} {vectorized / scalar:>8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Deadline, timeout and hedging checks against the local stub LLM.
+
+Runs the Agent and LLMIntegration against FakeBackend (no network calls) and
+checks that:
+  - a stuck backend is abandoned once the caller's deadline has passed;
+  - timeouts caused by callers' deadlines don't open the shared circuit breaker,
+    while per-attempt timeouts on a stuck backend do;
+  - a query without a deadline doesn't inherit the deadline of an identical
+    in-flight query it joins;
+  - hedged requests cut the tail latency of a heavy-tailed backend.
+
+Usage:
+    python -m bench.deadlines
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import Document
+from src.vector_store import VectorStore
+from src.llm_backends import FakeBackend
+from src.llm_integration import LLMIntegration
+from src.circuit_breaker import CircuitBreaker
+from src.agent import Agent
+
+TIME_LIMIT_ANSWER = "I couldn't generate a response within the time limit. Please try again."
+
+DOCUMENTS = [
+    "The project indexes documents with FAISS and answers questions with an LLM.",
+    "Retrieval embeds the query and searches the index for the closest chunks.",
+    "A circuit breaker stops calling the LLM while it keeps failing.",
+]
+
+
+def make_agent(vector_store, backend, **llm_options):
+    """An agent on its own circuit breaker, always calling the LLM."""
+    llm = LLMIntegration(backend=backend, circuit_breaker=CircuitBreaker(), **llm_options)
+    return Agent(vector_store, llm, adaptive_retrieval=False)
+
+
+def check_stuck_backend(vector_store):
+    """A backend that never answers in time is abandoned at the deadline."""
+    agent = make_agent(vector_store, FakeBackend(latency=5.0, latency_distribution="constant"))
+    start = time.perf_counter()
+    result = agent.process_query("What does the project index?", deadline=1.0)
+    elapsed = time.perf_counter() - start
+    return elapsed < 1.5 and result["answer"] == TIME_LIMIT_ANSWER, f"answered in {elapsed:.2f} s"
+
+
+def check_deadlines_keep_breaker_closed(vector_store):
+    """Callers running out of their own time don't count as backend failures."""
+    agent = make_agent(vector_store, FakeBackend(latency=0.3, latency_distribution="constant"))
+    for index in range(5):
+        agent.process_query(f"What does retrieval search {index}?", deadline=0.1)
+    result = agent.process_query("What does retrieval search?")
+    state = agent.llm.circuit_breaker.state
+    return state == "closed" and not result.get("degraded"), f"breaker {state} after 5 tiny deadlines"
+
+
+def check_attempt_timeouts_open_breaker(vector_store):
+    """Per-attempt timeouts on a stuck backend do count, so the breaker opens."""
+    agent = make_agent(vector_store, FakeBackend(latency=0.5, latency_distribution="constant"),
+                       attempt_timeout=0.1)
+    result = agent.process_query("What stops calling the LLM?")
+    state = agent.llm.circuit_breaker.state
+    return state == "open" and result.get("degraded", False), f"breaker {state}"
+
+
+def check_follower_keeps_own_deadline(vector_store):
+    """An identical query without a deadline isn't cut short by a concurrent one with a deadline."""
+    agent = make_agent(vector_store, FakeBackend(latency=1.0, latency_distribution="constant"))
+    results = {}
+
+    def ask(name, deadline):
+        results[name] = agent.process_query("What does the project index?", deadline=deadline)
+
+    leader = threading.Thread(target=ask, args=("leader", 0.5))
+    leader.start()
+    time.sleep(0.1)
+    ask("follower", None)
+    leader.join()
+    follower_answered = results["follower"]["answer"] != TIME_LIMIT_ANSWER
+    leader_timed_out = results["leader"]["answer"] == TIME_LIMIT_ANSWER
+    return follower_answered and leader_timed_out, (f"leader timed out: {leader_timed_out}, "
+                                                    f"follower answered: {follower_answered}")
+
+
+def p99(samples):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+
+
+def check_hedging_cuts_tail(queries=200):
+    """Hedged requests lower the p99 latency of a heavy-tailed backend."""
+    tails = {}
+    for hedge in (False, True):
+        backend = FakeBackend(latency=0.02, latency_jitter=1.0, latency_distribution="lognormal",
+                              tokens_per_second=1e6, seed=1)
+        llm = LLMIntegration(backend=backend, circuit_breaker=CircuitBreaker(), hedge_requests=hedge)
+        samples = []
+        for index in range(queries):
+            start = time.perf_counter()
+            llm.answer_from_context(f"Question {index}?", "Some context.")
+            samples.append(time.perf_counter() - start)
+        tails[hedge] = (p99(samples), backend.calls)
+    (plain, plain_calls), (hedged, hedged_calls) = tails[False], tails[True]
+    return hedged < plain, (f"p99 {plain * 1000:.0f} ms -> {hedged * 1000:.0f} ms with "
+                            f"{hedged_calls - plain_calls} extra calls")
+
+
+def main():
+    vector_store = VectorStore()
+    vector_store.create_vector_store([Document(page_content=text, metadata={"source": f"doc{index}"})
+                                      for index, text in enumerate(DOCUMENTS)])
+    checks = [
+        ("stuck backend abandoned at the deadline", lambda: check_stuck_backend(vector_store)),
+        ("caller deadlines keep the breaker closed", lambda: check_deadlines_keep_breaker_closed(vector_store)),
+        ("attempt timeouts open the breaker", lambda: check_attempt_timeouts_open_breaker(vector_store)),
+        ("follower keeps its own deadline", lambda: check_follower_keeps_own_deadline(vector_store)),
+        ("hedging cuts the tail", check_hedging_cuts_tail),
+    ]
+
+    failures = 0
+    for name, check in checks:
+        passed, detail = check()
+        failures += not passed
+        print(f"{'PASS' if passed else 'FAIL'}  {name:<42} {detail}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Intent routing benchmark.
+
+Routes a labelled set of queries with the keyword router and the embedding
+router and reports the accuracy and latency of each. The embedding router's
+time is split into the query embedding (which the RAG workflow computes anyway
+and reuses for retrieval) and the routing step itself.
+
+Usage:
+    python -m bench.intent_routing [--model sentence-transformers/all-MiniLM-L6-v2] [--repeat 20]
+"""
+import os
+import sys
+import time
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.router import KeywordRouter, EmbeddingRouter
+from bench.routing import CALCULATOR_KEYWORDS, DICTIONARY_KEYWORDS, RAG_OVERRIDE_KEYWORDS, DOMAIN_TERMS
+
+# Held-out queries, none of which appear in INTENT_EXAMPLES
+LABELLED_QUERIES = [
+    ("What is 48 / 6?", "calculator"),
+    ("calculate 12 percent of 560", "calculator"),
+    ("What's the square root of 81?", "calculator"),
+    ("Add 1250 and 3400", "calculator"),
+    ("How much is 15 multiplied by 15?", "calculator"),
+    ("What is 2 to the power of 10?", "calculator"),
+    ("subtract 99 from 1000", "calculator"),
+    ("What is the product of 8 and 13?", "calculator"),
+    ("Define photosynthesis", "dictionary"),
+    ("What is the meaning of melancholy?", "dictionary"),
+    ("What does the word gregarious mean?", "dictionary"),
+    ("definition of altruism", "dictionary"),
+    ("Explain the term opportunity cost", "dictionary"),
+    ("What does verbose mean?", "dictionary"),
+    ("meaning of the word candid", "dictionary"),
+    ("Give me the definition of empathy", "dictionary"),
+    ("What is the project about?", "rag"),
+    ("Who wrote this report?", "rag"),
+    ("Summarize the introduction of the paper", "rag"),
+    ("What database does the system use?", "rag"),
+    ("Which skills are mentioned in the resume?", "rag"),
+    ("What are the limitations discussed in the document?", "rag"),
+    ("How is the data pipeline structured?", "rag"),
+    ("What results did the experiments show?", "rag"),
+    ("Describe the deployment setup of the application", "rag"),
+    ("What future work does the author propose?", "rag"),
+]
+
+
+def report(name, predictions, seconds_per_query):
+    """Print accuracy, per-intent recall and latency for one router."""
+    correct = sum(predicted == label for (_, label), predicted in zip(LABELLED_QUERIES, predictions))
+    totals = Counter(label for _, label in LABELLED_QUERIES)
+    hits = Counter(label for (_, label), predicted in zip(LABELLED_QUERIES, predictions) if predicted == label)
+    recall = ", ".join(f"{label} {hits[label]}/{totals[label]}" for label in sorted(totals))
+    print(f"{name:<22} accuracy {correct}/{len(LABELLED_QUERIES)} ({correct / len(LABELLED_QUERIES):.0%})  "
+          f"[{recall}]  {seconds_per_query * 1e6:.1f} us/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intent routing benchmark")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2",
+                        help="Hugging Face embedding model")
+    parser.add_argument("--repeat", type=int, default=20, help="Timing repetitions over the labelled set")
+    parser.add_argument("--verbose", action="store_true", help="List misrouted queries")
+    args = parser.parse_args()
+
+    from langchain.embeddings import HuggingFaceEmbeddings
+    embedding_model = HuggingFaceEmbeddings(model_name=args.model)
+
+    queries = [query for query, _ in LABELLED_QUERIES]
+    runs = args.repeat * len(queries)
+
+    keyword_router = KeywordRouter(CALCULATOR_KEYWORDS, DICTIONARY_KEYWORDS, RAG_OVERRIDE_KEYWORDS, DOMAIN_TERMS)
+    keyword_predictions = [keyword_router.route(query) for query in queries]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for query in queries:
+            keyword_router.route(query)
+    report("keywords", keyword_predictions, (time.perf_counter() - start) / runs)
+
+    start = time.perf_counter()
+    embedding_router = EmbeddingRouter(embedding_model)
+    print(f"Embedding router built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    start = time.perf_counter()
+    embeddings = [embedding_model.embed_query(query) for query in queries]
+    embed_seconds = (time.perf_counter() - start) / len(queries)
+
+    embedding_predictions = [embedding_router.route(query, embedding) for query, embedding in zip(queries, embeddings)]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for query, embedding in zip(queries, embeddings):
+            embedding_router.route(query, embedding)
+    report("embedding", embedding_predictions, (time.perf_counter() - start) / runs)
+    print(f"{'':<22} plus {embed_seconds * 1000:.1f} ms/query to embed (reused for retrieval on RAG queries)")
+
+    if args.verbose:
+        for name, predictions in (("keywords", keyword_predictions), ("embedding", embedding_predictions)):
+            for (query, label), predicted in zip(LABELLED_QUERIES, predictions):
+                if predicted != label:
+                    print(f"  {name}: {query!r} -> {predicted} (expected {label})")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Routing micro-benchmark.
+
+Compares the compiled KeywordRouter against the previous per-keyword loops
+(kept here as the reference implementation), checks that both make the same
+decision for every query, and reports the time per query as the keyword lists
+grow.
+
+Usage:
+    python -m bench.routing [--terms 0 1000 5000] [--queries 2000]
+"""
+import re
+import sys
+import time
+import random
+import argparse
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.router import KeywordRouter, DOC_PHRASES, DOC_CONTEXT_PHRASES
+
+CALCULATOR_KEYWORDS = [
+    "calculate", "compute", "sum", "difference", "product",
+    "divide", "multiply", "add", "subtract", "plus", "minus",
+    "times", "divided by", "square root", "power", "percentage"
+]
+
+DICTIONARY_KEYWORDS = [
+    "define", "meaning of", "definition of", "explain the term",
+    "what does the term", "what is the definition"
+]
+
+RAG_OVERRIDE_KEYWORDS = [
+    "project", "about", "soulmesh", "vijval", "resume", "shah",
+    "author", "creator", "founder", "developer", "team",
+    "document", "pdf", "file", "text", "content", "paper", "report",
+    "article", "research", "publication", "book", "chapter",
+    "artificial intelligence", "ai", "blockchain", "cloud computing",
+    "machine learning", "ml", "deep learning", "nlp", "natural language processing",
+    "technology", "architecture", "framework", "algorithm", "system",
+    "protocol", "platform", "infrastructure", "application", "software",
+    "hardware", "device", "network", "database", "data"
+]
+
+DOMAIN_TERMS = ["pl/sql", "sql", "code", "programming", "blockchain", "ai", "cloud computing"]
+
+QUERIES = [
+    "What is 25 * 4?", "calculate the square root of 16", "What is the sum of 3 and 5",
+    "Define serendipity", "What is the meaning of ephemeral?", "meaning of life",
+    "What is the definition of entropy", "Who is the founder of the project?",
+    "Tell me about the architecture", "What is mentioned in the document about cloud?",
+    "How does the consensus protocol work?", "What is a mutex", "explain the term idempotent",
+    "Summarize the key findings", "what does the term latency mean", "Is 10 / 2 equal to five?",
+    "What happens when you multiply matrices", "Who is Ada Lovelace?", "Describe the results section",
+]
+
+
+class LoopRouter:
+    """The routing logic as it was before KeywordRouter: one scan per keyword per query."""
+
+    def __init__(self, calculator_keywords, dictionary_keywords, rag_override_keywords, domain_terms):
+        self.calculator_keywords = calculator_keywords
+        self.dictionary_keywords = dictionary_keywords
+        self.rag_override_keywords = rag_override_keywords
+        self.domain_terms = domain_terms
+
+    def route(self, query):
+        if any(term in query.lower() for term in self.domain_terms):
+            return "rag"
+        if self.is_calculation(query):
+            return "calculator"
+        if self.is_definition(query):
+            return "dictionary"
+        return "rag"
+
+    def is_calculation(self, query):
+        query_lower = query.lower()
+        if re.search(r'\d+\s*[\+\-\*/]\s*\d+', query_lower):
+            return True
+        for keyword in self.calculator_keywords:
+            if keyword in query_lower:
+                if re.search(r'\b' + re.escape(keyword) + r'\b', query_lower):
+                    return True
+        return False
+
+    def is_definition(self, query):
+        query_lower = query.lower()
+        for override in self.rag_override_keywords:
+            if override.lower() in query_lower:
+                return False
+        for phrase in DOC_PHRASES:
+            if phrase in query_lower:
+                return False
+        if re.search(r'\bwhat\s+is\b', query_lower) or re.search(r'\bwho\s+is\b', query_lower):
+            if any(ctx in query_lower for ctx in DOC_CONTEXT_PHRASES):
+                return False
+            for override in self.rag_override_keywords:
+                if override.lower() in query_lower:
+                    return False
+            if "about" in query_lower and not any(kw in query_lower for kw in self.dictionary_keywords):
+                return False
+            for keyword in self.dictionary_keywords:
+                if keyword in query_lower:
+                    return True
+            return False
+        for keyword in self.dictionary_keywords:
+            if re.search(r'\b' + re.escape(keyword) + r'\b', query_lower):
+                keyword_pos = query_lower.find(keyword)
+                remainder = query_lower[keyword_pos + len(keyword):]
+                if not any(override.lower() in remainder for override in self.rag_override_keywords):
+                    return True
+        return False
+
+
+def synthetic_terms(count, rng):
+    """Generate made-up multi-word domain terms that do not occur in the queries."""
+    syllables = ["zor", "qua", "vex", "plim", "trak", "nox", "brel", "quiv", "dax", "jup"]
+    terms = set()
+    while len(terms) < count:
+        words = ["".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+                 for _ in range(rng.randint(1, 3))]
+        terms.add(" ".join(words))
+    return sorted(terms)
+
+
+def time_router(router, queries):
+    """Return the mean routing time per query in microseconds."""
+    start = time.perf_counter()
+    for query in queries:
+        router.route(query)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Routing micro-benchmark")
+    parser.add_argument("--terms", type=int, nargs="+", default=[0, 1000, 5000],
+                        help="Number of extra domain terms added to the override and domain lists")
+    parser.add_argument("--queries", type=int, default=2000, help="Number of queries routed per measurement")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    queries = [rng.choice(QUERIES) for _ in range(args.queries)]
+
+    print(f"{'extra terms':>12} {'compile ms':>11} {'loop us/q':>10} {'compiled us/q':>14} {'speed-up':>9}")
+    for count in args.terms:
+        extra = synthetic_terms(count, rng)
+        lists = (CALCULATOR_KEYWORDS, DICTIONARY_KEYWORDS, RAG_OVERRIDE_KEYWORDS + extra, DOMAIN_TERMS + extra)
+
+        loop = LoopRouter(*lists)
+        start = time.perf_counter()
+        compiled = KeywordRouter(*lists)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        mismatches = [q for q in QUERIES if loop.route(q) != compiled.route(q)]
+        if mismatches:
+            print(f"Routing differs for: {mismatches}")
+            return 1
+
+        loop_us = time_router(loop, queries)
+        compiled_us = time_router(compiled, queries)
+        print(f"{count:>12} {compile_ms:>11.1f} {loop_us:>10.1f} {compiled_us:>14.1f} {loop_us / compiled_us:>8.1f}x")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Speculative retrieval benchmark.
+
+Runs the same queries through an Agent with and without speculative retrieval
+and reports the mean wall-clock time of each stage. Set LLM_BACKEND=fake to
+run offline with a simulated LLM.
+
+Usage:
+    LLM_BACKEND=fake python -m bench.speculation [--data data] [--repeat 5] [--router keywords]
+"""
+import os
+import sys
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.document_loader import DocumentLoader
+from src.vector_store import VectorStore
+from src.llm_integration import LLMIntegration
+from src.agent import Agent
+
+QUERIES = [
+    "What is the project about?",
+    "Summarize the main technologies used",
+    "Who is the author?",
+    "What is 125 * 16?",
+    "calculate the square root of 2025",
+]
+
+STAGES = ["routing", "retrieval", "retrieval_wait", "tool", "compression", "packing", "llm", "total"]
+
+
+def run(agent, queries, repeat):
+    """Process every query `repeat` times and return mean stage times per workflow, in milliseconds."""
+    totals = defaultdict(lambda: defaultdict(float))
+    counts = defaultdict(int)
+    for _ in range(repeat):
+        for query in queries:
+            result = agent._run_workflow(query)
+            counts[result["workflow"]] += 1
+            for stage, seconds in result["timings"].items():
+                totals[result["workflow"]][stage] += seconds
+    return {workflow: {stage: totals[workflow][stage] / counts[workflow] * 1000 for stage in totals[workflow]}
+            for workflow in counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speculative retrieval benchmark")
+    parser.add_argument("--data", default="data", help="Directory of documents to index")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the queries per mode")
+    parser.add_argument("--router", choices=["keywords", "embedding"], default="keywords", help="Routing mode")
+    args = parser.parse_args()
+
+    vector_store = VectorStore()
+    vector_store.create_vector_store(DocumentLoader(args.data).load_documents())
+    llm = LLMIntegration()
+
+    results = {}
+    for speculative in (False, True):
+        agent = Agent(vector_store, llm, routing=args.router, speculative=speculative)
+        agent._run_workflow(QUERIES[0])  # warm up
+        results[speculative] = run(agent, QUERIES, args.repeat)
+
+    print(f"\nMean stage times in ms ({args.repeat} passes, {args.router} routing)")
+    print(f"{'workflow':<11} {'stage':<15} {'serial':>9} {'speculative':>12}")
+    for workflow in sorted(results[False]):
+        for stage in STAGES:
+            serial = results[False][workflow].get(stage)
+            speculative = results[True].get(workflow, {}).get(stage)
+            if serial is None and speculative is None:
+                continue
+            serial_text = f"{serial:.2f}" if serial is not None else "-"
+            speculative_text = f"{speculative:.2f}" if speculative is not None else "-"
+            print(f"{workflow:<11} {stage:<15} {serial_text:>9} {speculative_text:>12}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
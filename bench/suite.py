@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite.
+
+Generates a synthetic corpus of text documents and measures each stage of the
+pipeline on it: DocumentLoader ingest, chunk embedding, FAISS index build,
+VectorStore.retrieve latency and Agent.process_query latency with a local stub
+LLM (no network calls). Results are written as JSON, together with the commit
+and host they were measured on, so runs can be compared.
+
+Usage:
+    python -m bench.suite [--documents 200] [--words 800] [--queries 200] [--output benchmark.json]
+    python main.py --benchmark [--output benchmark.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.metrics import LatencyHistogram
+
+SYLLABLES = ["ka", "lo", "mi", "ren", "sa", "tor", "vel", "qu", "ix", "zan", "bor", "eth", "nu", "pra", "dol"]
+
+
+def synthetic_vocabulary(size, rng):
+    """Distinct pseudo-words, so the corpus doesn't depend on any language resources."""
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def generate_corpus(directory, documents, words_per_document, seed=0):
+    """
+    Write a synthetic corpus of .txt documents.
+
+    Each document is about a few topic words that recur through its sentences, so
+    that queries built from those words have a clear best match.
+
+    Args:
+        directory (str): Directory to write the documents to.
+        documents (int): Number of documents.
+        words_per_document (int): Approximate length of each document in words.
+        seed (int): Random seed.
+
+    Returns:
+        list: The topic words of each document, for building queries.
+    """
+    rng = random.Random(seed)
+    vocabulary = synthetic_vocabulary(2000, rng)
+    os.makedirs(directory, exist_ok=True)
+    topics = []
+    for index in range(documents):
+        topic = rng.sample(vocabulary, 3)
+        sentences, count = [], 0
+        while count < words_per_document:
+            sentence = [rng.choice(topic) if rng.random() < 0.2 else rng.choice(vocabulary)
+                        for _ in range(rng.randint(8, 20))]
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            count += len(sentence)
+        # Paragraphs of five sentences
+        paragraphs = [" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+        with open(os.path.join(directory, f"doc_{index:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(paragraphs))
+        topics.append(topic)
+    return topics
+
+
+def latency_stats(samples):
+    """count, mean, p50, p95 and p99 of latency samples, in milliseconds."""
+    histogram = LatencyHistogram(window=max(1, len(samples)))
+    for seconds in samples:
+        histogram.add(seconds)
+    summary = histogram.summary()
+    return {"count": summary["count"], **{f"{key}_ms": summary[key] * 1000 for key in ("mean", "p50", "p95", "p99")}}
+
+
+def git_commit():
+    """The commit being measured, if this is a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(documents=200, words_per_document=800, queries=200, llm_latency=0.0, seed=0, corpus_dir=None):
+    """
+    Run every benchmark and return the results.
+
+    Args:
+        documents (int): Number of synthetic documents.
+        words_per_document (int): Approximate length of each document in words.
+        queries (int): Number of retrieval and end-to-end queries.
+        llm_latency (float): Simulated LLM time to first token in seconds.
+        seed (int): Random seed.
+        corpus_dir (str): Keep the generated corpus in this directory instead of a temporary one.
+
+    Returns:
+        dict: Configuration, host, commit and per-stage results.
+    """
+    # Imported here so that main.py can offer the suite's options without loading the models
+    from src.document_loader import DocumentLoader
+    from src.vector_store import VectorStore
+    from src.llm_backends import FakeBackend
+    from src.llm_integration import LLMIntegration
+    from src.agent import Agent
+
+    rng = random.Random(seed)
+    directory = corpus_dir or tempfile.mkdtemp(prefix="rag_qa_bench_")
+    results = {}
+    try:
+        start = time.perf_counter()
+        topics = generate_corpus(directory, documents, words_per_document, seed)
+        corpus_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        results["corpus"] = {"documents": documents, "bytes": corpus_bytes,
+                             "generation_seconds": time.perf_counter() - start}
+
+        start = time.perf_counter()
+        chunks = DocumentLoader(directory).load_documents()
+        seconds = time.perf_counter() - start
+        results["ingest"] = {"seconds": seconds, "chunks": len(chunks), "documents_per_second": documents / seconds,
+                             "megabytes_per_second": corpus_bytes / seconds / 1e6}
+
+        vector_store = VectorStore()
+        start = time.perf_counter()
+        embeddings = vector_store.embedding_model.embed_documents([chunk.page_content for chunk in chunks])
+        seconds = time.perf_counter() - start
+        results["embedding"] = {"seconds": seconds, "chunks_per_second": len(chunks) / seconds}
+
+        start = time.perf_counter()
+        vector_store.create_vector_store(chunks, embeddings)
+        results["index_build"] = {"seconds": time.perf_counter() - start, "vectors": len(chunks)}
+
+        # Queries about one document's topic words each, all distinct
+        questions = [f"What does the text say about {' and '.join(rng.sample(topic, 2))} ({index})?"
+                     for index, topic in enumerate(rng.choice(topics) for _ in range(queries))]
+
+        samples = []
+        for question in questions:
+            start = time.perf_counter()
+            vector_store.retrieve(question, top_k=3)
+            samples.append(time.perf_counter() - start)
+        results["retrieval"] = latency_stats(samples)
+
+        backend = FakeBackend(latency=llm_latency, latency_distribution="constant", tokens_per_second=1e6)
+        # Fixed top-k, so that every query goes through compression, packing and the LLM
+        agent = Agent(vector_store, LLMIntegration(backend=backend), adaptive_retrieval=False)
+        samples = []
+        for question in questions:
+            start = time.perf_counter()
+            agent.process_query(question)
+            samples.append(time.perf_counter() - start)
+        results["end_to_end"] = dict(latency_stats(samples), llm_latency_seconds=llm_latency)
+    finally:
+        if corpus_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "host": {"platform": platform.platform(), "machine": platform.machine(),
+                 "python": platform.python_version(), "cpu_count": os.cpu_count()},
+        "config": {"documents": documents, "words_per_document": words_per_document, "queries": queries,
+                   "llm_latency": llm_latency, "seed": seed},
+        "results": results,
+    }
+
+
+def format_report(report):
+    """One line per stage, for the terminal."""
+    results = report["results"]
+    lines = [
+        f"corpus       {results['corpus']['documents']} documents, {results['corpus']['bytes'] / 1e6:.1f} MB",
+        f"ingest       {results['ingest']['seconds']:.2f} s, {results['ingest']['chunks']} chunks, "
+        f"{results['ingest']['megabytes_per_second']:.2f} MB/s",
+        f"embedding    {results['embedding']['seconds']:.2f} s, {results['embedding']['chunks_per_second']:.1f} chunks/s",
+        f"index build  {results['index_build']['seconds'] * 1000:.1f} ms for {results['index_build']['vectors']} vectors",
+    ]
+    for stage in ("retrieval", "end_to_end"):
+        stats = results[stage]
+        lines.append(f"{stage:<12} p50 {stats['p50_ms']:.2f} ms, p95 {stats['p95_ms']:.2f} ms, "
+                     f"p99 {stats['p99_ms']:.2f} ms over {stats['count']} queries")
+    return "\n".join(lines)
+
+
+def add_arguments(parser):
+    """Add the suite's options to an argument parser."""
+    parser.add_argument("--documents", type=int, default=200, help="Number of synthetic documents")
+    parser.add_argument("--words", type=int, default=800, help="Approximate words per document")
+    parser.add_argument("--queries", type=int, default=200, help="Number of retrieval and end-to-end queries")
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="Simulated LLM time to first token in seconds (the stub LLM makes no network calls)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--corpus-dir", help="Keep the generated corpus in this directory")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark suite")
+    add_arguments(parser)
+    parser.add_argument("--output", default="benchmark.json", help="JSON file for the results")
+    args = parser.parse_args()
+
+    report = run_suite(args.documents, args.words, args.queries, args.llm_latency, args.seed, args.corpus_dir)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(format_report(report))
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,14 +3,21 @@ import os
 import argparse
 import logging
 import sys
+import json
+import time
 import shutil
-from datetime import datetime
+from itertools import islice
 from dotenv import load_dotenv, find_dotenv
 
-from src.document_loader import DocumentLoader
-from src.vector_store import VectorStore
-from src.llm_integration import LLMIntegration
-from src.agent import Agent
+# Only lightweight modules are imported up front. langchain, the embedding model and
+# the Gemini client are imported where they are needed, so --check-env and queries
+# forwarded to a running --serve daemon start in a fraction of a second.
+from src import metrics
+from src.daemon import DaemonClient, is_running, serve
+from src.http_service import run_http_service
+from src.encyclopedia import DEFAULT_INDEX_PATH, build_index
+from src.snapshots import SnapshotStore, SnapshotCorruptedError
+from bench.suite import run_suite, format_report, add_arguments as add_benchmark_arguments
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -26,9 +33,9 @@ if not env_loaded:
     else:
         logger.warning("No .env file found. Please create one with your Google Gemini API key.")
 
-# Check if Google API key is set
+# Check if Google API key is set (not needed with the offline fake backend)
 google_api_key = os.getenv("GOOGLE_API_KEY")
-if not google_api_key:
+if not google_api_key and os.getenv("LLM_BACKEND", "gemini").lower() == "gemini":
     logger.warning("GOOGLE_API_KEY not found in environment variables.")
     logger.warning("Please add GOOGLE_API_KEY=your_google_api_key_here to your .env file.")
 
@@ -36,10 +43,14 @@ if not google_api_key:
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 VECTOR_STORE_DIR = os.path.join(BASE_DIR, "vector_store")
+ENCYCLOPEDIA_INDEX = os.getenv("ENCYCLOPEDIA_INDEX") or DEFAULT_INDEX_PATH
 
 
 def initialize_vector_store():
     """Initialize the vector store with documents."""
+    from src.document_loader import DocumentLoader
+    from src.vector_store import VectorStore
+    
     # Create vector_store directory if it doesn't exist
     os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
     
@@ -62,6 +73,8 @@ def initialize_vector_store():
 
 def load_vector_store():
     """Load the vector store from disk."""
+    from src.vector_store import VectorStore
+    
     if not os.path.exists(VECTOR_STORE_DIR):
         logger.error("Vector store directory not found. Please initialize the vector store first.")
         return None
@@ -73,10 +86,13 @@ def load_vector_store():
     return vector_store
 
 
-def initialize_agent():
-    """Initialize the agent with vector store and LLM."""
-    # Check if Google API key is available
-    if not os.getenv("GOOGLE_API_KEY"):
+def initialize_agent(routing="keywords", speculative=False, adaptive_retrieval=False):
+    """Initialize the agent with vector store and LLM, routing queries by "keywords" or "embedding"."""
+    from src.llm_integration import LLMIntegration
+    from src.agent import Agent
+    
+    # Check if Google API key is available (the fake backend runs without one)
+    if not os.getenv("GOOGLE_API_KEY") and os.getenv("LLM_BACKEND", "gemini").lower() == "gemini":
         logger.error("GOOGLE_API_KEY not found in environment variables. Cannot initialize LLM.")
         return None
     
@@ -96,7 +112,8 @@ def initialize_agent():
         
         # Initialize Agent
         logger.info("Initializing Agent")
-        agent = Agent(vector_store, llm)
+        agent = Agent(vector_store, llm, routing=routing, speculative=speculative,
+                      adaptive_retrieval=adaptive_retrieval)
         
         return agent
     except Exception as e:
@@ -104,14 +121,17 @@ def initialize_agent():
         return None
 
 
-def process_query(agent, query):
-    """Process a query using the agent."""
+def process_query(agent, query, stream=False, deadline=None):
+    """Process a query using the agent, optionally streaming the answer or enforcing a deadline."""
     if not agent:
         logger.error("Agent not initialized")
         return None
     
     logger.info("Processing query: %s", query)
-    result = agent.process_query(query)
+    if stream and deadline is None:
+        result = agent.process_query_stream(query)
+    else:
+        result = agent.process_query(query, deadline=deadline)
     
     return result
 
@@ -127,7 +147,21 @@ def display_result(result):
     print("="*50)
     
     print("\nAnswer:")
-    print(result["answer"])
+    if "answer_stream" in result:
+        # Print tokens as they arrive; the agent fills in result["answer"] at the end
+        for token in result.pop("answer_stream"):
+            print(token, end="", flush=True)
+        print()
+    else:
+        print(result["answer"])
+    
+    if "context_stats" in result:
+        stats = result["context_stats"]
+        print(f"\nContext: {stats['packed_tokens']} tokens "
+              f"(saved {stats['tokens_saved']} of {stats['original_tokens']} by merging and de-duplicating chunks)")
+    
+    if result.get("timings"):
+        print(f"\nTimings: {format_timings(result['timings'])}")
     
     if result["workflow"] == "rag" and "retrieved_docs" in result:
         print("\nRetrieved Documents:")
@@ -154,6 +188,153 @@ def display_result(result):
     print("\n" + "="*50 + "\n")
 
 
+def format_latency_stats(agent):
+    """Latency percentiles per stage of the process answering the queries (this one or the daemon)."""
+    summary = agent.latency_summary() if isinstance(agent, DaemonClient) else None
+    return metrics.format_latency_summary(summary)
+
+
+def format_timings(timings):
+    """Format a result's stage timings (seconds) and counters on one line."""
+    parts = []
+    for name, value in timings.items():
+        if isinstance(value, float):
+            parts.append(f"{name} {value * 1000:.1f} ms")
+        else:
+            parts.append(f"{name} {value}")
+    return ", ".join(parts)
+
+
+def read_batch_queries(input_path):
+    """
+    Stream (id, query) pairs from a JSONL file with one {"id": ..., "query": ...} object per line.
+    
+    Blank lines are skipped. A missing id defaults to the line number; a malformed line
+    yields its line number and None, so it still gets an output record.
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                yield record.get("id", line_number), str(record["query"])
+            except (ValueError, KeyError, TypeError, AttributeError):
+                yield line_number, None
+
+
+def count_batch_results(output_path):
+    """
+    Count the complete records in a batch output file and drop a partially written last line.
+    
+    Returns:
+        tuple: Number of complete records and the id of the last one (None if there are none).
+    """
+    if not os.path.exists(output_path):
+        return 0, None
+    
+    count, complete_size, last_line = 0, 0, None
+    with open(output_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            count += 1
+            complete_size += len(line)
+            last_line = line
+    
+    if complete_size < os.path.getsize(output_path):
+        logger.warning("Dropping a partially written record at the end of %s", output_path)
+        with open(output_path, "rb+") as f:
+            f.truncate(complete_size)
+    
+    return count, json.loads(last_line)["id"] if last_line else None
+
+
+def batch_record(query_id, query, result):
+    """The output record for one batch query."""
+    if result is None:
+        return {"id": query_id, "query": query, "error": "Malformed input line: expected an object with a \"query\""}
+    record = {"id": query_id, "query": query, "workflow": result["workflow"], "answer": result["answer"]}
+    if result.get("degraded"):
+        record["degraded"] = True
+    if result.get("error"):
+        record["error"] = result["error"]
+    record["timings"] = result.get("timings", {})
+    return record
+
+
+def run_batch(agent, input_path, output_path, concurrency=4, deadline=None, questions_per_call=5):
+    """
+    Answer every query in a JSONL file, appending one JSON result per line to `output_path`.
+    
+    Queries are read and processed in windows of a few times `concurrency`, so memory
+    stays bounded however long the input is. Results are written in input order as soon
+    as every earlier one is done, so an interrupted run resumes after the last complete
+    line of the output.
+    
+    Args:
+        agent (Agent): Initialized agent.
+        input_path (str): JSONL file of {"id": ..., "query": ...} objects.
+        output_path (str): JSONL file receiving {"id", "query", "workflow", "answer", "timings"} objects.
+        concurrency (int): Maximum number of tool runs and LLM calls in flight at once.
+        deadline (float): Time budget in seconds for each query's LLM call.
+        questions_per_call (int): Maximum number of document questions answered by one LLM call.
+    
+    Returns:
+        int: Number of queries answered in this run.
+    """
+    queries = read_batch_queries(input_path)
+    
+    # Resume: the output holds results for a prefix of the input
+    done, last_id = count_batch_results(output_path)
+    if done:
+        last = None
+        for last in islice(queries, done):
+            pass
+        if last is None or last[0] != last_id:
+            raise ValueError(f"{output_path} does not match the start of {input_path}; "
+                             f"use a new output file or delete it to start over")
+        logger.info("Resuming after %d queries already in %s", done, output_path)
+    
+    window_size = max(1, concurrency) * 8
+    processed = 0
+    start = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as output:
+        while True:
+            window = list(islice(queries, window_size))
+            if not window:
+                break
+            
+            results = [None] * len(window)
+            written = 0
+            valid = [index for index, (_, query) in enumerate(window) if query is not None]
+            completed = agent.process_queries_as_completed([window[index][1] for index in valid],
+                                                           concurrency, deadline, questions_per_call)
+            pending = set(valid)
+            for position, result in completed:
+                index = valid[position]
+                results[index] = result
+                pending.discard(index)
+                # Write the longest finished prefix of the window
+                while written < len(window) and written not in pending:
+                    query_id, query = window[written]
+                    output.write(json.dumps(batch_record(query_id, query, results[written]), ensure_ascii=False) + "\n")
+                    results[written] = None
+                    written += 1
+                output.flush()
+            
+            # Only left over when no query in the window was well-formed
+            for query_id, query in window[written:]:
+                output.write(json.dumps(batch_record(query_id, query, None), ensure_ascii=False) + "\n")
+            output.flush()
+            
+            processed += len(window)
+            logger.info("Processed %d queries (%.1f per second)", done + processed,
+                        processed / (time.perf_counter() - start))
+    
+    return processed
+
+
 def clean_vector_store():
     """Clean the vector store to manage disk space."""
     if not os.path.exists(VECTOR_STORE_DIR):
@@ -161,10 +342,8 @@ def clean_vector_store():
         return False
     
     try:
-        # Create a backup first
-        backup_dir = os.path.join(BASE_DIR, f"vector_store_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-        logger.info(f"Creating backup of vector store at {backup_dir}")
-        shutil.copytree(VECTOR_STORE_DIR, backup_dir)
+        # Snapshot it first; save_vector_store only ever replaces files, so they can be hard-linked
+        snapshot_id = SnapshotStore().create(VECTOR_STORE_DIR, label="before --clean-vector-store", link=True)
         
         # Calculate space used
         total_size = 0
@@ -179,7 +358,7 @@ def clean_vector_store():
         os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
         
         logger.info(f"Vector store cleaned. Freed approximately {total_size / (1024*1024):.2f} MB.")
-        logger.info(f"Backup saved at {backup_dir}")
+        logger.info(f"Backup saved as snapshot {snapshot_id} (restore with --restore {snapshot_id})")
         logger.info("Use 'python main.py --init' to reinitialize the vector store.")
         
         return True
@@ -218,6 +397,10 @@ def display_disk_usage():
     else:
         print("Data Directory: Not found")
     
+    # Check snapshots; files still shared with the live directories take no extra space
+    snapshots = SnapshotStore()
+    print(f"Snapshots: {len(snapshots.list())} ({snapshots.disk_usage() / (1024*1024):.2f} MB not shared with live files)")
+    
     # Display Python packages (estimated)
     try:
         import pkg_resources
@@ -248,18 +431,63 @@ def main():
     parser.add_argument("--init", action="store_true", help="Initialize the vector store")
     parser.add_argument("--query", type=str, help="Query to process")
     parser.add_argument("--interactive", action="store_true", help="Run in interactive mode")
+    parser.add_argument("--batch", metavar="INPUT",
+                        help="Answer every query in a JSONL file of {\"id\": ..., \"query\": ...} objects")
+    parser.add_argument("--output", metavar="OUTPUT",
+                        help="JSONL file for --batch results (default: INPUT with a .results.jsonl suffix; "
+                             "an interrupted run resumes where it stopped), or JSON file for --benchmark "
+                             "results (default: benchmark.json)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Queries in flight at once with --batch")
+    parser.add_argument("--questions-per-call", type=int, default=5,
+                        help="Document questions answered by one LLM call with --batch (1 to ask each on its own; "
+                             "ignored with --deadline)")
+    parser.add_argument("--no-stream", action="store_true", help="Wait for the full answer instead of streaming it")
+    parser.add_argument("--router", choices=["keywords", "embedding"], default="keywords",
+                        help="Route queries by keyword lists or by similarity to example queries")
+    parser.add_argument("--speculative", action="store_true",
+                        help="Start document retrieval while the query is still being routed")
+    parser.add_argument("--adaptive-retrieval", action="store_true",
+                        help="Choose how many chunks to send to the LLM from the retrieval scores instead of always "
+                             "sending the top 3 (thresholds tuned for all-MiniLM-L6-v2)")
+    parser.add_argument("--deadline", type=float, help="End-to-end time limit per query in seconds (disables streaming)")
+    parser.add_argument("--latency-stats", action="store_true",
+                        help="Print p50/p95/p99 latency per stage after answering --query or --batch")
+    parser.add_argument("--build-encyclopedia", metavar="DUMP",
+                        help="Build the local dictionary index from a JSON-lines dump (title and text per line)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Measure ingest, embedding, indexing, retrieval and end-to-end latency on a synthetic corpus")
+    add_benchmark_arguments(parser.add_argument_group("benchmark options"))
+    parser.add_argument("--serve", action="store_true",
+                        help="Keep the agent loaded and answer --query and --interactive calls through a local socket")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="Socket of the --serve daemon (default: RAG_QA_SOCKET or a file in the temp directory)")
+    parser.add_argument("--no-daemon", action="store_true", help="Answer in this process even if a daemon is running")
+    parser.add_argument("--http", action="store_true",
+                        help="Serve /query, /retrieve, /batch and /metrics over HTTP until interrupted")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface for --http to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port for --http to listen on")
     parser.add_argument("--check-env", action="store_true", help="Check environment setup")
     parser.add_argument("--clean-vector-store", action="store_true", help="Clean the vector store to manage disk space")
     parser.add_argument("--disk-usage", action="store_true", help="Display disk usage information")
+    parser.add_argument("--list-snapshots", action="store_true", help="List snapshots of the vector store and data")
+    parser.add_argument("--restore", metavar="SNAPSHOT", help="Restore a snapshot to the directory it was taken from")
+    parser.add_argument("--gc", action="store_true", help="Delete old snapshots and the files only they used")
+    parser.add_argument("--keep", type=int, default=5, help="Snapshots to keep per directory with --gc")
     
     args = parser.parse_args()
+    if args.keep < 0:
+        parser.error("--keep must be 0 or more")
+    if args.questions_per_call < 1:
+        parser.error("--questions-per-call must be 1 or more")
     
     if args.check_env:
         # Display environment information
         print("\nEnvironment Check:")
         print(f"Google API Key: {'Set' if os.getenv('GOOGLE_API_KEY') else 'Not Set'}")
+        print(f"LLM Backend: {os.getenv('LLM_BACKEND', 'gemini')}")
         print(f"Data Directory: {os.path.exists(DATA_DIR)}")
         print(f"Vector Store: {'Exists' if os.path.exists(VECTOR_STORE_DIR) else 'Not Found'}")
+        print(f"Encyclopedia Index: {'Exists' if os.path.exists(ENCYCLOPEDIA_INDEX) else 'Not Found'}")
         print(f"Python Version: {sys.version}")
         return
     
@@ -274,12 +502,62 @@ def main():
         display_disk_usage()
         return
     
+    if args.list_snapshots:
+        snapshots = SnapshotStore().list()
+        for snapshot in snapshots:
+            size = sum(entry["size"] for entry in snapshot["files"].values())
+            print(f"{snapshot['id']}  {snapshot['created']}  {len(snapshot['files'])} files, "
+                  f"{size / (1024*1024):.2f} MB  {snapshot['source']}  {snapshot['label']}")
+        if not snapshots:
+            print("No snapshots")
+        return
+    
+    if args.restore:
+        try:
+            target = SnapshotStore().restore(args.restore)
+        except (KeyError, FileNotFoundError, SnapshotCorruptedError) as e:
+            print(f"Could not restore snapshot: {e}")
+            return
+        print(f"Restored {args.restore} to {target}")
+        return
+    
+    if args.gc:
+        deleted = SnapshotStore().gc(keep=args.keep)
+        print(f"Deleted {deleted['snapshots']} snapshots and {deleted['objects']} stored files, "
+              f"freeing {deleted['bytes'] / (1024*1024):.2f} MB")
+        return
+    
     if args.init:
         initialize_vector_store()
         return
     
+    if args.benchmark:
+        output_path = args.output or "benchmark.json"
+        report = run_suite(args.documents, args.words, args.queries, args.llm_latency, args.seed, args.corpus_dir)
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(format_report(report))
+        print(f"Results written to {output_path}")
+        return
+    
+    if args.build_encyclopedia:
+        count = build_index(args.build_encyclopedia, ENCYCLOPEDIA_INDEX)
+        print(f"Indexed {count} articles into {ENCYCLOPEDIA_INDEX}")
+        return
+    
+    # Forward queries to a warm daemon when one is running. The agent options are fixed
+    # when the daemon starts, so queries asking for others are answered here.
+    agent = None
+    default_agent_options = args.router == "keywords" and not args.speculative and not args.adaptive_retrieval
+    if ((args.query or args.interactive) and not args.serve and not args.batch and not args.no_daemon
+            and default_agent_options and is_running(args.socket)):
+        logger.info("Forwarding to the running daemon")
+        agent = DaemonClient(args.socket)
+    
     # Initialize agent
-    agent = initialize_agent()
+    if agent is None:
+        agent = initialize_agent(routing=args.router, speculative=args.speculative,
+                                 adaptive_retrieval=args.adaptive_retrieval)
     if not agent:
         print("\nERROR: Could not initialize agent. Please check your environment setup.")
         print("1. Make sure you have set your GOOGLE_API_KEY in the .env file")
@@ -288,16 +566,37 @@ def main():
         print("\nRun with --check-env to verify your environment setup")
         return
     
+    if args.serve:
+        print("Agent loaded; serving queries until interrupted (Ctrl+C)")
+        serve(agent, args.socket)
+        return
+    
+    if args.http:
+        print(f"Agent loaded; serving HTTP on http://{args.host}:{args.port} until interrupted (Ctrl+C)")
+        run_http_service(agent, args.host, args.port)
+        return
+    
+    if args.batch:
+        output_path = args.output or os.path.splitext(args.batch)[0] + ".results.jsonl"
+        count = run_batch(agent, args.batch, output_path, concurrency=args.concurrency, deadline=args.deadline,
+                          questions_per_call=args.questions_per_call)
+        print(f"Answered {count} queries; results in {output_path}")
+        if args.latency_stats:
+            print(format_latency_stats(agent))
+        return
+    
     if args.query:
         # Process a single query
-        result = process_query(agent, args.query)
+        result = process_query(agent, args.query, stream=not args.no_stream, deadline=args.deadline)
         display_result(result)
+        if args.latency_stats:
+            print(format_latency_stats(agent))
         return
     
     if args.interactive:
         # Run in interactive mode
         print("\nRAG-Powered Multi-Agent Q&A System")
-        print("Type 'exit' or 'quit' to exit\n")
+        print("Type 'exit' or 'quit' to exit, 'stats' for latency percentiles\n")
         
         while True:
             try:
@@ -308,7 +607,11 @@ def main():
                 if not query:
                     continue
                 
-                result = process_query(agent, query)
+                if query.lower() == "stats":
+                    print("\n" + format_latency_stats(agent) + "\n")
+                    continue
+                
+                result = process_query(agent, query, stream=not args.no_stream, deadline=args.deadline)
                 display_result(result)
             except KeyboardInterrupt:
                 print("\nExiting...")
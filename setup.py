@@ -54,7 +54,10 @@ def create_env_file():
             f.write("# Google Gemini API Key\n")
             f.write("GOOGLE_API_KEY=your_google_api_key_here\n\n")
             f.write("# Model configuration\n")
-            f.write("# GEMINI_MODEL_NAME=gemini-1.5-pro\n")
+            f.write("# GEMINI_MODEL_NAME=gemini-1.5-pro\n\n")
+            f.write("# Client-side rate limiting (match your Gemini API plan)\n")
+            f.write("# GEMINI_REQUESTS_PER_MINUTE=2\n")
+            f.write("# GEMINI_TOKENS_PER_MINUTE=32000\n")
     
     print("Please edit the .env file to add your Google Gemini API key.")
 
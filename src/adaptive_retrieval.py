@@ -0,0 +1,68 @@
+import logging
+from typing import List, Tuple
+
+from langchain.schema import Document
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Embedding model the default thresholds were tuned for
+TUNED_FOR_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+class AdaptiveRetrieval:
+    """
+    Decides how many retrieved chunks are worth sending to the LLM.
+
+    A larger candidate set is fetched once and cut from the score distribution:
+    chunks beyond the absolute distance threshold are dropped, and the list is
+    cut at the first large gap between consecutive scores or once scores fall
+    too far behind the best match. Scores are FAISS L2 distances (lower is
+    better); the defaults suit the unit-length all-MiniLM-L6-v2 embeddings,
+    for which a squared distance d corresponds to a cosine similarity of 1 - d/2.
+    Other embedding models have other score ranges and need their own thresholds.
+    """
+
+    def __init__(self, candidates: int = 10, max_k: int = 5, max_distance: float = 1.6,
+                 max_gap: float = 0.15, max_spread: float = 0.35):
+        """
+        Initialize AdaptiveRetrieval.
+
+        Args:
+            candidates (int): Number of chunks to fetch from the index.
+            max_k (int): Maximum number of chunks to keep.
+            max_distance (float): Chunks farther than this from the query are never kept.
+            max_gap (float): Stop at the first jump of more than this between consecutive scores.
+            max_spread (float): Stop at chunks scoring more than this behind the best one.
+        """
+        self.candidates = candidates
+        self.max_k = max_k
+        self.max_distance = max_distance
+        self.max_gap = max_gap
+        self.max_spread = max_spread
+
+    def select(self, docs_with_scores: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """
+        Keep the leading chunks that are close enough to the query and to each other.
+
+        Args:
+            docs_with_scores (List[Tuple[Document, float]]): Candidates, best first.
+
+        Returns:
+            List[Tuple[Document, float]]: The chunks to use; empty when nothing passes the threshold.
+        """
+        if not docs_with_scores or docs_with_scores[0][1] > self.max_distance:
+            return []
+
+        best = docs_with_scores[0][1]
+        kept = [docs_with_scores[0]]
+        for doc, score in docs_with_scores[1:self.max_k]:
+            if (score > self.max_distance or score - kept[-1][1] > self.max_gap
+                    or score - best > self.max_spread):
+                break
+            kept.append((doc, score))
+
+        logger.info(f"Adaptive retrieval kept {len(kept)} of {len(docs_with_scores)} candidates "
+                    f"(best score {best:.3f})")
+        return kept
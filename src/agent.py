@@ -1,32 +1,92 @@
-import re
+import os
+import time
+import asyncio
 import logging
-from typing import Dict, Any, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from typing import Dict, Any, List, Tuple, Iterator, Optional, Callable, Awaitable
 
 from langchain.schema import Document
 from .tools import CalculatorTool, DictionaryTool
 from .vector_store import VectorStore
 from .llm_integration import LLMIntegration
+from .circuit_breaker import CircuitOpenError
+from .single_flight import SingleFlight, AsyncSingleFlight
+from .context_compressor import ContextCompressor
+from .router import KeywordRouter, EmbeddingRouter
+from .adaptive_retrieval import AdaptiveRetrieval, TUNED_FOR_MODEL
+from .tool_executor import ToolExecutor
+from . import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Shared by every Agent in the process so identical questions from different
+# Streamlit sessions coalesce into one retrieval and LLM call
+_query_flights = SingleFlight()
+
+# The same for streamed answers (one LLM stream fanned out to every caller) and for
+# aprocess_query callers on the same event loop
+_stream_flights = SingleFlight()
+_async_query_flights = AsyncSingleFlight()
+
+# Runs speculative embedding and retrieval alongside routing
+_retrieval_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-retrieval")
+
+# Runs the CPU-bound steps of aprocess_query (embedding, FAISS search, compression)
+# off the event loop; separate from the default executor used for blocking I/O
+_cpu_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="agent-cpu")
+
+# Runs calculator and dictionary calls with time limits; shared so that every
+# Agent in the process draws on the same bounded pools
+_tool_executor = ToolExecutor()
+
 
 class Agent:
     """Agent that orchestrates the RAG workflow and tools."""
     
-    def __init__(self, vector_store: VectorStore, llm: LLMIntegration):
+    def __init__(self, vector_store: VectorStore, llm: LLMIntegration, compress_context: bool = True,
+                 routing: str = "keywords", speculative: bool = False,
+                 async_embedder: Optional[Callable[[str], Awaitable[List[float]]]] = None,
+                 adaptive_retrieval: bool = False):
         """
         Initialize the Agent.
         
         Args:
             vector_store (VectorStore): Vector store for document retrieval.
             llm (LLMIntegration): LLM integration for answer generation.
+            compress_context (bool): Send only the retrieved sentences most relevant to the query.
+            routing (str): "keywords" to route with the keyword lists below, or "embedding" to
+                route by similarity to labelled example queries.
+            speculative (bool): Start embedding and retrieval before routing has finished, so a
+                RAG answer can start generating sooner. The retrieval is wasted on tool queries.
+            async_embedder (Optional[Callable[[str], Awaitable[List[float]]]]): Coroutine function that
+                embeds a query for `aprocess_query`, e.g. a remote or batching embedding service.
+                Defaults to running the vector store's model on a worker thread.
+            adaptive_retrieval (bool): Decide from the retrieval scores how many chunks to use, answering
+                "not found" without calling the LLM when none is close enough. Otherwise the top 3
+                chunks are always used. The thresholds are tuned for all-MiniLM-L6-v2 embeddings.
         """
+        if routing not in ("keywords", "embedding"):
+            raise ValueError(f"Unknown routing mode: {routing}")
+        
         self.vector_store = vector_store
         self.llm = llm
+        self.speculative = speculative
+        self.async_embedder = async_embedder
+        self.adaptive_retrieval = AdaptiveRetrieval() if adaptive_retrieval else None
+        # Settings that shape the answer; differently configured agents never share in-flight queries
+        self._flight_settings = (routing, compress_context, speculative, adaptive_retrieval)
+        model_name = getattr(vector_store, "embedding_model_name", TUNED_FOR_MODEL)
+        if adaptive_retrieval and model_name != TUNED_FOR_MODEL:
+            logger.warning(f"Adaptive retrieval thresholds are tuned for {TUNED_FOR_MODEL}, not {model_name}; "
+                           f"chunks may be kept or dropped wrongly")
         self.calculator = CalculatorTool()
         self.dictionary = DictionaryTool()
+        self.tool_executor = _tool_executor
+        
+        # Reuses the embedding model the vector store has already loaded
+        self.compressor = ContextCompressor(vector_store.embedding_model) if compress_context else None
         
         # Define keywords for routing
         self.calculator_keywords = [
@@ -56,104 +116,471 @@ class Agent:
             "protocol", "platform", "infrastructure", "application", "software",
             "hardware", "device", "network", "database", "data"
         ]
+        
+        # Code-related questions and specific knowledge domains skip tool routing
+        self.domain_terms = ["pl/sql", "sql", "code", "programming", "blockchain", "ai", "cloud computing"]
+        
+        # Compile the keyword lists once instead of scanning them on every query
+        self.router = KeywordRouter(self.calculator_keywords, self.dictionary_keywords,
+                                    self.rag_override_keywords, self.domain_terms)
+        
+        # Optional intent classifier that reuses the embedding model and the query embedding
+        self.intent_router = EmbeddingRouter(vector_store.embedding_model) if routing == "embedding" else None
     
     def _should_use_calculator(self, query: str) -> bool:
         """Check if the query should be routed to the calculator tool."""
-        query_lower = query.lower()
+        return self.router.is_calculation(query.lower())
+    
+    def _should_use_dictionary(self, query: str) -> bool:
+        """Check if the query should be routed to the dictionary tool."""
+        return self.router.is_definition(query.lower())
+    
+    def _route(self, query: str) -> str:
+        """
+        Decide which workflow should handle a query.
+        
+        Args:
+            query (str): User query.
+            
+        Returns:
+            str: One of "rag", "calculator" or "dictionary".
+        """
+        return self.router.route(query)
+    
+    def _route_with_embedding(self, query: str, retrieval: Optional[Future] = None) -> Tuple[str, Optional[List[float]]]:
+        """
+        Decide which workflow should handle a query, embedding it first when routing by embedding.
         
-        # First, check for mathematical expressions with numbers and operators
-        if re.search(r'\d+\s*[\+\-\*/]\s*\d+', query_lower):
-            return True
+        Args:
+            query (str): User query.
+            retrieval (Optional[Future]): Speculative retrieval already running for the query.
+            
+        Returns:
+            Tuple[str, Optional[List[float]]]: The workflow and the query embedding, which the
+            RAG workflow reuses for retrieval (None with keyword routing).
+        """
+        if self.intent_router is None:
+            return self._route(query), None
+        if retrieval is not None:
+            # The speculative retrieval embeds the query anyway
+            query_embedding = retrieval.result()[0]
+        else:
+            query_embedding = self.vector_store.embed_query(query)
+        return self.intent_router.route(query, query_embedding), query_embedding
+    
+    def process_query(self, query: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Process a user query through the appropriate workflow.
         
-        # Next, check for calculator keywords
-        for keyword in self.calculator_keywords:
-            if keyword in query_lower:
-                # Make sure the keyword isn't just part of a longer word
-                if re.search(r'\b' + re.escape(keyword) + r'\b', query_lower):
-                    return True
+        Args:
+            query (str): User query.
+            deadline (Optional[float]): End-to-end time budget in seconds. LLM attempts are
+                timed out, and no retries are started, once it has been used up.
+            
+        Returns:
+            Dict[str, Any]: Result dictionary with workflow information and answer.
+        """
+        logger.info(f"Processing query: {query}")
+        deadline_at = time.monotonic() + deadline if deadline is not None else None
         
-        return False
+        # Concurrent identical questions against the same index share one computation
+        result, shared = _query_flights.do(self._flight_key(query, deadline),
+                                           lambda: self._run_workflow(query, deadline_at))
+        if shared:
+            logger.info("Joined an identical in-flight query")
+            # Give each caller its own copy, echoing the question as they asked it
+            result = dict(result, query=query)
+        return result
     
-    def _should_use_dictionary(self, query: str) -> bool:
-        """Check if the query should be routed to the dictionary tool."""
-        query_lower = query.lower()
-        
-        # First check if any RAG override keywords are present
-        for override in self.rag_override_keywords:
-            if override.lower() in query_lower:
-                return False
-        
-        # Check for document-specific context phrases
-        doc_phrases = ["in the document", "in this document", "according to the document", 
-                       "mentioned in", "based on the", "refers to", "written in", 
-                       "from the document", "from the text", "content about"]
-        for phrase in doc_phrases:
-            if phrase in query_lower:
-                return False
-        
-        # Check for "what is" pattern but not followed by a RAG override term
-        if re.search(r'\bwhat\s+is\b', query_lower) or re.search(r'\bwho\s+is\b', query_lower):
-            # Check for document contexts like "what is mentioned about X" or "what is X in the document"
-            if any(ctx in query_lower for ctx in ["mentioned about", "mentioned in", "in the document", "said about"]):
-                return False
+    async def aprocess_query(self, query: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Process a user query without blocking the event loop.
+        
+        Returns the same result as `process_query`. Embedding, FAISS search and context
+        compression run on a dedicated thread pool, tool calls wait on the default
+        one, and the LLM is called through its native async client, so one event loop
+        can serve many concurrent queries. Identical concurrent queries share one
+        computation, as with `process_query`.
+        
+        Args:
+            query (str): User query.
+            deadline (Optional[float]): End-to-end time budget in seconds.
             
-            # Don't use dictionary for "what is [RAG term]"
-            for override in self.rag_override_keywords:
-                if override.lower() in query_lower:
-                    return False
+        Returns:
+            Dict[str, Any]: Result dictionary with workflow information and answer.
+        """
+        logger.info(f"Processing query (async): {query}")
+        deadline_at = time.monotonic() + deadline if deadline is not None else None
+        
+        result, shared = await _async_query_flights.do(self._flight_key(query, deadline),
+                                                       lambda: self._arun_workflow(query, deadline_at))
+        if shared:
+            logger.info("Joined an identical in-flight query")
+            result = dict(result, query=query)
+        return result
+    
+    async def _arun_workflow(self, query: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Async counterpart of `_run_workflow`."""
+        with metrics.collect_timings() as timings:
+            with metrics.span("total"):
+                query_embedding = None
+                with metrics.span("routing"):
+                    if self.intent_router is None:
+                        workflow = self._route(query)
+                    else:
+                        query_embedding = await self._aembed(query)
+                        workflow = self.intent_router.route(query, query_embedding)
+                
+                if workflow == "calculator":
+                    with metrics.span("tool"):
+                        result = await self._run_blocking(self._calculator_workflow, query)
+                elif workflow == "dictionary":
+                    with metrics.span("tool"):
+                        result = await self._run_blocking(self._dictionary_workflow, query)
+                else:
+                    result = await self._arag_workflow(query, deadline, query_embedding)
+        
+        result["timings"] = dict(timings)
+        return result
+    
+    async def _run_cpu(self, fn, *args):
+        """Run a CPU-bound call on the agent's thread pool, keeping the caller's timings."""
+        return await asyncio.get_running_loop().run_in_executor(_cpu_executor, metrics.bind(fn, *args))
+    
+    async def _run_blocking(self, fn, *args):
+        """Run a call that mostly waits (e.g. on a tool worker) on the default executor, keeping the caller's timings."""
+        return await asyncio.get_running_loop().run_in_executor(None, metrics.bind(fn, *args))
+    
+    async def _aembed(self, query: str) -> List[float]:
+        """Embed a query with the async embedder, or the vector store's model off the event loop."""
+        if self.async_embedder is not None:
+            with metrics.span("embedding"):
+                return await self.async_embedder(query)
+        return await self._run_cpu(self.vector_store.embed_query, query)
+    
+    async def _arag_workflow(self, query: str, deadline: Optional[float] = None,
+                             query_embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Async counterpart of `_rag_workflow`."""
+        logger.info("Using RAG workflow (async)")
+        
+        with metrics.span("retrieval"):
+            if query_embedding is None:
+                query_embedding = await self._aembed(query)
+            docs_with_scores = await self._run_cpu(self._search, query_embedding)
+        
+        if not docs_with_scores:
+            return self._no_documents_result(query)
+        
+        if not self.llm.is_available():
+            return self._retrieval_only_result(query, docs_with_scores)
+        
+        result, context = await self._run_cpu(self._prepare_rag_result, query, query_embedding, docs_with_scores)
+        
+        try:
+            result["answer"] = await self.llm.aanswer_from_context(query, context, deadline)
+        except CircuitOpenError:
+            return self._retrieval_only_result(query, docs_with_scores)
+        return result
+    
+    def _run_workflow(self, query: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Route the query and execute the chosen workflow, recording the time spent in each stage."""
+        with metrics.collect_timings() as timings:
+            with metrics.span("total"):
+                retrieval = self._start_retrieval(query)
                 
-            # Check for context phrases that indicate someone wants information about a topic
-            if "about" in query_lower and not any(kw in query_lower for kw in self.dictionary_keywords):
-                return False
+                with metrics.span("routing"):
+                    workflow, query_embedding = self._route_with_embedding(query, retrieval)
                 
-            # Default to dictionary for other "what is" questions when no specific indicators exist
-            for keyword in self.dictionary_keywords:
-                if keyword in query_lower:
-                    return True
+                if workflow == "calculator":
+                    result = self._tool_result(self._calculator_workflow, query, retrieval)
+                elif workflow == "dictionary":
+                    result = self._tool_result(self._dictionary_workflow, query, retrieval)
+                else:
+                    result = self._rag_workflow(query, deadline, query_embedding, retrieval)
+        
+        # A speculative retrieval may still be adding to `timings`, so hand out a copy
+        result["timings"] = dict(timings)
+        return result
+    
+    def process_queries(self, queries: List[str], concurrency: int = 4,
+                        deadline: Optional[float] = None, questions_per_call: int = 1) -> List[Dict[str, Any]]:
+        """
+        Process many queries at once.
+        
+        Args:
+            queries (List[str]): User queries.
+            concurrency (int): Maximum number of tool runs and LLM calls in flight at once.
+            deadline (Optional[float]): Time budget in seconds for each query's LLM call.
+            questions_per_call (int): Maximum number of RAG questions answered by one LLM call.
             
-            # Default to RAG for other information-seeking questions
-            return False
+        Returns:
+            List[Dict[str, Any]]: One result dictionary per query, in input order.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+        for index, result in self.process_queries_as_completed(queries, concurrency, deadline, questions_per_call):
+            results[index] = result
+        return results
+    
+    def process_queries_as_completed(self, queries: List[str], concurrency: int = 4,
+                                     deadline: Optional[float] = None,
+                                     questions_per_call: int = 1) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Process many queries at once, yielding each result as soon as it is ready.
         
-        # Check for other dictionary keywords (with strict word boundary check)
-        for keyword in self.dictionary_keywords:
-            if re.search(r'\b' + re.escape(keyword) + r'\b', query_lower):
-                # Make sure there's no RAG override in the query after the keyword
-                keyword_pos = query_lower.find(keyword)
-                remainder = query_lower[keyword_pos + len(keyword):]
-                if not any(override.lower() in remainder for override in self.rag_override_keywords):
-                    return True
+        All queries are routed first. The RAG queries are embedded in one batch and
+        searched with a single index lookup, then tool runs and LLM calls go through
+        a thread pool of `concurrency` workers. With `questions_per_call` above 1, RAG
+        queries are answered in groups of that many per LLM call (see
+        `LLMIntegration.answers_from_contexts`), and a group's results are yielded
+        together. Grouping is skipped when a `deadline` is given, since one call
+        can't keep several questions' time limits.
         
-        return False
+        Args:
+            queries (List[str]): User queries.
+            concurrency (int): Maximum number of tool runs and LLM calls in flight at once.
+            deadline (Optional[float]): Time budget in seconds for each query's LLM call,
+                counted from when its call starts.
+            questions_per_call (int): Maximum number of RAG questions answered by one LLM call.
+            
+        Yields:
+            Tuple[int, Dict[str, Any]]: Index of the query in `queries` and its result dictionary.
+                A query that fails gets a result with an "error" entry instead of ending the batch.
+        """
+        if not queries:
+            return
+        logger.info(f"Processing {len(queries)} queries with concurrency {concurrency}")
+        start = time.perf_counter()
+        
+        # Route everything up front; embedding routing needs the embeddings of every query
+        embeddings: List[Optional[List[float]]] = [None] * len(queries)
+        if self.intent_router is not None:
+            embeddings = self.vector_store.embed_queries(queries)
+            workflows = [self.intent_router.route(query, embedding) for query, embedding in zip(queries, embeddings)]
+        else:
+            workflows = [self._route(query) for query in queries]
+        routing = (time.perf_counter() - start) / len(queries)
+        
+        # Embed and search all RAG queries in one pass
+        rag_indices = [i for i, workflow in enumerate(workflows) if workflow == "rag"]
+        candidates: Dict[int, List[Tuple[Document, float]]] = {}
+        retrieval = 0.0
+        if rag_indices:
+            retrieval_start = time.perf_counter()
+            missing = [i for i in rag_indices if embeddings[i] is None]
+            for i, embedding in zip(missing, self.vector_store.embed_queries([queries[i] for i in missing])):
+                embeddings[i] = embedding
+            top_k = self.adaptive_retrieval.candidates if self.adaptive_retrieval else 3
+            batch = self.vector_store.retrieve_batch_by_vectors([embeddings[i] for i in rag_indices], top_k)
+            retrieval = (time.perf_counter() - retrieval_start) / len(rag_indices)
+            candidates = dict(zip(rag_indices, batch))
+        
+        def run(index: int) -> List[Tuple[int, Dict[str, Any]]]:
+            query = queries[index]
+            with metrics.collect_timings() as timings:
+                # This query's share of the batched stages
+                timings["routing"] = routing
+                if workflows[index] == "calculator":
+                    result = self._tool_result(self._calculator_workflow, query, None)
+                elif workflows[index] == "dictionary":
+                    result = self._tool_result(self._dictionary_workflow, query, None)
+                else:
+                    timings["retrieval"] = retrieval
+                    # Hand the batch result to the RAG workflow as an already finished retrieval
+                    retrieved = Future()
+                    retrieved.set_result((embeddings[index], self._select(candidates[index])))
+                    deadline_at = time.monotonic() + deadline if deadline is not None else None
+                    result = self._rag_workflow(query, deadline_at, embeddings[index], retrieved)
+                # Latency as seen by the caller, including the wait for a free worker
+                metrics.record("total", time.perf_counter() - start)
+            result["timings"] = timings
+            return [(index, result)]
+        
+        def run_group(indices: List[int]) -> List[Tuple[int, Dict[str, Any]]]:
+            # Several RAG queries answered by one LLM call
+            results, pending, group_timings = {}, [], {}
+            for index in indices:
+                with metrics.collect_timings() as timings:
+                    timings["routing"] = routing
+                    timings["retrieval"] = retrieval
+                    docs_with_scores = self._select(candidates[index])
+                    if not docs_with_scores:
+                        results[index] = self._no_documents_result(queries[index])
+                    elif not self.llm.is_available():
+                        results[index] = self._retrieval_only_result(queries[index], docs_with_scores)
+                    else:
+                        results[index], context = self._prepare_rag_result(queries[index], embeddings[index],
+                                                                           docs_with_scores)
+                        pending.append((index, context))
+                results[index]["timings"] = timings
+            if pending:
+                with metrics.collect_timings(group_timings):
+                    answers = self.llm.answers_from_contexts(
+                        [(queries[index], context) for index, context in pending], max_batch_size=len(pending))
+                for (index, _), answer in zip(pending, answers):
+                    results[index]["answer"] = answer
+            for index in indices:
+                # The shared call's stages are part of every grouped query's latency
+                timings = results[index]["timings"]
+                for stage, value in group_timings.items():
+                    timings[stage] = timings.get(stage, 0) + value
+                with metrics.collect_timings(timings):
+                    metrics.record("total", time.perf_counter() - start)
+            return [(index, results[index]) for index in indices]
+        
+        grouped = questions_per_call > 1 and deadline is None
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="agent-batch") as executor:
+            # Each future maps to the query indices whose results it returns
+            futures = {executor.submit(run, index): [index] for index in range(len(queries))
+                       if not (grouped and workflows[index] == "rag")}
+            if grouped:
+                for i in range(0, len(rag_indices), questions_per_call):
+                    group = rag_indices[i:i + questions_per_call]
+                    futures[executor.submit(run_group, group)] = group
+            for future in as_completed(futures):
+                try:
+                    completed = future.result()
+                except CircuitOpenError:
+                    # As for a single query: fall back to the retrieved passages
+                    completed = [(index, self._circuit_open_result(queries[index], workflows[index],
+                                                                   candidates.get(index)))
+                                 for index in futures[future]]
+                except Exception as e:
+                    completed = [(index, self._batch_error_result(queries[index], workflows[index], e))
+                                 for index in futures[future]]
+                yield from completed
+    
+    def _circuit_open_result(self, query: str, workflow: str,
+                             candidates: Optional[List[Tuple[Document, float]]]) -> Dict[str, Any]:
+        """Build the result of a batch query whose LLM call found the circuit breaker open."""
+        docs_with_scores = self._select(candidates) if candidates else []
+        if docs_with_scores:
+            return self._retrieval_only_result(query, docs_with_scores)
+        return self._batch_error_result(query, workflow, CircuitOpenError(self.llm.circuit_breaker.retry_after()))
     
-    def process_query(self, query: str) -> Dict[str, Any]:
+    def _batch_error_result(self, query: str, workflow: str, error: Exception) -> Dict[str, Any]:
+        """Build the result of a batch query that failed, so the rest of the batch still completes."""
+        logger.error(f"Query failed in batch: {query}: {error}")
+        return {
+            "workflow": workflow,
+            "query": query,
+            "error": str(error),
+            "answer": f"Error processing query: {error}",
+            "timings": {}
+        }
+    
+    def _flight_key(self, query: str, deadline: Optional[float] = None) -> Tuple[Any, ...]:
         """
-        Process a user query through the appropriate workflow.
+        Key under which concurrent identical questions against the same index and model are coalesced.
+        
+        The agent's routing, compression, speculation and retrieval settings are part of
+        the key, so agents configured differently in one process (e.g. the HTTP service
+        and a benchmark) never receive each other's answers. So is the deadline, so a
+        caller never inherits a shorter time limit (or the timeout answer that comes
+        with it) from the call it joins.
+        """
+        return (self._normalize_query(query), self.vector_store.index_version, self.llm.backend.name,
+                self.llm.model_name, self._flight_settings, deadline)
+    
+    def _normalize_query(self, query: str) -> str:
+        """Normalize a query for coalescing: case, whitespace and trailing punctuation."""
+        return ' '.join(query.lower().split()).rstrip('?.! ')
+    
+    def process_query_stream(self, query: str) -> Dict[str, Any]:
+        """
+        Process a user query, streaming the answer instead of waiting for it.
+        
+        The returned dictionary has the same shape as the one from `process_query`,
+        except that "answer" is empty and an "answer_stream" iterator yields the
+        answer fragments as they arrive. Once the stream is exhausted, "answer"
+        holds the full text.
         
         Args:
             query (str): User query.
             
         Returns:
-            Dict[str, Any]: Result dictionary with workflow information and answer.
+            Dict[str, Any]: Result dictionary with workflow information and an answer stream.
         """
-        logger.info(f"Processing query: {query}")
+        logger.info(f"Processing query (streaming): {query}")
+        with metrics.collect_timings() as timings:
+            # Time until the answer (or its stream) is ready; LLM stages are added as it streams
+            with metrics.span("total"):
+                retrieval = self._start_retrieval(query)
+                
+                with metrics.span("routing"):
+                    workflow, query_embedding = self._route_with_embedding(query, retrieval)
+                
+                if workflow == "calculator":
+                    result = self._tool_result(self._calculator_workflow, query, retrieval)
+                elif workflow == "dictionary":
+                    result = self._tool_result(self._dictionary_workflow, query, retrieval)
+                else:
+                    result = self._rag_workflow_stream(query, query_embedding, retrieval)
         
-        # Skip routing for code-related questions and specific knowledge domains
-        if any(term in query.lower() for term in ["pl/sql", "sql", "code", "programming", "blockchain", "ai", "cloud computing"]):
-            return self._rag_workflow(query)
+        result["timings"] = dict(timings)
+        if "answer_stream" not in result:
+            # Tool answers are computed in one go, so the stream is a single fragment
+            result["answer_stream"] = iter([result["answer"]])
+        return result
+    
+    def _start_retrieval(self, query: str) -> Optional[Future]:
+        """
+        Start embedding and retrieving for a query in the background, when speculating.
         
-        # Determine which workflow to use
-        if self._should_use_calculator(query):
-            return self._calculator_workflow(query)
-        elif self._should_use_dictionary(query):
-            return self._dictionary_workflow(query)
-        else:
-            return self._rag_workflow(query)
+        Retrieval then overlaps routing and tool execution. Its result is used if the
+        query is routed to RAG and discarded otherwise.
+        """
+        if not self.speculative:
+            return None
+        return metrics.submit(_retrieval_executor, self._retrieve, query)
+    
+    def _retrieve(self, query: str,
+                  query_embedding: Optional[List[float]] = None) -> Tuple[List[float], List[Tuple[Document, float]]]:
+        """Embed the query (unless already embedded) and retrieve documents."""
+        with metrics.span("retrieval"):
+            if query_embedding is None:
+                query_embedding = self.vector_store.embed_query(query)
+            docs_with_scores = self._search(query_embedding)
+        return query_embedding, docs_with_scores
+    
+    def _search(self, query_embedding: List[float]) -> List[Tuple[Document, float]]:
+        """Search the index, letting adaptive retrieval decide how many chunks to keep."""
+        if self.adaptive_retrieval is None:
+            return self.vector_store.retrieve_by_vector(query_embedding)
+        candidates = self.vector_store.retrieve_by_vector(query_embedding, top_k=self.adaptive_retrieval.candidates)
+        return self._select(candidates)
+    
+    def _select(self, candidates: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """Cut retrieved candidates down with adaptive retrieval, counting what was kept."""
+        if self.adaptive_retrieval is None:
+            return candidates
+        docs_with_scores = self.adaptive_retrieval.select(candidates)
+        metrics.count("chunks_retrieved", len(candidates))
+        metrics.count("chunks_kept", len(docs_with_scores))
+        return docs_with_scores
+    
+    def _retrieval_result(self, query: str, query_embedding: Optional[List[float]],
+                          retrieval: Optional[Future]) -> Tuple[List[float], List[Tuple[Document, float]]]:
+        """Return the query embedding and retrieved documents, from the speculative retrieval if there is one."""
+        if retrieval is None:
+            return self._retrieve(query, query_embedding)
+        
+        # Part of the retrieval not hidden behind routing
+        with metrics.span("retrieval_wait"):
+            return retrieval.result()
+    
+    def _tool_result(self, workflow, query: str, retrieval: Optional[Future]) -> Dict[str, Any]:
+        """Run a tool workflow, discarding any speculative retrieval."""
+        with metrics.span("tool"):
+            result = workflow(query)
+        if retrieval is not None:
+            retrieval.cancel()
+        return result
     
     def _calculator_workflow(self, query: str) -> Dict[str, Any]:
         """Execute the calculator workflow."""
         logger.info("Using calculator workflow")
         
-        result = self.calculator.run(query)
+        result = self.tool_executor.calculate(query)
         
         return {
             "workflow": "calculator",
@@ -166,7 +593,7 @@ class Agent:
         """Execute the dictionary workflow."""
         logger.info("Using dictionary workflow")
         
-        result = self.dictionary.run(query)
+        result = self.tool_executor.run("dictionary", self.dictionary.run, query)
         
         return {
             "workflow": "dictionary",
@@ -175,26 +602,152 @@ class Agent:
             "answer": result['definition'] if result['status'] == 'success' else f"Error: {result['error']}"
         }
     
-    def _rag_workflow(self, query: str) -> Dict[str, Any]:
-        """Execute the RAG workflow."""
+    def _rag_workflow(self, query: str, deadline: Optional[float] = None,
+                      query_embedding: Optional[List[float]] = None,
+                      retrieval: Optional[Future] = None) -> Dict[str, Any]:
+        """
+        Execute the RAG workflow, finishing the LLM call by `deadline` (a time.monotonic() value).
+        
+        The query is embedded here unless routing already did it, and retrieval is skipped
+        when a speculative `retrieval` is already running.
+        """
         logger.info("Using RAG workflow")
         
-        # Retrieve relevant documents
-        docs_with_scores = self.vector_store.retrieve(query)
+        # Retrieve relevant documents, keeping the query embedding for compression
+        query_embedding, docs_with_scores = self._retrieval_result(query, query_embedding, retrieval)
         
         # If no documents found, return an error
         if not docs_with_scores:
-            return {
-                "workflow": "rag",
-                "query": query,
-                "retrieved_docs": [],
-                "answer": "I couldn't find any relevant information in my knowledge base to answer your question."
-            }
+            return self._no_documents_result(query)
+        
+        # Skip the LLM entirely while its circuit breaker is open
+        if not self.llm.is_available():
+            return self._retrieval_only_result(query, docs_with_scores)
+        
+        result, context = self._prepare_rag_result(query, query_embedding, docs_with_scores)
         
         # Generate answer using the LLM
-        answer = self.llm.generate_answer(query, docs_with_scores)
+        try:
+            result["answer"] = self.llm.answer_from_context(query, context, deadline)
+        except CircuitOpenError:
+            return self._retrieval_only_result(query, docs_with_scores)
+        return result
+    
+    def _rag_workflow_stream(self, query: str, query_embedding: Optional[List[float]] = None,
+                             retrieval: Optional[Future] = None) -> Dict[str, Any]:
+        """Execute the RAG workflow with a streamed answer."""
+        logger.info("Using RAG workflow (streaming)")
         
-        # Format the retrieved documents for the response
+        query_embedding, docs_with_scores = self._retrieval_result(query, query_embedding, retrieval)
+        
+        if not docs_with_scores:
+            result = self._no_documents_result(query)
+            result["answer_stream"] = iter([result["answer"]])
+            return result
+        
+        if not self.llm.is_available():
+            result = self._retrieval_only_result(query, docs_with_scores)
+            result["answer_stream"] = iter([result["answer"]])
+            return result
+        
+        result, context = self._prepare_rag_result(query, query_embedding, docs_with_scores)
+        
+        # Concurrent identical questions share one LLM stream
+        tokens, shared = _stream_flights.stream(self._flight_key(query),
+                                                lambda: self.llm.stream_from_context(query, context))
+        if shared:
+            logger.info("Joined an identical in-flight answer stream")
+        result["answer_stream"] = self._collect_stream(result, tokens, docs_with_scores)
+        return result
+    
+    def _retrieval_only_result(self, query: str, docs_with_scores: List[Tuple[Document, float]]) -> Dict[str, Any]:
+        """
+        Build a RAG result without an LLM answer, like the lightweight app does.
+        
+        Used while the LLM circuit breaker is open, so quota outages cost
+        milliseconds instead of a series of retries.
+        """
+        logger.warning("LLM unavailable; returning retrieval-only results")
+        retry_after = self.llm.circuit_breaker.retry_after()
+        return {
+            "workflow": "rag",
+            "query": query,
+            "retrieved_docs": self._format_retrieved_docs(docs_with_scores),
+            "degraded": True,
+            "answer": (f"The language model is temporarily unavailable (API quota or errors; retrying in about "
+                       f"{retry_after:.0f} seconds). The most relevant passage from your documents is:\n\n"
+                       f"{docs_with_scores[0][0].page_content}")
+        }
+    
+    def _prepare_rag_result(self, query: str, query_embedding: List[float],
+                            docs_with_scores: List[Tuple[Document, float]]) -> Tuple[Dict[str, Any], str]:
+        """
+        Build the LLM context for the retrieved documents and the result dictionary around it.
+        
+        Args:
+            query (str): User query.
+            query_embedding (List[float]): Embedding used for retrieval.
+            docs_with_scores (List[Tuple[Document, float]]): Retrieved documents with relevance scores.
+            
+        Returns:
+            Tuple[Dict[str, Any], str]: Result dictionary (answer still empty) and the context string.
+        """
+        result = {
+            "workflow": "rag",
+            "query": query,
+            "retrieved_docs": self._format_retrieved_docs(docs_with_scores),
+            "answer": ""
+        }
+        
+        # Keep only the sentences most relevant to the query
+        context_docs = docs_with_scores
+        if self.compressor:
+            with metrics.span("compression"):
+                context_docs, result["compression_stats"] = self.compressor.compress(query_embedding, docs_with_scores)
+        
+        # Pack the retrieved chunks into a de-duplicated, token-budgeted context
+        with metrics.span("packing"):
+            context, result["context_stats"] = self.llm.pack_context(context_docs)
+        return result, context
+    
+    def _collect_stream(self, result: Dict[str, Any], tokens: Iterator[str],
+                        docs_with_scores: List[Tuple[Document, float]]) -> Iterator[str]:
+        """Pass tokens through while accumulating them into result["answer"] and its LLM timings."""
+        parts = []
+        tokens = iter(tokens)
+        timings = result.setdefault("timings", {})
+        start = time.perf_counter()
+        try:
+            while True:
+                # The stream runs in the consumer's context, so resume collecting this query's timings
+                with metrics.collect_timings(timings):
+                    token = next(tokens, None)
+                if token is None:
+                    break
+                parts.append(token)
+                yield token
+        except CircuitOpenError:
+            # The breaker opened before any token arrived: fall back to retrieval only
+            degraded = self._retrieval_only_result(result["query"], docs_with_scores)
+            result.update(degraded)
+            yield degraded["answer"]
+            return
+        finally:
+            with metrics.collect_timings(timings):
+                metrics.record("llm", time.perf_counter() - start)
+        result["answer"] = "".join(parts)
+    
+    def _no_documents_result(self, query: str) -> Dict[str, Any]:
+        """Build the RAG result returned when retrieval finds nothing."""
+        return {
+            "workflow": "rag",
+            "query": query,
+            "retrieved_docs": [],
+            "answer": "I couldn't find any relevant information in my knowledge base to answer your question."
+        }
+    
+    def _format_retrieved_docs(self, docs_with_scores: List[Tuple[Document, float]]) -> List[Dict[str, Any]]:
+        """Format the retrieved documents for the response."""
         retrieved_docs = []
         for doc, score in docs_with_scores:
             retrieved_docs.append({
@@ -202,10 +755,4 @@ class Agent:
                 "relevance_score": score,
                 "metadata": doc.metadata
             })
-        
-        return {
-            "workflow": "rag",
-            "query": query,
-            "retrieved_docs": retrieved_docs,
-            "answer": answer
-        } 
\ No newline at end of file
+        return retrieved_docs
@@ -0,0 +1,140 @@
+import time
+import logging
+import threading
+from typing import Dict, Hashable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM backend temporarily disabled; next probe in {retry_after:.1f} seconds")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing backend until a cool-down has passed.
+
+    The breaker opens after `failure_threshold` consecutive failures. While open,
+    calls are rejected immediately. Once the cool-down has elapsed a single probe
+    call is let through (half-open): success closes the breaker, failure opens it
+    for another cool-down.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        """
+        Initialize the CircuitBreaker.
+
+        Args:
+            failure_threshold (int): Consecutive failures that open the breaker.
+            cooldown (float): Seconds to wait before probing the backend again.
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the cool-down has passed."""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return self.HALF_OPEN
+            return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 when calls are allowed)."""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a call may go ahead, claiming the probe slot when half-open.
+
+        Returns:
+            bool: True if the caller may call the backend.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self._state = self.HALF_OPEN
+            # Half-open: only one probe at a time
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            logger.info("Circuit breaker half-open: probing the LLM backend")
+            return True
+
+    def record_success(self):
+        """Record a successful call, closing the breaker."""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Circuit breaker closed: LLM backend recovered")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """Record a failed call, opening the breaker if the threshold is reached."""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit breaker open after {self._failures} failures; "
+                                   f"skipping LLM calls for {self.cooldown:.0f} seconds")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release(self):
+        """Give back the probe slot of a call that ended without reaching the backend."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def is_open(self) -> bool:
+        """Whether calls are currently being rejected."""
+        return self.state == self.OPEN
+
+
+_breakers: Dict[Hashable, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(key: Hashable, failure_threshold: int = 3, cooldown: float = 30.0) -> CircuitBreaker:
+    """
+    Return the process-wide circuit breaker for a backend, creating it on first use.
+
+    Every LLMIntegration talking to the same backend and model shares one breaker,
+    since they share the same quota.
+
+    Args:
+        key (Hashable): Identifies the backend, e.g. (backend name, model name).
+        failure_threshold (int): Consecutive failures that open a new breaker.
+        cooldown (float): Cool-down in seconds for a new breaker.
+
+    Returns:
+        CircuitBreaker: The shared breaker.
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(failure_threshold, cooldown)
+            _breakers[key] = breaker
+        return breaker
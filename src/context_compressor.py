@@ -0,0 +1,132 @@
+import re
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Tuple, Dict, Any
+
+import numpy as np
+from langchain.schema import Document
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+
+class ContextCompressor:
+    """Keeps only the sentences of retrieved chunks that are most similar to the query."""
+
+    def __init__(self, embedding_model, max_chars: int = 1500, min_sentence_chars: int = 20,
+                 cache_size: int = 4096):
+        """
+        Initialize the ContextCompressor.
+
+        Args:
+            embedding_model: Embedding model already loaded by the VectorStore.
+            max_chars (int): Character budget for the sentences kept across all chunks.
+            min_sentence_chars (int): Shorter fragments are merged into the preceding sentence.
+            cache_size (int): Number of sentence embeddings kept in memory.
+        """
+        self.embedding_model = embedding_model
+        self.max_chars = max_chars
+        self.min_sentence_chars = min_sentence_chars
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compress(self, query_embedding: List[float],
+                 docs_with_scores: List[Tuple[Document, float]]) -> Tuple[List[Tuple[Document, float]], Dict[str, Any]]:
+        """
+        Cut each retrieved chunk down to its sentences most relevant to the query.
+
+        Args:
+            query_embedding (List[float]): Embedding of the query, as computed for retrieval.
+            docs_with_scores (List[Tuple[Document, float]]): Retrieved documents with relevance scores.
+
+        Returns:
+            Tuple[List[Tuple[Document, float]], Dict[str, Any]]: Compressed documents (same order and
+            scores, chunks with no kept sentence dropped) and compression statistics.
+        """
+        # (doc index, sentence index, sentence) for every distinct sentence
+        sentences = []
+        seen = set()
+        for i, (doc, _) in enumerate(docs_with_scores):
+            for j, sentence in enumerate(self._split_sentences(doc.page_content)):
+                normalized = ' '.join(sentence.lower().split())
+                if normalized in seen:
+                    # Overlapping chunks repeat sentences; keep the first occurrence only
+                    continue
+                seen.add(normalized)
+                sentences.append((i, j, sentence))
+
+        chars_in = sum(len(doc.page_content) for doc, _ in docs_with_scores)
+        stats = {"sentences_in": len(sentences), "sentences_kept": len(sentences),
+                 "chars_in": chars_in, "chars_out": chars_in}
+
+        if not sentences or chars_in <= self.max_chars:
+            return docs_with_scores, stats
+
+        # Score every sentence against the query in one matrix product
+        matrix = self._embed([sentence for _, _, sentence in sentences])
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = matrix @ query
+
+        # Greedily take the best sentences until the budget is used up
+        kept = set()
+        used = 0
+        for index in np.argsort(-scores):
+            length = len(sentences[index][2]) + 1
+            if kept and used + length > self.max_chars:
+                continue
+            kept.add(int(index))
+            used += length
+
+        compressed = []
+        for i, (doc, score) in enumerate(docs_with_scores):
+            parts = [sentence for k, (d, _, sentence) in enumerate(sentences) if d == i and k in kept]
+            if not parts:
+                continue
+            # Positions no longer match the source text, so drop start_index
+            metadata = {key: value for key, value in doc.metadata.items() if key != "start_index"}
+            compressed.append((Document(page_content=' '.join(parts), metadata=metadata), score))
+
+        stats["sentences_kept"] = len(kept)
+        stats["chars_out"] = sum(len(doc.page_content) for doc, _ in compressed)
+        logger.info(f"Compressed context from {stats['chars_in']} to {stats['chars_out']} characters "
+                    f"({stats['sentences_kept']}/{stats['sentences_in']} sentences)")
+        return compressed, stats
+
+    def _split_sentences(self, text: str) -> List[str]:
+        """Split text into sentences, gluing very short fragments to their predecessor."""
+        sentences = []
+        for piece in SENTENCE_SPLIT.split(text):
+            piece = piece.strip()
+            if not piece:
+                continue
+            if sentences and len(piece) < self.min_sentence_chars:
+                sentences[-1] = sentences[-1] + ' ' + piece
+            else:
+                sentences.append(piece)
+        return sentences
+
+    def _embed(self, sentences: List[str]) -> np.ndarray:
+        """Return unit-normalized embeddings, computing the uncached ones in a single batch."""
+        with self._lock:
+            cached = {s: self._cache[s] for s in sentences if s in self._cache}
+            for s in cached:
+                self._cache.move_to_end(s)
+
+        missing = [s for s in dict.fromkeys(sentences) if s not in cached]
+        if missing:
+            vectors = np.asarray(self.embedding_model.embed_documents(missing), dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            with self._lock:
+                for s, vector in zip(missing, vectors):
+                    self._cache[s] = vector
+                    cached[s] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return np.stack([cached[s] for s in sentences])
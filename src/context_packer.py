@@ -0,0 +1,215 @@
+import re
+import logging
+from typing import List, Tuple, Dict, Any, Optional
+
+from langchain.schema import Document
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; fall back to a character estimate
+    tiktoken = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+
+class ContextPacker:
+    """Packs retrieved chunks into a de-duplicated context string that fits a token budget."""
+
+    def __init__(self, max_tokens: int = 2000, encoding_name: str = "cl100k_base",
+                 min_overlap: int = 20, min_sentence_chars: int = 30, separator: str = "\n\n"):
+        """
+        Initialize the ContextPacker.
+
+        Args:
+            max_tokens (int): Token budget for the packed context.
+            encoding_name (str): tiktoken encoding used to count tokens.
+            min_overlap (int): Minimum shared characters for two chunks to be merged by text overlap.
+            min_sentence_chars (int): Sentences shorter than this are never de-duplicated.
+            separator (str): Separator placed between packed segments.
+        """
+        self.max_tokens = max_tokens
+        self.min_overlap = min_overlap
+        self.min_sentence_chars = min_sentence_chars
+        self.separator = separator
+        self.encoding = self._load_encoding(encoding_name)
+
+    def _load_encoding(self, encoding_name: str):
+        """Load the tiktoken encoding, or return None to use the character estimate."""
+        if tiktoken is None:
+            logger.warning("tiktoken not installed; estimating token counts from text length")
+            return None
+        try:
+            return tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            # The BPE file is downloaded on first use, which fails on offline hosts
+            logger.warning(f"Could not load tiktoken encoding '{encoding_name}' ({e}); estimating token counts from text length")
+            return None
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens in a piece of text."""
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+    def pack(self, docs_with_scores: List[Tuple[Document, float]]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Pack retrieved documents into a context string.
+
+        Overlapping or adjacent chunks from the same source are merged, sentences
+        repeated across chunks are dropped, and the result is cut to the token
+        budget, keeping the best-ranked material first.
+
+        Args:
+            docs_with_scores (List[Tuple[Document, float]]): Retrieved documents, best match first.
+
+        Returns:
+            Tuple[str, Dict[str, Any]]: Packed context and statistics about the packing.
+        """
+        original_tokens = self.count_tokens(self.separator.join(doc.page_content for doc, _ in docs_with_scores))
+
+        segments = self._merge_chunks(docs_with_scores)
+        texts = self._remove_repeated_sentences(segments)
+        context, truncated = self._fit_to_budget(texts)
+
+        packed_tokens = self.count_tokens(context)
+        stats = {
+            "chunks": len(docs_with_scores),
+            "segments": len(segments),
+            "original_tokens": original_tokens,
+            "packed_tokens": packed_tokens,
+            "tokens_saved": max(0, original_tokens - packed_tokens),
+            "truncated": truncated
+        }
+        return context, stats
+
+    def _merge_chunks(self, docs_with_scores: List[Tuple[Document, float]]) -> List[Dict[str, Any]]:
+        """Merge chunks from the same source that overlap or touch, preserving rank order."""
+        segments: List[Dict[str, Any]] = []
+
+        for doc, _ in docs_with_scores:
+            segment = {
+                "key": (doc.metadata.get("source"), doc.metadata.get("page")),
+                "start": doc.metadata.get("start_index"),
+                "text": doc.page_content
+            }
+
+            # A merged segment takes the rank of the best chunk that went into it
+            insert_at = len(segments)
+
+            # A merge can bridge two existing segments, so keep merging until stable
+            merged = True
+            while merged:
+                merged = False
+                for i, existing in enumerate(segments):
+                    if existing["key"] != segment["key"]:
+                        continue
+                    combined = self._merge_pair(existing, segment)
+                    if combined is not None:
+                        segment = combined
+                        del segments[i]
+                        insert_at = min(insert_at, i)
+                        merged = True
+                        break
+
+            segments.insert(min(insert_at, len(segments)), segment)
+
+        return segments
+
+    def _merge_pair(self, first: Dict[str, Any], second: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the merged segment if the two segments overlap or touch, otherwise None."""
+        if first["start"] is not None and second["start"] is not None:
+            # Exact positions are known (splitter run with add_start_index=True)
+            a, b = (first, second) if first["start"] <= second["start"] else (second, first)
+            a_end = a["start"] + len(a["text"])
+            if b["start"] > a_end + 1:
+                return None
+            if b["start"] == a_end + 1:
+                # Adjacent chunks separated by the whitespace the splitter stripped
+                text = a["text"] + " " + b["text"]
+            else:
+                text = a["text"] + b["text"][a_end - b["start"]:]
+            return {"key": a["key"], "start": a["start"], "text": text}
+
+        # Fall back to matching the text itself
+        a_text, b_text = first["text"], second["text"]
+        if b_text in a_text:
+            return first
+        if a_text in b_text:
+            return second
+        for head, tail in ((first, second), (second, first)):
+            overlap = self._suffix_prefix_overlap(head["text"], tail["text"])
+            if overlap:
+                return {"key": head["key"], "start": head["start"], "text": head["text"] + tail["text"][overlap:]}
+        return None
+
+    def _suffix_prefix_overlap(self, head: str, tail: str) -> int:
+        """Length of the longest suffix of `head` that is a prefix of `tail` (0 if below min_overlap)."""
+        if len(head) < self.min_overlap or len(tail) < self.min_overlap:
+            return 0
+        probe = tail[:self.min_overlap]
+        pos = head.find(probe, max(0, len(head) - len(tail)))
+        while pos != -1:
+            if tail.startswith(head[pos:]):
+                return len(head) - pos
+            pos = head.find(probe, pos + 1)
+        return 0
+
+    def _remove_repeated_sentences(self, segments: List[Dict[str, Any]]) -> List[str]:
+        """Drop sentences already present in a better-ranked segment."""
+        seen = set()
+        texts = []
+        for segment in segments:
+            kept = []
+            for sentence in SENTENCE_SPLIT.split(segment["text"]):
+                normalized = ' '.join(sentence.lower().split())
+                if len(normalized) >= self.min_sentence_chars:
+                    if normalized in seen:
+                        continue
+                    seen.add(normalized)
+                kept.append(sentence)
+            text = ' '.join(kept).strip()
+            if text:
+                texts.append(text)
+        return texts
+
+    def _fit_to_budget(self, texts: List[str]) -> Tuple[str, bool]:
+        """Join segments in rank order until the token budget is used up."""
+        packed = []
+        used = 0
+        separator_tokens = self.count_tokens(self.separator)
+
+        for text in texts:
+            cost = self.count_tokens(text) + (separator_tokens if packed else 0)
+            if used + cost <= self.max_tokens:
+                packed.append(text)
+                used += cost
+                continue
+
+            # Fill what is left of the budget with the start of this segment
+            remaining = self.max_tokens - used - (separator_tokens if packed else 0)
+            if remaining > 0:
+                partial = self._truncate(text, remaining)
+                if partial:
+                    packed.append(partial)
+            return self.separator.join(packed), True
+
+        return self.separator.join(packed), False
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most `max_tokens`, preferring a sentence boundary."""
+        if self.encoding is not None:
+            cut = self.encoding.decode(self.encoding.encode(text)[:max_tokens])
+        else:
+            cut = text[:max_tokens * CHARS_PER_TOKEN]
+
+        boundary = max(cut.rfind('. '), cut.rfind('! '), cut.rfind('? '))
+        if boundary > 0:
+            return cut[:boundary + 1]
+        return cut.rstrip()
@@ -0,0 +1,207 @@
+import os
+import json
+import signal
+import socket
+import logging
+import threading
+import tempfile
+import socketserver
+from typing import Any, Dict, Iterator, Optional
+
+# Only the standard library and metrics are imported here, so the client side stays
+# fast: a CLI call forwarded to a running daemon never loads langchain or the models.
+from . import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def default_socket_path() -> str:
+    """The daemon socket: RAG_QA_SOCKET, or a per-user file in the temp directory."""
+    user = os.getuid() if hasattr(os, "getuid") else os.getenv("USERNAME", "user")
+    return os.getenv("RAG_QA_SOCKET") or os.path.join(tempfile.gettempdir(), f"rag_qa_agent_{user}.sock")
+
+
+def json_default(value: Any) -> Any:
+    """Serialize the NumPy scalars and other odd values found in results."""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _send(stream, message: Dict[str, Any]):
+    """Write one newline-delimited JSON message."""
+    stream.write(json.dumps(message, default=json_default).encode("utf-8") + b"\n")
+    stream.flush()
+
+
+class _AgentRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Answers newline-delimited JSON requests on one connection.
+
+    Requests are {"query": ..., "stream": bool, "deadline": seconds} or {"command": "stats"}.
+    A query gets a {"result": ...} message; a streamed one gets the result without its
+    answer first, then {"token": ...} messages, then the final {"result": ..., "done": true}.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get("command") == "stats":
+                    _send(self.wfile, {"stats": metrics.latency_summary(), "done": True})
+                else:
+                    self._answer(request["query"], bool(request.get("stream")), request.get("deadline"))
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            except Exception as e:
+                logger.error(f"Daemon request failed: {e}")
+                _send(self.wfile, {"error": str(e), "done": True})
+
+    def _answer(self, query: str, stream: bool, deadline: Optional[float]):
+        agent = self.server.agent
+        if stream and deadline is None:
+            result = agent.process_query_stream(query)
+            answer_stream = result.pop("answer_stream")
+            _send(self.wfile, {"result": result})
+            for token in answer_stream:
+                _send(self.wfile, {"token": token})
+        else:
+            result = agent.process_query(query, deadline=deadline)
+        _send(self.wfile, {"result": result, "done": True})
+
+
+class _AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves each connection on its own thread; the Agent is shared between them."""
+    daemon_threads = True
+
+
+def is_running(socket_path: Optional[str] = None) -> bool:
+    """Check whether a daemon is accepting connections on the socket."""
+    socket_path = socket_path or default_socket_path()
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(1.0)
+            client.connect(socket_path)
+        return True
+    except OSError:
+        return False
+
+
+def _interrupt(signum, frame):
+    """Turn SIGTERM into KeyboardInterrupt, so the daemon shuts down cleanly."""
+    raise KeyboardInterrupt
+
+
+def serve(agent, socket_path: Optional[str] = None):
+    """
+    Keep an Agent warm behind a Unix domain socket until interrupted.
+
+    Args:
+        agent (Agent): Initialized agent answering every client.
+        socket_path (Optional[str]): Socket to listen on. Defaults to `default_socket_path()`.
+
+    Raises:
+        RuntimeError: If another daemon is already listening on the socket.
+    """
+    socket_path = socket_path or default_socket_path()
+    if is_running(socket_path):
+        raise RuntimeError(f"A daemon is already running on {socket_path}")
+    if os.path.exists(socket_path):
+        # Left behind by a daemon that didn't shut down cleanly
+        os.remove(socket_path)
+
+    # Only the current user may connect
+    old_umask = os.umask(0o177)
+    try:
+        server = _AgentServer(socket_path, _AgentRequestHandler)
+    finally:
+        os.umask(old_umask)
+    server.agent = agent
+
+    # Clean up on `kill` as well as on Ctrl+C
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _interrupt)
+
+    logger.info(f"Serving queries on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Daemon interrupted")
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+class DaemonClient:
+    """
+    Forwards queries to a running daemon over its Unix domain socket.
+
+    Offers the Agent's `process_query` and `process_query_stream`, so callers can use
+    either interchangeably.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Initialize the DaemonClient.
+
+        Args:
+            socket_path (Optional[str]): Socket of the daemon. Defaults to `default_socket_path()`.
+            timeout (Optional[float]): Seconds to wait for each message from the daemon, or None to wait indefinitely.
+        """
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(socket_path or default_socket_path())
+        self._reader = self.socket.makefile("rb")
+        self._writer = self.socket.makefile("wb")
+
+    def _receive(self) -> Dict[str, Any]:
+        """Read one message, raising RuntimeError for errors reported by the daemon."""
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("The daemon closed the connection")
+        message = json.loads(line)
+        if "error" in message:
+            raise RuntimeError(message["error"])
+        return message
+
+    def process_query(self, query: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Answer a query in the daemon; returns the same dictionary as `Agent.process_query`."""
+        _send(self._writer, {"query": query, "deadline": deadline})
+        return self._receive()["result"]
+
+    def process_query_stream(self, query: str) -> Dict[str, Any]:
+        """
+        Answer a query in the daemon, streaming the answer as `Agent.process_query_stream` does.
+
+        "answer_stream" yields the answer fragments; "answer" and the timings are filled
+        in once it is exhausted.
+        """
+        _send(self._writer, {"query": query, "stream": True})
+        result = self._receive()["result"]
+
+        def answer_stream() -> Iterator[str]:
+            while True:
+                message = self._receive()
+                if message.get("done"):
+                    result.update(message["result"])
+                    return
+                yield message["token"]
+
+        result["answer_stream"] = answer_stream()
+        return result
+
+    def latency_summary(self) -> Dict[str, Dict[str, float]]:
+        """The daemon's per-stage latency percentiles, as from `metrics.latency_summary`."""
+        _send(self._writer, {"command": "stats"})
+        return self._receive()["stats"]
+
+    def close(self):
+        """Close the connection."""
+        self._reader.close()
+        self._writer.close()
+        self.socket.close()
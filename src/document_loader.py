@@ -23,6 +23,7 @@ class DocumentLoader:
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             length_function=len,
+            add_start_index=True,  # lets the context packer merge overlapping chunks exactly
         )
     
     def load_documents(self) -> List[Document]:
@@ -0,0 +1,183 @@
+import os
+import re
+import bz2
+import gzip
+import json
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Where DictionaryTool looks for a local index unless ENCYCLOPEDIA_INDEX says otherwise
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "encyclopedia.db")
+
+# Sentences kept per article; lookups return at most this many
+MAX_SENTENCES = 5
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def _open_dump(path: str):
+    """Open a dump file as text, decompressing .bz2 and .gz files on the fly."""
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _lead_section(title: str, text: str) -> str:
+    """Return the first MAX_SENTENCES sentences of an article's first paragraph (other than its title)."""
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if paragraph and paragraph != title:
+            return " ".join(SENTENCE_END.split(paragraph)[:MAX_SENTENCES])
+    return ""
+
+
+def _read_articles(dump_path: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (title, lead section) pairs from a JSON-lines dump.
+
+    Each line is an object with "title" and "text" fields, as written by
+    `wikiextractor --json`. Empty articles and disambiguation pages are skipped.
+    """
+    with _open_dump(dump_path) as dump:
+        for line_number, line in enumerate(dump, 1):
+            if not line.strip():
+                continue
+            try:
+                article = json.loads(line)
+                title = article["title"].strip()
+                summary = _lead_section(title, article["text"])
+            except (ValueError, KeyError, AttributeError):
+                logger.warning(f"Skipping malformed line {line_number} of {dump_path}")
+                continue
+            if title and summary and not summary.rstrip().endswith("refer to:"):
+                yield title, summary
+
+
+def build_index(dump_path: str, index_path: str = DEFAULT_INDEX_PATH) -> int:
+    """
+    Build a local encyclopedia index from an offline dump.
+
+    Only the lead section of each article is stored, with an FTS5 full-text index over
+    titles and lead sections. The index is written to a temporary file and moved into
+    place when complete, so readers never see a partial index.
+
+    Args:
+        dump_path (str): JSON-lines dump with "title" and "text" per line (optionally .bz2 or .gz).
+        index_path (str): Where to write the SQLite index.
+
+    Returns:
+        int: Number of articles indexed.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    temp_path = index_path + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    connection = sqlite3.connect(temp_path)
+    try:
+        connection.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE articles (id INTEGER PRIMARY KEY, title TEXT NOT NULL UNIQUE COLLATE NOCASE,
+                                   summary TEXT NOT NULL);
+            CREATE VIRTUAL TABLE articles_fts USING fts5(title, summary, content='articles', content_rowid='id');
+        """)
+        # The first article wins when a dump repeats a title
+        connection.executemany("INSERT OR IGNORE INTO articles (title, summary) VALUES (?, ?)",
+                               _read_articles(dump_path))
+        connection.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+        connection.execute("INSERT INTO articles_fts (articles_fts) VALUES ('optimize')")
+        count = connection.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(temp_path, index_path)
+    logger.info(f"Indexed {count} articles from {dump_path} into {index_path}")
+    return count
+
+
+class LocalEncyclopedia:
+    """
+    Read-only lookups in an encyclopedia index built by `build_index`.
+
+    Mirrors the parts of the wikipedia client DictionaryTool uses: `summary` for an
+    exact (case-insensitive) title and `search` for ranked full-text matches. Each
+    thread gets its own read-only SQLite connection.
+    """
+
+    def __init__(self, index_path: str = DEFAULT_INDEX_PATH):
+        """
+        Initialize the LocalEncyclopedia.
+
+        Args:
+            index_path (str): Path of the SQLite index.
+
+        Raises:
+            FileNotFoundError: If there is no index at `index_path`.
+        """
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"No encyclopedia index at {index_path}")
+        self.index_path = index_path
+        self._uri = Path(index_path).resolve().as_uri() + "?mode=ro"
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._uri, uri=True)
+            self._local.connection = connection
+        return connection
+
+    def summary(self, title: str, sentences: int = 3) -> Optional[str]:
+        """
+        Lead section of the article with exactly this title, ignoring case.
+
+        Args:
+            title (str): Article title.
+            sentences (int): Maximum number of sentences to return.
+
+        Returns:
+            Optional[str]: The summary, or None if there is no such article.
+        """
+        row = self._connection().execute(
+            "SELECT summary FROM articles WHERE title = ?", (title.strip(),)).fetchone()
+        if row is None:
+            return None
+        return " ".join(SENTENCE_END.split(row[0])[:sentences])
+
+    def search(self, query: str, results: int = 1) -> List[str]:
+        """
+        Titles of the articles containing every word of the query, best first.
+
+        Matches in titles count ten times as much as matches in lead sections. Articles
+        sharing only some of the words don't match, so a multi-word term isn't answered
+        with a loosely related article that happens to share one common word.
+
+        Args:
+            query (str): Free-text query.
+            results (int): Maximum number of titles to return.
+
+        Returns:
+            List[str]: Matching titles; empty if nothing matches.
+        """
+        words = re.findall(r'\w+', query)
+        if not words:
+            return []
+        # Quote every word so user text is never parsed as FTS5 syntax; juxtaposed
+        # terms must all match
+        match = " ".join('"' + word + '"' for word in words)
+        rows = self._connection().execute(
+            "SELECT title FROM articles_fts WHERE articles_fts MATCH ? "
+            "ORDER BY bm25(articles_fts, 10.0, 1.0) LIMIT ?", (match, results)).fetchall()
+        return [row[0] for row in rows]
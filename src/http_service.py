@@ -0,0 +1,362 @@
+import json
+import time
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import metrics
+from .daemon import json_default
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+def _bounded_int(request: Dict[str, Any], name: str, default: int, maximum: int) -> int:
+    """
+    An integer field of a request body, clamped to 1..maximum.
+
+    Raises:
+        ValueError: If the field is present but not a JSON integer.
+    """
+    value = request.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"{name} must be an integer")
+    return max(1, min(value, maximum))
+
+
+class ServiceBusyError(Exception):
+    """Raised when a request can't be queued; answered with 429 Too Many Requests."""
+
+
+class EmbeddingBatcher:
+    """
+    Embeds concurrent queries together, one encoder forward pass per batch.
+
+    The first query to arrive opens a window of `max_wait` seconds (cut short once
+    `max_batch_size` queries are waiting); everything queued by then is embedded in
+    one `embed_queries` call. Only one batch runs at a time, so queries arriving
+    during a forward pass are batched into the next one. Pass `embed` to the Agent as
+    its `async_embedder`.
+    """
+
+    def __init__(self, vector_store, max_batch_size: int = 32, max_wait: float = 0.005, max_queue: int = 512):
+        """
+        Initialize the EmbeddingBatcher.
+
+        Args:
+            vector_store (VectorStore): Vector store whose embedding model is used.
+            max_batch_size (int): Maximum number of queries per forward pass.
+            max_wait (float): Seconds to wait for more queries before embedding a partial batch.
+            max_queue (int): Maximum number of queries waiting; more raise ServiceBusyError.
+        """
+        self.vector_store = vector_store
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.batches = 0
+        self.embedded = 0
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-batch")
+        self._worker: Optional[asyncio.Task] = None
+        self._has_pending: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of queries waiting to be embedded."""
+        return len(self._pending)
+
+    async def embed(self, query: str) -> List[float]:
+        """
+        Embed a query as part of the next batch.
+
+        Raises:
+            ServiceBusyError: If `max_queue` queries are already waiting.
+        """
+        if len(self._pending) >= self.max_queue:
+            raise ServiceBusyError("Embedding queue is full")
+        if self._worker is None:
+            # Events and the worker belong to the loop of the first caller
+            self._has_pending = asyncio.Event()
+            self._batch_full = asyncio.Event()
+            self._worker = asyncio.ensure_future(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((query, future))
+        self._has_pending.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+        return await future
+
+    async def _run(self):
+        """Embed queued queries batch by batch, forever."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._has_pending.wait()
+            if len(self._pending) < self.max_batch_size:
+                self._batch_full.clear()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = [(query, future) for query, future in self._pending[:self.max_batch_size]
+                     if not future.cancelled()]
+            del self._pending[:self.max_batch_size]
+            if not self._pending:
+                self._has_pending.clear()
+            if not batch:
+                continue
+
+            try:
+                embeddings = await loop.run_in_executor(
+                    self._executor, self.vector_store.embed_queries, [query for query, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.embedded += len(batch)
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+
+class HTTPService:
+    """
+    Minimal asyncio HTTP/1.1 service around an Agent.
+
+    Endpoints (JSON in and out, except /metrics):
+        POST /query     {"query": str, "deadline": seconds}        -> result of `Agent.aprocess_query`
+        POST /retrieve  {"query": str, "top_k": int}               -> {"documents": [...]}
+        POST /batch     {"queries": [str], "concurrency": int, "questions_per_call": int} -> {"results": [...]}
+        GET  /metrics   Prometheus text: stage latency percentiles, request counts, queue depth
+        GET  /health    {"status": "ok"}
+
+    Query embeddings go through an EmbeddingBatcher. Requests beyond `max_inflight`,
+    or arriving while the embedding queue is full, get 429 with a Retry-After header.
+    """
+
+    def __init__(self, agent, max_inflight: int = 64, max_batch_queries: int = 100, max_batch_workers: int = 2,
+                 max_top_k: int = 20, max_questions_per_call: int = 10, max_body_bytes: int = 1024 * 1024, batcher: Optional[EmbeddingBatcher] = None):
+        """
+        Initialize the HTTPService.
+
+        Args:
+            agent (Agent): Initialized agent. Its async embedder is replaced by the batcher's.
+            max_inflight (int): Maximum number of requests processed at once.
+            max_batch_queries (int): Maximum number of queries in one /batch request.
+            max_batch_workers (int): Maximum number of /batch requests processed at once; others wait for a turn.
+            max_top_k (int): Maximum number of chunks one /retrieve request may ask for.
+            max_questions_per_call (int): Maximum number of /batch questions answered by one LLM call.
+            max_body_bytes (int): Maximum request body size.
+            batcher (Optional[EmbeddingBatcher]): Embedding batcher. Defaults to one over the agent's vector store.
+        """
+        self.agent = agent
+        self.batcher = batcher or EmbeddingBatcher(agent.vector_store)
+        self.agent.async_embedder = self.batcher.embed
+        self.max_inflight = max_inflight
+        self.max_batch_queries = max_batch_queries
+        # Batches block a thread for their whole run, so they get their own pool rather
+        # than starving the default executor that /retrieve and the async agent rely on
+        self._batch_executor = ThreadPoolExecutor(max_workers=max_batch_workers, thread_name_prefix="http-batch")
+        self.max_top_k = max_top_k
+        self.max_questions_per_call = max_questions_per_call
+        self.max_body_bytes = max_body_bytes
+        self.inflight = 0
+        self.requests = Counter()
+        self.routes = {
+            ("POST", "/query"): self._query,
+            ("POST", "/retrieve"): self._retrieve,
+            ("POST", "/batch"): self._batch,
+            ("GET", "/metrics"): self._metrics,
+            ("GET", "/health"): self._health,
+        }
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000):
+        """Serve requests until cancelled."""
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info(f"HTTP service listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer requests on one keep-alive connection until the client closes it."""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload, extra_headers = await self._dispatch(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, payload, extra_headers, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            self._write_response(writer, 400, {"error": str(e)}, {}, keep_alive=False)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """Read one request: (method, path, headers, body), or None at end of stream."""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise ValueError("Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", "0") or 0)
+        if length > self.max_body_bytes:
+            raise ValueError(f"Request body larger than {self.max_body_bytes} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Any, Dict[str, str]]:
+        """Route a request to its handler and turn errors into HTTP statuses."""
+        handler = self.routes.get((method, path))
+        if handler is None:
+            status = 405 if any(route_path == path for _, route_path in self.routes) else 404
+            # Unknown paths share one label, so scanners can't grow /metrics without bound
+            return self._count(path if status == 405 else "other", status), {"error": REASONS[status]}, {}
+
+        # Cheap endpoints are never refused, so load balancers can always probe the service
+        limited = path not in ("/metrics", "/health")
+        if limited and self.inflight >= self.max_inflight:
+            return self._count(path, 429), {"error": "Too many requests in flight"}, {"Retry-After": "1"}
+
+        if limited:
+            self.inflight += 1
+        try:
+            request = json.loads(body) if body else {}
+            if not isinstance(request, dict):
+                raise ValueError("Request body must be a JSON object")
+            status, payload = await handler(request)
+            return self._count(path, status), payload, {}
+        except ServiceBusyError as e:
+            return self._count(path, 429), {"error": str(e)}, {"Retry-After": "1"}
+        except (ValueError, KeyError, TypeError) as e:
+            return self._count(path, 400), {"error": f"Invalid request: {e}"}, {}
+        except Exception as e:
+            logger.error(f"Error handling {path}: {e}")
+            return self._count(path, 500), {"error": str(e)}, {}
+        finally:
+            if limited:
+                self.inflight -= 1
+
+    def _count(self, path: str, status: int) -> int:
+        """Count a response for /metrics and pass its status through."""
+        self.requests[(path, status)] += 1
+        return status
+
+    def _write_response(self, writer: asyncio.StreamWriter, status: int, payload: Any,
+                        extra_headers: Dict[str, str], keep_alive: bool):
+        """Write a JSON (or, for strings, plain-text) response."""
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, default=json_default).encode("utf-8"), "application/json"
+        headers = {"Content-Type": content_type, "Content-Length": str(len(body)),
+                   "Connection": "keep-alive" if keep_alive else "close", **extra_headers}
+        head = f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+
+    async def _query(self, request: Dict[str, Any]) -> Tuple[int, Any]:
+        """POST /query: answer one query."""
+        query = str(request["query"])
+        deadline = request.get("deadline")
+        result = await self.agent.aprocess_query(query, deadline=float(deadline) if deadline is not None else None)
+        return 200, result
+
+    async def _retrieve(self, request: Dict[str, Any]) -> Tuple[int, Any]:
+        """POST /retrieve: the top_k chunks closest to the query, without calling the LLM."""
+        query = str(request["query"])
+        top_k = _bounded_int(request, "top_k", 3, self.max_top_k)
+        start = time.perf_counter()
+        with metrics.collect_timings() as timings:
+            with metrics.span("embedding"):
+                embedding = await self.batcher.embed(query)
+            loop = asyncio.get_running_loop()
+            docs_with_scores = await loop.run_in_executor(
+                None, metrics.bind(self.agent.vector_store.retrieve_by_vector, embedding, top_k))
+        metrics.record("retrieve_endpoint", time.perf_counter() - start)
+        documents = [{"content": doc.page_content, "metadata": doc.metadata, "score": float(score)}
+                     for doc, score in docs_with_scores]
+        return 200, {"query": query, "documents": documents, "timings": dict(timings)}
+
+    async def _batch(self, request: Dict[str, Any]) -> Tuple[int, Any]:
+        """POST /batch: answer many queries with the Agent's batched path."""
+        queries = [str(query) for query in request["queries"]]
+        if len(queries) > self.max_batch_queries:
+            return 413, {"error": f"At most {self.max_batch_queries} queries per batch"}
+        concurrency = _bounded_int(request, "concurrency", 4, self.max_inflight)
+        questions_per_call = _bounded_int(request, "questions_per_call", 5, self.max_questions_per_call)
+        deadline = request.get("deadline")
+        results = await asyncio.get_running_loop().run_in_executor(
+            self._batch_executor, self.agent.process_queries, queries, concurrency,
+            float(deadline) if deadline is not None else None, questions_per_call)
+        return 200, {"results": results}
+
+    async def _health(self, request: Dict[str, Any]) -> Tuple[int, Any]:
+        """GET /health: liveness probe."""
+        return 200, {"status": "ok"}
+
+    async def _metrics(self, request: Dict[str, Any]) -> Tuple[int, Any]:
+        """GET /metrics: Prometheus text exposition of latencies, requests and queue state."""
+        lines = ["# HELP rag_qa_stage_seconds Latency of each processing stage (recent window).",
+                 "# TYPE rag_qa_stage_seconds summary"]
+        for stage, stats in metrics.latency_summary().items():
+            for key, quantile in (("p50", "0.5"), ("p95", "0.95"), ("p99", "0.99")):
+                lines.append(f'rag_qa_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {stats[key]:.6f}')
+            lines.append(f'rag_qa_stage_seconds_sum{{stage="{stage}"}} {stats["mean"] * stats["count"]:.6f}')
+            lines.append(f'rag_qa_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+
+        lines += ["# HELP rag_qa_http_requests_total Responses by endpoint and status.",
+                  "# TYPE rag_qa_http_requests_total counter"]
+        for (path, status), count in sorted(self.requests.items()):
+            lines.append(f'rag_qa_http_requests_total{{path="{path}",status="{status}"}} {count}')
+
+        lines += ["# TYPE rag_qa_inflight_requests gauge", f"rag_qa_inflight_requests {self.inflight}",
+                  "# TYPE rag_qa_embedding_queue_depth gauge", f"rag_qa_embedding_queue_depth {self.batcher.queue_depth}",
+                  "# TYPE rag_qa_embedding_batches_total counter", f"rag_qa_embedding_batches_total {self.batcher.batches}",
+                  "# TYPE rag_qa_embedded_queries_total counter", f"rag_qa_embedded_queries_total {self.batcher.embedded}"]
+        return 200, "\n".join(lines) + "\n"
+
+
+def run_http_service(agent, host: str = "127.0.0.1", port: int = 8000, **kwargs):
+    """
+    Serve the agent over HTTP until interrupted.
+
+    Args:
+        agent (Agent): Initialized agent.
+        host (str): Interface to listen on.
+        port (int): Port to listen on.
+        **kwargs: Options for HTTPService.
+    """
+    service = HTTPService(agent, **kwargs)
+    try:
+        asyncio.run(service.serve(host, port))
+    except KeyboardInterrupt:
+        logger.info("HTTP service interrupted")
@@ -0,0 +1,278 @@
+import os
+import re
+import json
+import asyncio
+import time
+import math
+import random
+import logging
+import threading
+from typing import Iterator, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend:
+    """Interface for the text-generation service used by LLMIntegration."""
+
+    name = "base"
+
+    def invoke(self, prompt: str, cancel_event: Optional[threading.Event] = None) -> str:
+        """
+        Generate a complete response for a prompt.
+
+        Args:
+            prompt (str): Fully formatted prompt.
+            cancel_event (Optional[threading.Event]): Set by the caller once the result is no
+                longer wanted. Backends that can abort early should stop and raise
+                BackendCancelledError; others may ignore it.
+
+        Returns:
+            str: Generated text.
+        """
+        raise NotImplementedError
+
+    async def ainvoke(self, prompt: str) -> str:
+        """
+        Generate a complete response for a prompt without blocking the event loop.
+
+        Backends without a native async client run `invoke` on a worker thread and
+        ask it to stop if the awaiting task is cancelled.
+
+        Args:
+            prompt (str): Fully formatted prompt.
+
+        Returns:
+            str: Generated text.
+        """
+        cancel_event = threading.Event()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, lambda: self.invoke(prompt, cancel_event=cancel_event))
+        finally:
+            cancel_event.set()
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """
+        Generate a response for a prompt, yielding fragments as they are produced.
+
+        Backends without native streaming yield the whole response at once.
+
+        Args:
+            prompt (str): Fully formatted prompt.
+
+        Yields:
+            str: Response fragments.
+        """
+        yield self.invoke(prompt)
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through langchain's ChatGoogleGenerativeAI."""
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = "gemini-1.5-pro", temperature: float = 0.1):
+        """
+        Initialize the Gemini backend.
+
+        Args:
+            model_name (str): Name of the Google Gemini model to use.
+            temperature (float): Sampling temperature.
+        """
+        # Get API key from environment variable
+        google_api_key = os.getenv("GOOGLE_API_KEY")
+        if not google_api_key:
+            raise ValueError("GOOGLE_API_KEY environment variable not set. Please add it to your .env file.")
+
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        self.llm = ChatGoogleGenerativeAI(
+            model=model_name,
+            google_api_key=google_api_key,
+            temperature=temperature,
+            convert_system_message_to_human=True
+        )
+
+    def invoke(self, prompt: str, cancel_event: Optional[threading.Event] = None) -> str:
+        # The Gemini client cannot abort a request in flight; a cancelled call's result is discarded
+        return self.llm.invoke(prompt).content
+
+    async def ainvoke(self, prompt: str) -> str:
+        return (await self.llm.ainvoke(prompt)).content
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.llm.stream(prompt):
+            if chunk.content:
+                yield chunk.content
+
+
+class BackendCancelledError(Exception):
+    """Raised by a backend that stopped a call because its cancel event was set."""
+
+
+class FakeBackendError(Exception):
+    """Error injected by FakeBackend, worded like the real API errors."""
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic local stand-in for the LLM, for offline load testing.
+
+    Responses are built from the prompt itself, and latency, throughput and
+    failures are drawn from a seeded random generator, so runs are repeatable.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.5, latency_jitter: float = 0.2,
+                 latency_distribution: str = "lognormal", tokens_per_second: float = 50.0,
+                 rate_limit_rate: float = 0.0, error_rate: float = 0.0,
+                 retry_delay: Optional[int] = None, answer_words: int = 40, seed: int = 0):
+        """
+        Initialize the fake backend.
+
+        Args:
+            latency (float): Typical time to first token in seconds (median for lognormal).
+            latency_jitter (float): Spread of the latency: sigma for lognormal, stddev for normal,
+                half-width for uniform. Ignored by "constant" and "exponential".
+            latency_distribution (str): One of "constant", "normal", "lognormal", "uniform", "exponential".
+            tokens_per_second (float): Generation speed after the first token.
+            rate_limit_rate (float): Probability that a call fails with a 429 quota error.
+            error_rate (float): Probability that a call fails with a server error.
+            retry_delay (Optional[int]): Seconds advertised in injected 429 errors, or None to omit it.
+            answer_words (int): Maximum number of words in a response.
+            seed (int): Seed for the random generator.
+        """
+        if latency_distribution not in ("constant", "normal", "lognormal", "uniform", "exponential"):
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.latency_distribution = latency_distribution
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.retry_delay = retry_delay
+        self.answer_words = answer_words
+        self.calls = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "FakeBackend":
+        """Create a fake backend configured through FAKE_LLM_* environment variables."""
+        retry_delay = os.getenv("FAKE_LLM_RETRY_DELAY")
+        return cls(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0.5")),
+            latency_jitter=float(os.getenv("FAKE_LLM_LATENCY_JITTER", "0.2")),
+            latency_distribution=os.getenv("FAKE_LLM_LATENCY_DISTRIBUTION", "lognormal"),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50")),
+            rate_limit_rate=float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            retry_delay=int(retry_delay) if retry_delay else None,
+            seed=int(os.getenv("FAKE_LLM_SEED", "0"))
+        )
+
+    def _draw(self):
+        """Draw the latency and outcome of one call."""
+        with self._lock:
+            self.calls += 1
+            outcome = self._random.random()
+            if self.latency_distribution == "constant":
+                latency = self.latency
+            elif self.latency_distribution == "normal":
+                latency = self._random.gauss(self.latency, self.latency_jitter)
+            elif self.latency_distribution == "lognormal":
+                latency = self._random.lognormvariate(math.log(max(self.latency, 1e-6)), self.latency_jitter)
+            elif self.latency_distribution == "uniform":
+                latency = self._random.uniform(self.latency - self.latency_jitter, self.latency + self.latency_jitter)
+            else:
+                latency = self._random.expovariate(1.0 / max(self.latency, 1e-6))
+        return max(0.0, latency), outcome
+
+    def _check_failure(self, outcome: float):
+        """Raise the injected error for this call, if any."""
+        if outcome < self.rate_limit_rate:
+            message = "429 Resource has been exhausted (e.g. check quota)."
+            if self.retry_delay is not None:
+                message += f" retry_delay {{ seconds: {self.retry_delay} }}"
+            raise FakeBackendError(message)
+        if outcome < self.rate_limit_rate + self.error_rate:
+            raise FakeBackendError("500 An internal error has occurred.")
+
+    def _answer_words(self, prompt: str):
+        """Build a deterministic answer from the question and context in the prompt."""
+        question = re.search(r'Question:\s*(.+)', prompt)
+        context = re.search(r'Context:\s*(.+?)\s*Question:', prompt, re.DOTALL)
+        words = ["Based", "on", "the", "context,", "the", "answer", "to"]
+        words += (question.group(1).strip() if question else "the question").split()
+        words += ["is:"] + (context.group(1).split() if context else [])
+        return words[:self.answer_words]
+
+    def _response_words(self, prompt: str):
+        """Build the response words, answering batched prompts with a JSON object."""
+        sections = re.split(r'^### Question (\d+)\s*$', prompt, flags=re.MULTILINE)
+        if len(sections) < 3:
+            return self._answer_words(prompt)
+        answers = {number: " ".join(self._answer_words(section))
+                   for number, section in zip(sections[1::2], sections[2::2])}
+        return json.dumps(answers).split(" ")
+
+    def _sleep(self, seconds: float, cancel_event: Optional[threading.Event]):
+        """Sleep, returning early with BackendCancelledError if the call is cancelled."""
+        if cancel_event is None:
+            time.sleep(seconds)
+        elif cancel_event.wait(seconds):
+            raise BackendCancelledError("Fake LLM call cancelled")
+
+    def invoke(self, prompt: str, cancel_event: Optional[threading.Event] = None) -> str:
+        latency, outcome = self._draw()
+        self._sleep(latency, cancel_event)
+        self._check_failure(outcome)
+
+        words = self._response_words(prompt)
+        self._sleep(len(words) / self.tokens_per_second, cancel_event)
+        return " ".join(words)
+
+    async def ainvoke(self, prompt: str) -> str:
+        latency, outcome = self._draw()
+        await asyncio.sleep(latency)
+        self._check_failure(outcome)
+
+        words = self._response_words(prompt)
+        await asyncio.sleep(len(words) / self.tokens_per_second)
+        return " ".join(words)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        latency, outcome = self._draw()
+        time.sleep(latency)
+        self._check_failure(outcome)
+
+        for i, word in enumerate(self._response_words(prompt)):
+            if i:
+                time.sleep(1.0 / self.tokens_per_second)
+            yield word if i == 0 else " " + word
+
+
+def create_backend(name: Optional[str] = None, model_name: str = "gemini-1.5-pro") -> LLMBackend:
+    """
+    Create an LLM backend by name.
+
+    Args:
+        name (Optional[str]): "gemini" or "fake". Defaults to the LLM_BACKEND environment variable, then "gemini".
+        model_name (str): Model name passed to the Gemini backend.
+
+    Returns:
+        LLMBackend: The configured backend.
+    """
+    name = (name or os.getenv("LLM_BACKEND") or "gemini").lower()
+    if name == "gemini":
+        return GeminiBackend(model_name)
+    if name == "fake":
+        logger.info("Using the fake LLM backend (no network calls)")
+        return FakeBackend.from_env()
+    raise ValueError(f"Unknown LLM backend: {name}")
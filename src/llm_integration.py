@@ -1,14 +1,25 @@
 import os
+import re
+import json
 import time
+import asyncio
+import tempfile
 import logging
 import random
-from typing import List, Tuple, Optional, Dict, Any
-from langchain_google_genai import ChatGoogleGenerativeAI
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import List, Tuple, Optional, Dict, Any, Iterator
 from langchain.schema import Document
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
 from dotenv import load_dotenv
 
+from .context_packer import ContextPacker
+from .llm_backends import LLMBackend, create_backend
+from .rate_limiter import RateLimiter
+from . import metrics
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, get_circuit_breaker
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -16,26 +27,39 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when an LLM attempt does not finish within its timeout."""
+
+
 class LLMIntegration:
-    def __init__(self, model_name: str = "gemini-1.5-pro"):
+    def __init__(self, model_name: str = "gemini-1.5-pro", context_token_budget: int = 2000,
+                 requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 backend: Optional[LLMBackend] = None, circuit_breaker: Optional[CircuitBreaker] = None,
+                 attempt_timeout: Optional[float] = 60.0, hedge_requests: bool = False):
         """
         Initialize the LLM integration with Google's Gemini model.
         
         Args:
             model_name (str): Name of the Google Gemini model to use.
+            context_token_budget (int): Maximum number of tokens of retrieved context sent per question.
+            requests_per_minute (Optional[float]): Request quota to pace calls against. Defaults to the
+                GEMINI_REQUESTS_PER_MINUTE environment variable; unset means no request limit.
+            tokens_per_minute (Optional[float]): Token quota to pace calls against. Defaults to the
+                GEMINI_TOKENS_PER_MINUTE environment variable; unset means no token limit.
+            backend (Optional[LLMBackend]): Backend that generates the text. Defaults to the one named
+                by the LLM_BACKEND environment variable ("gemini" unless set to "fake").
+            circuit_breaker (Optional[CircuitBreaker]): Breaker guarding the backend. Defaults to the
+                process-wide breaker shared by all integrations using the same backend and model.
+            attempt_timeout (Optional[float]): Seconds a single LLM attempt may take before it is
+                abandoned and retried, or None for no limit.
+            hedge_requests (bool): Send a duplicate request when an attempt runs past the p95
+                latency of recent calls, and keep whichever answers first.
         """
-        # Get API key from environment variable
-        google_api_key = os.getenv("GOOGLE_API_KEY")
-        if not google_api_key:
-            raise ValueError("GOOGLE_API_KEY environment variable not set. Please add it to your .env file.")
-        
-        # Initialize Gemini LLM
-        self.llm = ChatGoogleGenerativeAI(
-            model=model_name,
-            google_api_key=google_api_key,
-            temperature=0.1,
-            convert_system_message_to_human=True
-        )
+        self.model_name = model_name
+        
+        # Initialize the LLM backend (Gemini unless configured otherwise)
+        self.backend = backend or create_backend(model_name=model_name)
         
         self.qa_prompt_template = """
         You are a helpful assistant that provides accurate and informative answers based on the context provided.
@@ -56,12 +80,51 @@ class LLMIntegration:
             input_variables=["context", "question"]
         )
         
-        self.qa_chain = LLMChain(llm=self.llm, prompt=self.qa_prompt)
+        # Several independent questions answered in one call (see answers_from_contexts)
+        self.batch_prompt_header = """
+        You are a helpful assistant that provides accurate and informative answers based on the context provided.
+        
+        Below are several numbered questions, each with its own context. Answer every question based only
+        on the information in its own context. If a context doesn't contain the relevant information,
+        admit that you don't know rather than making up an answer.
+        """
+        
+        self.batch_prompt_footer = """
+        Respond with only a JSON object that maps each question number to its answer, for example:
+        {"1": "answer to question 1", "2": "answer to question 2"}
+        """
+        
+        # Merges overlapping chunks and keeps the context within the token budget
+        self.context_packer = ContextPacker(max_tokens=context_token_budget)
         
         # Retry configuration
         self.max_retries = 3
         self.base_delay = 2  # Base delay in seconds
         
+        # Client-side quota pacing, shared by every worker on this host using the same model
+        if requests_per_minute is None and os.getenv("GEMINI_REQUESTS_PER_MINUTE"):
+            requests_per_minute = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE"))
+        if tokens_per_minute is None and os.getenv("GEMINI_TOKENS_PER_MINUTE"):
+            tokens_per_minute = float(os.getenv("GEMINI_TOKENS_PER_MINUTE"))
+        state_path = os.getenv("GEMINI_RATE_LIMIT_FILE") or os.path.join(
+            tempfile.gettempdir(), f"rag_qa_rate_limiter_{self.backend.name}_{model_name}.json")
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute, state_path)
+        
+        # Fail fast instead of retrying while the backend is down or out of quota
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker((self.backend.name, model_name))
+        
+        # Per-attempt timeouts and hedging run backend calls on worker threads
+        self.attempt_timeout = attempt_timeout
+        self.hedge_requests = hedge_requests
+        self.hedge_min_samples = 20  # recent calls needed before the p95 is trusted
+        self._latencies = deque(maxlen=200)
+        self._latencies_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-call")
+        
+        # Output tokens reserved per call until the real count is known
+        self.expected_output_tokens = 512
+        self.prompt_overhead_tokens = self.context_packer.count_tokens(self.qa_prompt_template)
+        
     def generate_answer(self, query: str, docs_with_scores: List[Tuple[Document, float]]) -> str:
         """
         Generate an answer based on the query and retrieved documents.
@@ -76,62 +139,719 @@ class LLMIntegration:
         # Format the context from retrieved documents
         context = self._format_context(docs_with_scores)
         
+        return self.answer_from_context(query, context)
+    
+    def answer_from_context(self, query: str, context: str, deadline: Optional[float] = None) -> str:
+        """
+        Generate an answer from an already formatted context string.
+        
+        Args:
+            query (str): User query.
+            context (str): Context produced by `pack_context`.
+            deadline (Optional[float]): `time.monotonic()` value by which the answer is needed.
+            
+        Returns:
+            str: Generated answer.
+        """
         # Try to generate a response with retries
-        return self._call_with_retries(context, query)
+        return self._call_with_retries(context, query, deadline)
+    
+    async def aanswer_from_context(self, query: str, context: str, deadline: Optional[float] = None) -> str:
+        """
+        Generate an answer from an already formatted context string without blocking the event loop.
+        
+        Uses the backend's native async client; rate limiting, retries, timeouts,
+        hedging and the circuit breaker behave as in `answer_from_context`.
+        
+        Args:
+            query (str): User query.
+            context (str): Context produced by `pack_context`.
+            deadline (Optional[float]): `time.monotonic()` value by which the answer is needed.
+            
+        Returns:
+            str: Generated answer.
+        """
+        return await self._acall_with_retries(context, query, deadline)
+    
+    def generate_answers_batch(self, items: List[Tuple[str, List[Tuple[Document, float]]]],
+                               max_batch_size: int = 5) -> List[str]:
+        """
+        Answer several independent questions, packing up to `max_batch_size` of them into each LLM call.
+        
+        Args:
+            items (List[Tuple[str, List[Tuple[Document, float]]]]): (query, retrieved documents) pairs.
+            max_batch_size (int): Maximum number of questions per LLM call.
+            
+        Returns:
+            List[str]: Answers in the same order as `items`.
+            
+        Raises:
+            CircuitOpenError: If the circuit breaker is open or opens during a call.
+        """
+        pairs = [(query, self._format_context(docs_with_scores)) for query, docs_with_scores in items]
+        return self.answers_from_contexts(pairs, max_batch_size)
+    
+    def answers_from_contexts(self, pairs: List[Tuple[str, str]], max_batch_size: int = 5,
+                              max_batch_tokens: int = 8000) -> List[str]:
+        """
+        Answer (question, context) pairs with as few LLM calls as possible.
+        
+        Pairs are grouped into one structured prompt per call, capped by question count
+        and estimated prompt size. Questions whose answer cannot be parsed out of the
+        batched response are answered with individual calls. Used by
+        `Agent.process_queries` when it is given `questions_per_call` above 1.
+        
+        Args:
+            pairs (List[Tuple[str, str]]): (question, context) pairs, contexts from `pack_context`.
+            max_batch_size (int): Maximum number of questions per LLM call.
+            max_batch_tokens (int): Maximum estimated prompt tokens per LLM call.
+            
+        Returns:
+            List[str]: Answers in the same order as `pairs`; error messages for questions that failed.
+            
+        Raises:
+            CircuitOpenError: If the circuit breaker is open or opens during a call.
+        """
+        answers: List[Optional[str]] = [None] * len(pairs)
+        
+        for group in self._batch_groups(pairs, max_batch_size, max_batch_tokens):
+            if len(group) > 1:
+                parsed = self._answer_batch([pairs[i] for i in group])
+                for position, i in enumerate(group):
+                    answers[i] = parsed.get(position + 1)
+            
+            # Single questions, and anything the batched call did not answer, go one by one
+            missing = [i for i in group if answers[i] is None]
+            if len(group) > 1 and missing:
+                logger.warning(f"Batched call left {len(missing)} of {len(group)} questions unanswered; "
+                               f"falling back to individual calls")
+            for i in missing:
+                question, context = pairs[i]
+                answers[i] = self.answer_from_context(question, context)
+        
+        return answers
+    
+    def _batch_groups(self, pairs: List[Tuple[str, str]], max_batch_size: int, max_batch_tokens: int) -> List[List[int]]:
+        """Split pair indices into consecutive groups that respect the size and token caps."""
+        groups = []
+        current: List[int] = []
+        current_tokens = 0
+        for i, (question, context) in enumerate(pairs):
+            tokens = self.context_packer.count_tokens(context) + self.context_packer.count_tokens(question)
+            if current and (len(current) >= max_batch_size or current_tokens + tokens > max_batch_tokens):
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+    
+    def _answer_batch(self, pairs: List[Tuple[str, str]]) -> Dict[int, str]:
+        """
+        Ask several questions in one call.
+        
+        Args:
+            pairs (List[Tuple[str, str]]): (question, context) pairs.
+            
+        Returns:
+            Dict[int, str]: Answers keyed by 1-based question number; empty if the call failed.
+        """
+        sections = [f"### Question {n}\nContext:\n{context}\n\nQuestion: {question}\n"
+                    for n, (question, context) in enumerate(pairs, start=1)]
+        prompt = self.batch_prompt_header + "\n" + "\n".join(sections) + self.batch_prompt_footer
+        
+        expected_output = self.expected_output_tokens * len(pairs)
+        estimated_tokens = self.context_packer.count_tokens(prompt) + expected_output
+        
+        logger.info(f"Answering {len(pairs)} questions in one LLM call")
+        try:
+            with metrics.span("llm"):
+                response = self._invoke_with_retries(prompt, estimated_tokens, expected_output_tokens=expected_output)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Batched LLM call failed: {e}")
+            return {}
+        return self._parse_batch_response(response, len(pairs))
     
-    def _call_with_retries(self, context: str, question: str) -> str:
+    def _parse_batch_response(self, response: str, count: int) -> Dict[int, str]:
+        """
+        Extract per-question answers from a batched JSON response.
+        
+        Args:
+            response (str): Raw LLM response, possibly wrapped in a markdown code fence.
+            count (int): Number of questions asked.
+            
+        Returns:
+            Dict[int, str]: Non-empty answers keyed by question number (1..count).
+        """
+        start, end = response.find("{"), response.rfind("}")
+        if start == -1 or end <= start:
+            logger.warning("Batched response contained no JSON object")
+            return {}
+        try:
+            data = json.loads(response[start:end + 1])
+        except ValueError as e:
+            logger.warning(f"Could not parse batched response: {e}")
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        
+        answers = {}
+        for key, value in data.items():
+            match = re.fullmatch(r'\s*(?:question\s*)?(\d+)\s*', str(key), re.IGNORECASE)
+            if match and 1 <= int(match.group(1)) <= count and isinstance(value, str) and value.strip():
+                answers[int(match.group(1))] = value.strip()
+        return answers
+    
+    def generate_answer_stream(self, query: str, docs_with_scores: List[Tuple[Document, float]]) -> Iterator[str]:
+        """
+        Generate an answer and yield it token by token as the LLM produces it.
+        
+        Args:
+            query (str): User query.
+            docs_with_scores (List[Tuple[Document, float]]): List of retrieved documents with relevance scores.
+            
+        Yields:
+            str: Answer fragments in the order they arrive.
+        """
+        context = self._format_context(docs_with_scores)
+        return self.stream_from_context(query, context)
+    
+    def stream_from_context(self, query: str, context: str) -> Iterator[str]:
+        """
+        Stream an answer from an already formatted context string.
+        
+        Args:
+            query (str): User query.
+            context (str): Context produced by `pack_context`.
+            
+        Yields:
+            str: Answer fragments in the order they arrive.
+        """
+        return self._stream_with_retries(context, query)
+    
+    def is_available(self) -> bool:
+        """Whether LLM calls are currently allowed (False while the circuit breaker is open)."""
+        return not self.circuit_breaker.is_open()
+    
+    def _call_with_retries(self, context: str, question: str, deadline: Optional[float] = None) -> str:
         """
         Call the LLM with exponential backoff retry logic.
         
         Args:
             context (str): Context information.
             question (str): User question.
+            deadline (Optional[float]): `time.monotonic()` value after which no more attempts,
+                waits or sleeps are started.
             
         Returns:
             str: Generated answer or error message.
+            
+        Raises:
+            CircuitOpenError: If the circuit breaker is open or opens during the retries.
+        """
+        with metrics.span("prompt_formatting"):
+            prompt = self.qa_prompt.format(context=context, question=question)
+            estimated_tokens = self._estimate_tokens(context, question)
+        try:
+            with metrics.span("llm"):
+                return self._invoke_with_retries(prompt, estimated_tokens, deadline)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            return self._error_message(e)
+    
+    def _invoke_with_retries(self, prompt: str, estimated_tokens: int, deadline: Optional[float] = None,
+                             expected_output_tokens: Optional[int] = None) -> str:
+        """
+        Send a formatted prompt to the backend, retrying rate limits and timed-out attempts.
+        
+        Args:
+            prompt (str): Fully formatted prompt.
+            estimated_tokens (int): Tokens to reserve with the rate limiter per attempt.
+            deadline (Optional[float]): `time.monotonic()` value after which no more attempts,
+                waits or sleeps are started.
+            expected_output_tokens (Optional[int]): Output tokens included in `estimated_tokens`,
+                corrected once the response is known. Defaults to `self.expected_output_tokens`.
+            
+        Returns:
+            str: Backend response.
+            
+        Raises:
+            CircuitOpenError: If the circuit breaker is open or opens during the retries.
+            Exception: The last error once retries are exhausted or a non-retryable error occurs.
         """
         retries = 0
         last_exception = None
         
         while retries <= self.max_retries:
+            # Fail fast while the backend is known to be down, before taking any quota
+            self._check_circuit()
+            # Whether the attempt's outcome reached the breaker; if not, its probe slot is given back
+            settled = False
             try:
-                # Generate answer using the LLM chain
-                logger.info(f"Attempt {retries + 1}/{self.max_retries + 1} to call LLM API")
-                response = self.qa_chain.run(context=context, question=question)
-                return response
-            except Exception as e:
-                last_exception = e
-                error_str = str(e).lower()
-                
-                # Check if this is a quota/rate limit issue
-                if ("429" in error_str or "quota" in error_str or "rate limit" in error_str) and retries < self.max_retries:
-                    # Get retry delay information if available
-                    retry_delay = self._extract_retry_delay(error_str)
-                    if retry_delay:
-                        delay = retry_delay
-                    else:
-                        # Exponential backoff with jitter
-                        delay = (self.base_delay * (2 ** retries)) + (random.random() * 2)
+                try:
+                    # Pace ourselves under the quota instead of waiting for a 429
+                    self._wait_for_quota(estimated_tokens, self._remaining(deadline))
                     
-                    logger.warning(f"Rate limit exceeded. Retrying in {delay:.2f} seconds...")
-                    time.sleep(delay)
-                    retries += 1
-                    continue
+                    # Each attempt gets whatever is left of the deadline, capped by attempt_timeout
+                    timeout = self._attempt_timeout(deadline)
+                except TimeoutError as e:
+                    # Out of time before calling the backend: not a backend failure
+                    last_exception = e
+                    break
                 
+                try:
+                    # Generate answer using the LLM backend
+                    logger.info(f"Attempt {retries + 1}/{self.max_retries + 1} to call LLM API")
+                    metrics.count("llm_attempts")
+                    with metrics.span("llm_call"):
+                        response = self._invoke(prompt, timeout, estimated_tokens)
+                    self.circuit_breaker.record_success()
+                    settled = True
+                    self._record_usage(response, expected_output_tokens)
+                    return response
+                except Exception as e:
+                    settled = True
+                    delay, last_exception = self._after_failure(e, retries, deadline, timeout)
+            finally:
+                if not settled:
+                    self.circuit_breaker.release()
+            
+            if delay is None:
                 # For other errors or if we've exhausted retries, break the loop
                 break
+            if delay > 0:
+                with metrics.span("llm_backoff"):
+                    time.sleep(delay)
+            retries += 1
+            metrics.count("llm_retries")
         
         # If we're here, all retries failed or a non-retryable error occurred
         logger.error(f"Failed to generate response after {retries} retries: {last_exception}")
+        raise last_exception
+    
+    def _after_failure(self, exception: Exception, retries: int, deadline: Optional[float],
+                       timeout: Optional[float]) -> Tuple[Optional[float], Exception]:
+        """
+        Record a failed attempt and decide whether to retry it.
+        
+        Args:
+            exception (Exception): Error raised by the attempt.
+            retries (int): Retries made so far.
+            deadline (Optional[float]): `time.monotonic()` value after which no retry is started.
+            timeout (Optional[float]): Timeout the attempt was given.
+            
+        Returns:
+            Tuple[Optional[float], Exception]: Seconds to sleep before retrying (None to give up)
+            and the error to report if giving up.
+            
+        Raises:
+            CircuitOpenError: If repeated failures have opened the circuit breaker.
+        """
+        error_str = str(exception).lower()
+        
+        # The caller's deadline ran out, not the backend: this says nothing about its
+        # health, and a client sending tiny deadlines mustn't open the shared breaker
+        if isinstance(exception, LLMTimeoutError) and self._limited_by_deadline(timeout, deadline):
+            self.circuit_breaker.release()
+            return None, exception
+        
+        # Stop retrying as soon as repeated failures have opened the breaker
+        self.circuit_breaker.record_failure()
+        if self.circuit_breaker.is_open():
+            raise CircuitOpenError(self.circuit_breaker.retry_after()) from exception
+        
+        # Only quota/rate limit issues and stuck attempts are worth retrying
+        if not self._is_retryable(exception, error_str) or retries >= self.max_retries:
+            return None, exception
+        
+        delay = 0.0 if isinstance(exception, TimeoutError) else self._backoff_delay(retries, error_str)
+        remaining = self._remaining(deadline)
+        if remaining is not None and delay >= remaining:
+            logger.warning("Deadline too close to retry the LLM call")
+            return None, LLMTimeoutError("deadline exceeded before the next retry")
+        if delay > 0:
+            logger.warning(f"Rate limit exceeded. Retrying in {delay:.2f} seconds...")
+            # Hold back the other workers as well, they would hit the same limit
+            self._pause_quota(delay)
+        return delay, exception
+    
+    def _remaining(self, deadline: Optional[float]) -> Optional[float]:
+        """Seconds left until the deadline, or None without one."""
+        if deadline is None:
+            return None
+        return deadline - time.monotonic()
+    
+    def _limited_by_deadline(self, timeout: Optional[float], deadline: Optional[float]) -> bool:
+        """Whether an attempt's timeout was cut short by the deadline rather than set by attempt_timeout."""
+        if deadline is None or timeout is None:
+            return False
+        return self.attempt_timeout is None or timeout < self.attempt_timeout
+    
+    def _attempt_timeout(self, deadline: Optional[float]) -> Optional[float]:
+        """Timeout for the next attempt, raising LLMTimeoutError if the deadline has passed."""
+        remaining = self._remaining(deadline)
+        if remaining is not None and remaining <= 0:
+            raise LLMTimeoutError("deadline exceeded before the LLM call could start")
+        if remaining is None:
+            return self.attempt_timeout
+        if self.attempt_timeout is None:
+            return remaining
+        return min(self.attempt_timeout, remaining)
+    
+    def _invoke(self, prompt: str, timeout: Optional[float], estimated_tokens: int) -> str:
+        """
+        Run one backend call with a timeout, hedging it if it runs past the usual p95 latency.
+        
+        Args:
+            prompt (str): Fully formatted prompt.
+            timeout (Optional[float]): Seconds to wait for an answer, or None to wait indefinitely.
+            estimated_tokens (int): Tokens to reserve with the rate limiter for a hedged request.
+            
+        Returns:
+            str: The first successful response.
+            
+        Raises:
+            LLMTimeoutError: If no call finishes within the timeout.
+        """
+        start = time.monotonic()
+        cancel_event = threading.Event()
+        futures = [self._submit(prompt, cancel_event)]
+        
+        hedge_delay = self._hedge_delay() if self.hedge_requests else None
+        if hedge_delay is not None and (timeout is None or hedge_delay < timeout):
+            done, _ = wait(futures, timeout=hedge_delay)
+            # Only hedge when the quota allows an extra request right now
+            if not done and self._reserve_hedge(estimated_tokens):
+                logger.info(f"LLM call exceeded p95 latency ({hedge_delay:.2f}s); sending a hedged request")
+                futures.append(self._submit(prompt, cancel_event))
+        
+        pending = set(futures)
+        last_exception = None
+        try:
+            while pending:
+                remaining = None if timeout is None else timeout - (time.monotonic() - start)
+                if remaining is not None and remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    last_exception = future.exception()
+            if last_exception is not None and not pending:
+                raise last_exception
+            raise LLMTimeoutError(f"LLM call timed out after {timeout:.1f} seconds")
+        finally:
+            # Cancel whichever calls lost the race or ran out of time
+            cancel_event.set()
+            for future in futures:
+                future.cancel()
+    
+    def _reserve_hedge(self, estimated_tokens: int) -> bool:
+        """Take rate limiter capacity for a hedged request (which re-sends the whole prompt) without waiting for it."""
+        try:
+            return self.rate_limiter.reserve(estimated_tokens) == 0
+        except OSError:
+            return False
+    
+    def _submit(self, prompt: str, cancel_event: threading.Event) -> Future:
+        """Start a backend call on the worker pool, recording its latency if it succeeds."""
+        def call():
+            start = time.monotonic()
+            response = self.backend.invoke(prompt, cancel_event=cancel_event)
+            with self._latencies_lock:
+                self._latencies.append(time.monotonic() - start)
+            return response
+        return self._executor.submit(call)
+    
+    def _hedge_delay(self) -> Optional[float]:
+        """p95 latency of recent successful calls, or None until enough have been seen."""
+        with self._latencies_lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    
+    async def _acall_with_retries(self, context: str, question: str, deadline: Optional[float] = None) -> str:
+        """Async counterpart of `_call_with_retries`."""
+        with metrics.span("prompt_formatting"):
+            prompt = self.qa_prompt.format(context=context, question=question)
+            estimated_tokens = self._estimate_tokens(context, question)
+        try:
+            with metrics.span("llm"):
+                return await self._ainvoke_with_retries(prompt, estimated_tokens, deadline)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            return self._error_message(e)
+    
+    async def _ainvoke_with_retries(self, prompt: str, estimated_tokens: int, deadline: Optional[float] = None,
+                                    expected_output_tokens: Optional[int] = None) -> str:
+        """Async counterpart of `_invoke_with_retries`, sleeping with asyncio instead of blocking."""
+        retries = 0
+        last_exception = None
+        
+        while retries <= self.max_retries:
+            self._check_circuit()
+            # Cancellation (a BaseException) must give back the probe slot too
+            settled = False
+            try:
+                try:
+                    await self._await_quota(estimated_tokens, self._remaining(deadline))
+                    timeout = self._attempt_timeout(deadline)
+                except TimeoutError as e:
+                    last_exception = e
+                    break
+                
+                try:
+                    logger.info(f"Attempt {retries + 1}/{self.max_retries + 1} to call LLM API (async)")
+                    metrics.count("llm_attempts")
+                    with metrics.span("llm_call"):
+                        response = await self._ainvoke(prompt, timeout, estimated_tokens)
+                    self.circuit_breaker.record_success()
+                    settled = True
+                    self._record_usage(response, expected_output_tokens)
+                    return response
+                except Exception as e:
+                    settled = True
+                    delay, last_exception = self._after_failure(e, retries, deadline, timeout)
+            finally:
+                if not settled:
+                    self.circuit_breaker.release()
+            
+            if delay is None:
+                break
+            if delay > 0:
+                with metrics.span("llm_backoff"):
+                    await asyncio.sleep(delay)
+            retries += 1
+            metrics.count("llm_retries")
+        
+        logger.error(f"Failed to generate response after {retries} retries: {last_exception}")
+        raise last_exception
+    
+    async def _await_quota(self, estimated_tokens: int, timeout: Optional[float] = None):
+        """Async counterpart of `_wait_for_quota`: sleeps on the event loop until the rate limiter admits the call."""
+        if timeout is not None and timeout <= 0:
+            raise LLMTimeoutError("deadline exceeded while waiting for rate limit capacity")
+        with metrics.span("llm_rate_limit_wait"):
+            start = time.monotonic()
+            while True:
+                try:
+                    wait_time = self.rate_limiter.reserve(estimated_tokens)
+                except OSError as e:
+                    logger.warning(f"Rate limiter unavailable, calling without pacing: {e}")
+                    return
+                if wait_time <= 0:
+                    return
+                if timeout is not None and time.monotonic() - start + wait_time > timeout:
+                    raise LLMTimeoutError("deadline exceeded while waiting for rate limit capacity")
+                await asyncio.sleep(wait_time)
+    
+    async def _ainvoke(self, prompt: str, timeout: Optional[float], estimated_tokens: int) -> str:
+        """Async counterpart of `_invoke`: one call with a timeout, hedged past the usual p95 latency."""
+        start = time.monotonic()
+        tasks = [asyncio.ensure_future(self._abackend_call(prompt))]
+        
+        hedge_delay = self._hedge_delay() if self.hedge_requests else None
+        if hedge_delay is not None and (timeout is None or hedge_delay < timeout):
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done and self._reserve_hedge(estimated_tokens):
+                logger.info(f"LLM call exceeded p95 latency ({hedge_delay:.2f}s); sending a hedged request")
+                tasks.append(asyncio.ensure_future(self._abackend_call(prompt)))
         
-        # Provide appropriate error message
-        error_str = str(last_exception).lower()
-        if "429" in error_str or "quota" in error_str or "rate limit" in error_str:
+        pending = set(tasks)
+        last_exception = None
+        try:
+            while pending:
+                remaining = None if timeout is None else timeout - (time.monotonic() - start)
+                if remaining is not None and remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_exception = task.exception()
+            if last_exception is not None and not pending:
+                raise last_exception
+            raise LLMTimeoutError(f"LLM call timed out after {timeout:.1f} seconds")
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _abackend_call(self, prompt: str) -> str:
+        """Make one async backend call, recording its latency if it succeeds."""
+        start = time.monotonic()
+        response = await self.backend.ainvoke(prompt)
+        with self._latencies_lock:
+            self._latencies.append(time.monotonic() - start)
+        return response
+    
+    def _stream_with_retries(self, context: str, question: str) -> Iterator[str]:
+        """
+        Stream the LLM response, retrying rate-limited calls until the first token arrives.
+        
+        Once tokens have been yielded the call is not retried, since the caller
+        has already shown part of the answer.
+        
+        Args:
+            context (str): Context information.
+            question (str): User question.
+            
+        Yields:
+            str: Answer fragments, or a single error message if every attempt failed.
+            
+        Raises:
+            CircuitOpenError: If the circuit breaker is open or opens before the first token.
+        """
+        prompt = self.qa_prompt.format(context=context, question=question)
+        retries = 0
+        last_exception = None
+        estimated_tokens = self._estimate_tokens(context, question)
+        start = time.perf_counter()
+        
+        while retries <= self.max_retries:
+            emitted = False
+            self._check_circuit()
+            # A caller abandoning the stream before the first token raises GeneratorExit here,
+            # which must give back the probe slot like any other unrecorded outcome
+            settled = False
+            try:
+                self._wait_for_quota(estimated_tokens)
+                try:
+                    logger.info(f"Attempt {retries + 1}/{self.max_retries + 1} to stream from LLM API")
+                    metrics.count("llm_attempts")
+                    parts = []
+                    for token in self.backend.stream(prompt):
+                        if token:
+                            if not emitted:
+                                # The backend is answering; record it before the caller can abandon the stream
+                                self.circuit_breaker.record_success()
+                                settled = True
+                                metrics.record("llm_first_token", time.perf_counter() - start)
+                            emitted = True
+                            parts.append(token)
+                            yield token
+                    if not emitted:
+                        self.circuit_breaker.record_success()
+                        settled = True
+                    self._record_usage("".join(parts))
+                    return
+                except Exception as e:
+                    last_exception = e
+                    error_str = str(e).lower()
+                    
+                    if emitted:
+                        logger.error(f"LLM stream interrupted: {e}")
+                        yield f"\n\n[Response interrupted: {e}]"
+                        return
+                    
+                    self.circuit_breaker.record_failure()
+                    settled = True
+                    if self.circuit_breaker.is_open():
+                        raise CircuitOpenError(self.circuit_breaker.retry_after()) from e
+            finally:
+                if not settled:
+                    self.circuit_breaker.release()
+            
+            if self._is_rate_limit_error(error_str) and retries < self.max_retries:
+                delay = self._backoff_delay(retries, error_str)
+                logger.warning(f"Rate limit exceeded. Retrying in {delay:.2f} seconds...")
+                self._pause_quota(delay)
+                with metrics.span("llm_backoff"):
+                    time.sleep(delay)
+                retries += 1
+                metrics.count("llm_retries")
+                continue
+            
+            break
+        
+        logger.error(f"Failed to stream response after {retries} retries: {last_exception}")
+        yield self._error_message(last_exception)
+    
+    def _check_circuit(self):
+        """Raise CircuitOpenError unless the circuit breaker lets this call through."""
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError(self.circuit_breaker.retry_after())
+    
+    def _estimate_tokens(self, context: str, question: str) -> int:
+        """Estimate the tokens a call will consume: prompt plus the expected answer length."""
+        return (self.prompt_overhead_tokens
+                + self.context_packer.count_tokens(context)
+                + self.context_packer.count_tokens(question)
+                + self.expected_output_tokens)
+    
+    def _wait_for_quota(self, estimated_tokens: int, timeout: Optional[float] = None):
+        """Block until the shared rate limiter admits the next call (TimeoutError past `timeout`)."""
+        if timeout is not None and timeout <= 0:
+            raise LLMTimeoutError("deadline exceeded while waiting for rate limit capacity")
+        try:
+            with metrics.span("llm_rate_limit_wait"):
+                waited = self.rate_limiter.acquire(estimated_tokens, timeout=timeout)
+        except OSError as e:
+            # An unusable state file must not stop us from answering
+            logger.warning(f"Rate limiter unavailable, calling without pacing: {e}")
+            return
+        if waited > 0:
+            logger.info(f"Rate limiter held the call for {waited:.2f} seconds")
+    
+    def _record_usage(self, response: str, expected_output_tokens: Optional[int] = None):
+        """Replace the reserved output tokens with the real answer length."""
+        if expected_output_tokens is None:
+            expected_output_tokens = self.expected_output_tokens
+        try:
+            self.rate_limiter.adjust(self.context_packer.count_tokens(response) - expected_output_tokens)
+        except OSError as e:
+            logger.warning(f"Could not update rate limiter usage: {e}")
+    
+    def _pause_quota(self, delay: float):
+        """Tell every worker sharing the rate limiter to hold off after a 429."""
+        try:
+            self.rate_limiter.pause(delay)
+        except OSError as e:
+            logger.warning(f"Could not share rate limit pause: {e}")
+    
+    def _is_retryable(self, exception: Exception, error_str: str) -> bool:
+        """Rate limits and timed-out attempts are worth another try."""
+        return isinstance(exception, TimeoutError) or self._is_rate_limit_error(error_str)
+    
+    def _is_rate_limit_error(self, error_str: str) -> bool:
+        """Check whether a lower-cased error message describes a quota/rate limit issue."""
+        return "429" in error_str or "quota" in error_str or "rate limit" in error_str
+    
+    def _backoff_delay(self, retries: int, error_str: str) -> float:
+        """
+        Work out how long to wait before the next attempt.
+        
+        Args:
+            retries (int): Number of retries already made.
+            error_str (str): Lower-cased error message from the failed attempt.
+            
+        Returns:
+            float: Delay in seconds.
+        """
+        # Get retry delay information if available
+        retry_delay = self._extract_retry_delay(error_str)
+        if retry_delay:
+            return retry_delay
+        
+        # Exponential backoff with jitter
+        return (self.base_delay * (2 ** retries)) + (random.random() * 2)
+    
+    def _error_message(self, exception: Optional[Exception]) -> str:
+        """Turn the last LLM exception into a user-facing message."""
+        error_str = str(exception).lower()
+        if self._is_rate_limit_error(error_str):
             return "I'm unable to generate a response due to API rate limits. Options:\n1. Wait for quota to reset\n2. Check your Google Gemini API plan\n3. Ensure your API key is valid"
+        elif isinstance(exception, TimeoutError):
+            return "I couldn't generate a response within the time limit. Please try again."
         elif "authentication" in error_str or "api key" in error_str:
             return "There's an issue with the API key. Please check your Google Gemini API key configuration."
         else:
-            return f"Error generating response: {str(last_exception)}"
+            return f"Error generating response: {str(exception)}"
     
     def _extract_retry_delay(self, error_str: str) -> Optional[float]:
         """
@@ -156,6 +876,21 @@ class LLMIntegration:
             pass
         return None
 
+    def pack_context(self, docs_with_scores: List[Tuple[Document, float]]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Pack the retrieved documents into a context string and report the tokens saved.
+        
+        Args:
+            docs_with_scores (List[Tuple[Document, float]]): List of retrieved documents with relevance scores.
+            
+        Returns:
+            Tuple[str, Dict[str, Any]]: Context string and packing statistics.
+        """
+        context, stats = self.context_packer.pack(docs_with_scores)
+        logger.info(f"Packed {stats['chunks']} chunks into {stats['packed_tokens']} tokens "
+                    f"(saved {stats['tokens_saved']} of {stats['original_tokens']})")
+        return context, stats
+
     def _format_context(self, docs_with_scores: List[Tuple[Document, float]]) -> str:
         """
         Format the retrieved documents into a context string for the LLM.
@@ -166,6 +901,5 @@ class LLMIntegration:
         Returns:
             str: Formatted context string.
         """
-        # Extract text content from documents and join with separators
-        context = "\n\n".join([doc.page_content for doc, _ in docs_with_scores])
-        return context 
\ No newline at end of file
+        context, _ = self.pack_context(docs_with_scores)
+        return context
@@ -0,0 +1,184 @@
+import time
+import logging
+import functools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Timings of the query being processed in the current thread or task
+_current_timings: "contextvars.ContextVar[Optional[Dict[str, float]]]" = contextvars.ContextVar(
+    "current_timings", default=None)
+
+
+class LatencyHistogram:
+    """Latency samples of one stage, keeping the most recent ones for percentiles."""
+
+    def __init__(self, window: int = 2048):
+        """
+        Initialize the LatencyHistogram.
+
+        Args:
+            window (int): Number of recent samples used for percentiles.
+        """
+        self.count = 0
+        self.total = 0.0
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        """Record one sample."""
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self._samples.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Summarize the recorded samples.
+
+        Returns:
+            Dict[str, float]: count, mean, p50, p95 and p99 (seconds) over the recent window.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total = self.count, self.total
+        if not samples:
+            return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+
+        def percentile(fraction):
+            return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+        return {"count": count, "mean": total / count,
+                "p50": percentile(0.50), "p95": percentile(0.95), "p99": percentile(0.99)}
+
+
+_histograms: Dict[str, LatencyHistogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def _histogram(name: str) -> LatencyHistogram:
+    """Return the process-wide histogram for a stage, creating it on first use."""
+    with _histograms_lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = LatencyHistogram()
+            _histograms[name] = histogram
+        return histogram
+
+
+def record(name: str, seconds: float):
+    """
+    Record the duration of a stage.
+
+    The duration goes into the stage's process-wide histogram and is added to the
+    timings of the query being processed, if any.
+
+    Args:
+        name (str): Stage name, e.g. "embedding".
+        seconds (float): Duration in seconds.
+    """
+    _histogram(name).add(seconds)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def count(name: str, amount: int = 1):
+    """
+    Add to a counter in the timings of the query being processed (e.g. retries).
+
+    Args:
+        name (str): Counter name, e.g. "llm_retries".
+        amount (int): Amount to add.
+    """
+    timings = _current_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0) + amount
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the enclosed block as stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+@contextmanager
+def collect_timings(timings: Optional[Dict[str, float]] = None) -> Iterator[Dict[str, float]]:
+    """
+    Collect the stages recorded inside the block into a timings dictionary.
+
+    Args:
+        timings (Optional[Dict[str, float]]): Dictionary to add to, e.g. to resume collecting for
+            a query whose answer is streamed later. Defaults to a fresh one.
+
+    Yields:
+        Dict[str, float]: Stage durations in seconds and counters, filled in as the block runs.
+    """
+    timings = {} if timings is None else timings
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+def bind(fn: Callable[..., Any], *args, **kwargs) -> Callable[[], Any]:
+    """
+    Wrap a call so that, wherever it runs, its stages are recorded into the caller's timings.
+
+    Use with `loop.run_in_executor` and other APIs that run callables on other threads.
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn, *args, **kwargs)
+
+
+def submit(executor: Executor, fn: Callable[..., Any], *args, **kwargs) -> Future:
+    """Submit work to a thread pool so that its stages are recorded into the caller's timings."""
+    return executor.submit(bind(fn, *args, **kwargs))
+
+
+def latency_summary() -> Dict[str, Dict[str, float]]:
+    """
+    Summarize every stage recorded in this process.
+
+    Returns:
+        Dict[str, Dict[str, float]]: count, mean, p50, p95 and p99 (seconds) per stage.
+    """
+    with _histograms_lock:
+        histograms = dict(_histograms)
+    return {name: histogram.summary() for name, histogram in sorted(histograms.items())}
+
+
+def format_latency_summary(summary: Optional[Dict[str, Dict[str, float]]] = None) -> str:
+    """
+    Format a latency summary as a text table in milliseconds.
+
+    Args:
+        summary (Optional[Dict[str, Dict[str, float]]]): Output of `latency_summary`. Defaults to the current one.
+
+    Returns:
+        str: Table with one row per stage.
+    """
+    summary = latency_summary() if summary is None else summary
+    lines = [f"{'stage':<22} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+    for name, stats in summary.items():
+        lines.append(f"{name:<22} {stats['count']:>7} {stats['p50'] * 1000:>9.1f} "
+                     f"{stats['p95'] * 1000:>9.1f} {stats['p99'] * 1000:>9.1f}")
+    return "\n".join(lines)
+
+
+def reset():
+    """Forget every recorded sample."""
+    with _histograms_lock:
+        _histograms.clear()
@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: state is only shared between threads of one process
+    fcntl = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter for requests per minute and tokens per minute.
+
+    The bucket state lives in a small JSON file guarded by an exclusive file lock,
+    so every thread and process on the host that points at the same file paces
+    itself against the same quota. Without either limit the file is never touched:
+    only pauses after a 429 apply, and they are shared within this process only.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 state_path: Optional[str] = None):
+        """
+        Initialize the RateLimiter.
+
+        Args:
+            requests_per_minute (Optional[float]): Request quota, or None for no request limit.
+            tokens_per_minute (Optional[float]): Token quota, or None for no token limit.
+            state_path (Optional[str]): File holding the shared bucket state.
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.state_path = state_path or os.path.join(tempfile.gettempdir(), "rag_qa_rate_limiter.json")
+        self._thread_lock = threading.Lock()
+        self._blocked_until = 0.0  # pause used when no limit is configured
+
+        if fcntl is None:
+            logger.warning("File locking unavailable; rate limiter state is shared within this process only")
+
+    @property
+    def limited(self) -> bool:
+        """Whether a request or token limit is configured."""
+        return self.requests_per_minute is not None or self.tokens_per_minute is not None
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[Dict[str, Any]]:
+        """Lock the state file, yield its contents and write back any changes."""
+        with self._thread_lock:
+            with open(self.state_path, "a+") as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    raw = f.read()
+                    try:
+                        state = json.loads(raw) if raw else {}
+                    except ValueError:
+                        # A crashed writer can leave a partial file; start from full buckets
+                        state = {}
+
+                    yield state
+
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refill(self, state: Dict[str, Any], now: float):
+        """Top both buckets up for the time elapsed since the last update."""
+        elapsed = max(0.0, now - state.get("updated", now))
+        for key, per_minute in (("requests", self.requests_per_minute), ("tokens", self.tokens_per_minute)):
+            if per_minute is None:
+                continue
+            level = state.get(key, per_minute)
+            state[key] = min(per_minute, level + elapsed * per_minute / 60.0)
+        state["updated"] = now
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Try to take one request and `tokens` tokens from the buckets.
+
+        Args:
+            tokens (int): Estimated tokens the call will consume.
+
+        Returns:
+            float: 0 if the capacity was taken, otherwise the seconds to wait before trying again.
+        """
+        now = time.time()
+        if not self.limited:
+            # Nothing to pace against but a pause after a 429; skip the state file
+            return max(0.0, self._blocked_until - now)
+
+        with self._locked_state() as state:
+            self._refill(state, now)
+
+            wait = max(0.0, state.get("blocked_until", 0.0) - now)
+
+            if self.requests_per_minute is not None and state["requests"] < 1:
+                wait = max(wait, (1 - state["requests"]) * 60.0 / self.requests_per_minute)
+
+            if self.tokens_per_minute is not None:
+                # A single call larger than the whole bucket waits for a full bucket
+                needed = min(tokens, self.tokens_per_minute)
+                if state["tokens"] < needed:
+                    wait = max(wait, (needed - state["tokens"]) * 60.0 / self.tokens_per_minute)
+
+            if wait > 0:
+                return wait
+
+            if self.requests_per_minute is not None:
+                state["requests"] -= 1
+            if self.tokens_per_minute is not None:
+                state["tokens"] -= min(tokens, self.tokens_per_minute)
+            return 0.0
+
+    def acquire(self, tokens: int = 0, timeout: Optional[float] = None) -> float:
+        """
+        Block until the call fits within the quota.
+
+        Args:
+            tokens (int): Estimated tokens the call will consume.
+            timeout (Optional[float]): Give up after this many seconds.
+
+        Returns:
+            float: Seconds spent waiting.
+
+        Raises:
+            TimeoutError: If the quota does not free up within `timeout`.
+        """
+        start = time.monotonic()
+        while True:
+            wait = self.reserve(tokens)
+            if wait <= 0:
+                return time.monotonic() - start
+            if timeout is not None and time.monotonic() - start + wait > timeout:
+                raise TimeoutError(f"Rate limiter could not admit the call within {timeout:.2f} seconds")
+            time.sleep(wait)
+
+    def adjust(self, tokens: int):
+        """
+        Correct the token bucket once the real usage of a call is known.
+
+        Args:
+            tokens (int): Actual minus estimated tokens (negative returns capacity).
+        """
+        if self.tokens_per_minute is None or tokens == 0:
+            return
+        with self._locked_state() as state:
+            self._refill(state, time.time())
+            state["tokens"] = min(self.tokens_per_minute, state["tokens"] - tokens)
+
+    def pause(self, seconds: float):
+        """
+        Hold back every worker sharing this limiter, e.g. after the API returned a 429.
+
+        Args:
+            seconds (float): How long no new calls should be admitted.
+        """
+        if not self.limited:
+            with self._thread_lock:
+                self._blocked_until = max(self._blocked_until, time.time() + seconds)
+            return
+
+        with self._locked_state() as state:
+            self._refill(state, time.time())
+            state["blocked_until"] = max(state.get("blocked_until", 0.0), time.time() + seconds)
@@ -0,0 +1,252 @@
+import re
+import logging
+from typing import Dict, Iterable, List, Optional, Pattern
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Phrases showing that a question is about the loaded documents
+DOC_PHRASES = ["in the document", "in this document", "according to the document",
+               "mentioned in", "based on the", "refers to", "written in",
+               "from the document", "from the text", "content about"]
+
+# Phrases showing that a "what is" question asks about document content
+DOC_CONTEXT_PHRASES = ["mentioned about", "mentioned in", "in the document", "said about"]
+
+# Never matches anything; used for empty keyword lists
+NEVER = re.compile(r'(?!)')
+
+
+def _trie_regex(terms: Iterable[str]) -> str:
+    """
+    Build a regular expression matching any of the terms, with shared prefixes factored out.
+
+    A flat alternation makes the regex engine try every term at every position of the
+    query; a trie lets it rule out whole groups of terms after their first characters.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        if '' in node and len(node) == 1:
+            return ''
+        optional = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if optional else pattern
+
+    return build(trie)
+
+
+def compile_keywords(terms: Iterable[str], whole_words: bool = False) -> Pattern:
+    """
+    Compile keywords into a single lower-case matcher.
+
+    Args:
+        terms (Iterable[str]): Keywords or phrases.
+        whole_words (bool): Only match keywords that are not part of a longer word.
+
+    Returns:
+        Pattern: Compiled regex; use `.search()` on a lower-cased query.
+    """
+    terms = sorted({term.lower() for term in terms if term})
+    if not terms:
+        return NEVER
+    pattern = _trie_regex(terms)
+    if whole_words:
+        pattern = r'\b' + pattern + r'\b'
+    return re.compile(pattern)
+
+
+class KeywordRouter:
+    """
+    Keyword-based query router, compiled once from the Agent's keyword lists.
+
+    Each keyword list becomes one trie-shaped regex, so routing costs a handful of
+    regex scans per query no matter how many keywords there are.
+    """
+
+    def __init__(self, calculator_keywords: Iterable[str], dictionary_keywords: Iterable[str],
+                 rag_override_keywords: Iterable[str], domain_terms: Iterable[str]):
+        """
+        Initialize the KeywordRouter.
+
+        Args:
+            calculator_keywords (Iterable[str]): Whole words that send a query to the calculator.
+            dictionary_keywords (Iterable[str]): Phrases that send a query to the dictionary.
+            rag_override_keywords (Iterable[str]): Terms that keep a query away from the dictionary.
+            domain_terms (Iterable[str]): Terms that send a query straight to RAG.
+        """
+        self.math_expression = re.compile(r'\d+\s*[\+\-\*/]\s*\d+')
+        self.what_is = re.compile(r'\bwhat\s+is\b|\bwho\s+is\b')
+        self.calculator = compile_keywords(calculator_keywords, whole_words=True)
+        self.dictionary = compile_keywords(dictionary_keywords)
+        self.dictionary_words = compile_keywords(dictionary_keywords, whole_words=True)
+        self.rag_override = compile_keywords(rag_override_keywords)
+        self.domain = compile_keywords(domain_terms)
+        self.doc_phrases = compile_keywords(DOC_PHRASES)
+        self.doc_context_phrases = compile_keywords(DOC_CONTEXT_PHRASES)
+
+    def route(self, query: str) -> str:
+        """
+        Decide which workflow should handle a query.
+
+        Args:
+            query (str): User query.
+
+        Returns:
+            str: One of "rag", "calculator" or "dictionary".
+        """
+        query_lower = query.lower()
+
+        # Skip routing for code-related questions and specific knowledge domains
+        if self.domain.search(query_lower):
+            return "rag"
+        if self.is_calculation(query_lower):
+            return "calculator"
+        if self.is_definition(query_lower):
+            return "dictionary"
+        return "rag"
+
+    def is_calculation(self, query_lower: str) -> bool:
+        """Check if a lower-cased query should be routed to the calculator tool."""
+        # Mathematical expressions with numbers and operators, or calculator keywords
+        return bool(self.math_expression.search(query_lower) or self.calculator.search(query_lower))
+
+    def is_definition(self, query_lower: str) -> bool:
+        """Check if a lower-cased query should be routed to the dictionary tool."""
+        # RAG override keywords and document-specific phrases anywhere in the query
+        # rule the dictionary out
+        if self.rag_override.search(query_lower) or self.doc_phrases.search(query_lower):
+            return False
+
+        # "what is" questions go to the dictionary only with an explicit dictionary phrase
+        if self.what_is.search(query_lower):
+            if self.doc_context_phrases.search(query_lower):
+                return False
+            return bool(self.dictionary.search(query_lower))
+
+        # Other dictionary keywords must be whole words
+        return bool(self.dictionary_words.search(query_lower))
+
+
+# Labelled example queries for the embedding router. They describe kinds of
+# questions rather than the contents of any particular corpus.
+INTENT_EXAMPLES = {
+    "calculator": [
+        "What is 25 times 4?",
+        "Calculate 15% of 240",
+        "What is the square root of 144?",
+        "Add 17 and 38",
+        "Compute 3 to the power of 5",
+        "How much is 120 divided by 8?",
+        "Subtract 45 from 200",
+        "What is 7 * 6 + 2?",
+        "Multiply 12 by 9",
+        "What is the sum of 250 and 375?",
+    ],
+    "dictionary": [
+        "Define serendipity",
+        "What is the meaning of ephemeral?",
+        "What does the word ubiquitous mean?",
+        "Give me the definition of entropy",
+        "Meaning of the word pragmatic",
+        "Explain the term cognitive dissonance",
+        "What is the definition of irony?",
+        "Define the word resilience",
+        "What does benevolent mean?",
+        "Dictionary definition of paradigm",
+    ],
+    "rag": [
+        "What does the document say about the system architecture?",
+        "Summarize the main findings of the report",
+        "Who is the author of this paper?",
+        "What technologies does the project use?",
+        "Describe the methodology used in the research",
+        "What are the key features of the platform?",
+        "What experience is listed on the resume?",
+        "How does the proposed framework handle security?",
+        "What problem does this project solve?",
+        "List the conclusions from the chapter",
+    ],
+}
+
+
+class EmbeddingRouter:
+    """
+    Query router that picks the intent whose labelled examples are closest to the query.
+
+    Each intent is represented by the normalized mean embedding (centroid) of its
+    example queries. Routing takes the query embedding the RAG workflow computes
+    anyway, so it costs one small matrix product instead of another model pass.
+    """
+
+    def __init__(self, embedding_model, examples: Optional[Dict[str, List[str]]] = None):
+        """
+        Initialize the EmbeddingRouter.
+
+        Args:
+            embedding_model: Embedding model already loaded by the VectorStore.
+            examples (Optional[Dict[str, List[str]]]): Example queries per workflow ("calculator",
+                "dictionary", "rag"). Defaults to INTENT_EXAMPLES.
+        """
+        examples = examples or INTENT_EXAMPLES
+        self.labels = list(examples)
+        self.math_expression = re.compile(r'\d+\s*[\+\-\*/]\s*\d+')
+
+        # Embed every example in one batch, then average per intent
+        texts = [text for label in self.labels for text in examples[label]]
+        vectors = self._normalize(np.asarray(embedding_model.embed_documents(texts), dtype=np.float32))
+        centroids = []
+        start = 0
+        for label in self.labels:
+            end = start + len(examples[label])
+            centroids.append(vectors[start:end].mean(axis=0))
+            start = end
+        self.centroids = self._normalize(np.stack(centroids))
+        logger.info(f"Embedding router ready with {len(texts)} examples for {len(self.labels)} intents")
+
+    def scores(self, query_embedding: List[float]) -> Dict[str, float]:
+        """
+        Cosine similarity of the query to each intent centroid.
+
+        Args:
+            query_embedding (List[float]): Embedding of the query.
+
+        Returns:
+            Dict[str, float]: Similarity per workflow.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        return dict(zip(self.labels, (self.centroids @ query).tolist()))
+
+    def route(self, query: str, query_embedding: List[float]) -> str:
+        """
+        Decide which workflow should handle a query.
+
+        Args:
+            query (str): User query.
+            query_embedding (List[float]): Embedding of the query, as used for retrieval.
+
+        Returns:
+            str: One of the example labels, normally "rag", "calculator" or "dictionary".
+        """
+        # Numbers embed poorly, so explicit arithmetic always goes to the calculator
+        if "calculator" in self.labels and self.math_expression.search(query):
+            return "calculator"
+        scores = self.scores(query_embedding)
+        return max(scores, key=scores.get)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """Scale rows to unit length."""
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
@@ -0,0 +1,192 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Iterator, List, Tuple
+
+
+class _Call:
+    """An in-flight computation that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+        self.waiters = 0
+
+
+class _Stream:
+    """An in-flight iterator whose items are replayed to every caller."""
+
+    def __init__(self, fn: Callable[[], Iterable[Any]]):
+        self.fn = fn
+        self.lock = threading.Lock()
+        self.source = None
+        self.items: List[Any] = []
+        self.finished = False
+        self.exception = None
+        self.readers = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running wait for it and receive the same result (or exception).
+    Nothing is cached once the call has finished.
+    """
+
+    def __init__(self):
+        """Initialize the SingleFlight group."""
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run `fn` once for all concurrent callers using `key`.
+
+        Args:
+            key (Hashable): Identifies calls that may share a result.
+            fn (Callable[[], Any]): Computation to run if no call for `key` is in flight.
+
+        Returns:
+            Tuple[Any, bool]: The result and whether it was shared from another caller's execution.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, call.waiters > 0
+
+    def stream(self, key: Hashable, fn: Callable[[], Iterable[Any]]) -> Tuple[Iterator[Any], bool]:
+        """
+        Share one iterator between all concurrent callers using `key`.
+
+        The first caller's `fn` creates the iterator. Every caller gets its own iterator
+        over the same items, starting from the first. Whichever caller is furthest
+        ahead pulls the next item from the source, so the stream keeps going as long as
+        anyone reads it. The key is released once the source is exhausted or fails, or
+        every caller has stopped reading. Don't use `do` and `stream` with the same key.
+
+        Args:
+            key (Hashable): Identifies calls that may share a stream.
+            fn (Callable[[], Iterable[Any]]): Creates the stream if none for `key` is in flight.
+
+        Returns:
+            Tuple[Iterator[Any], bool]: This caller's iterator and whether it joins another caller's stream.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if call is None:
+                call = _Stream(fn)
+                self._calls[key] = call
+        return self._follow(key, call), shared
+
+    def _follow(self, key: Hashable, call: _Stream) -> Iterator[Any]:
+        """Yield the items of a shared stream, pulling new ones from its source when needed."""
+        with self._lock:
+            call.readers += 1
+        index = 0
+        try:
+            while True:
+                with call.lock:
+                    if index == len(call.items) and not call.finished:
+                        try:
+                            if call.source is None:
+                                call.source = iter(call.fn())
+                            call.items.append(next(call.source))
+                        except StopIteration:
+                            self._finish(key, call)
+                        except BaseException as e:
+                            call.exception = e
+                            self._finish(key, call)
+                    if index < len(call.items):
+                        item = call.items[index]
+                    elif call.exception is not None:
+                        raise call.exception
+                    else:
+                        return
+                index += 1
+                yield item
+        finally:
+            with self._lock:
+                call.readers -= 1
+                # Nobody is reading any more: later callers start a fresh stream
+                if call.readers == 0 and self._calls.get(key) is call:
+                    del self._calls[key]
+
+    def _finish(self, key: Hashable, call: _Stream):
+        """Mark a stream as complete and release its key."""
+        call.finished = True
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        """Number of distinct keys currently being computed."""
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of SingleFlight, coalescing coroutines on the same event loop.
+
+    The computation runs as a task of its own, so cancelling one caller (e.g. when its
+    client disconnects) doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        """Initialize the AsyncSingleFlight group."""
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run `fn()` once for all concurrent callers using `key`.
+
+        Args:
+            key (Hashable): Identifies calls that may share a result.
+            fn (Callable[[], Awaitable[Any]]): Coroutine function to run if no call for `key` is in flight.
+
+        Returns:
+            Tuple[Any, bool]: The result and whether it was shared from another caller's execution.
+        """
+        # Tasks belong to one loop, so callers on other loops don't share them
+        flight = (asyncio.get_running_loop(), key)
+        task = self._tasks.get(flight)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[flight] = task
+
+            def forget(done: asyncio.Future):
+                if self._tasks.get(flight) is done:
+                    del self._tasks[flight]
+            task.add_done_callback(forget)
+        return await asyncio.shield(task), shared
+
+    def in_flight(self) -> int:
+        """Number of distinct keys currently being computed."""
+        return len(self._tasks)
@@ -0,0 +1,336 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Where snapshots are kept unless SNAPSHOT_DIR says otherwise
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snapshots")
+
+
+def _file_hash(path: str) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _copy_and_hash(source: str, destination: str) -> str:
+    """Copy a file, returning the SHA-256 of the bytes actually copied."""
+    digest = hashlib.sha256()
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        for block in iter(lambda: src.read(1024 * 1024), b""):
+            digest.update(block)
+            dst.write(block)
+    shutil.copystat(source, destination)
+    return digest.hexdigest()
+
+
+class SnapshotCorruptedError(Exception):
+    """A stored file no longer matches the hash recorded in its snapshot."""
+    pass
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    """Write a JSON file atomically, so readers never see a partial one."""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class SnapshotStore:
+    """
+    Versioned snapshots of directories, stored by content.
+
+    Each file is stored once under the SHA-256 of its contents, so a file is copied
+    only the first time its contents are snapshotted. A snapshot is a JSON manifest
+    mapping relative paths to content hashes. Files whose size, mtime and inode match
+    the previous snapshot of the same directory are not read again, so snapshotting an
+    unchanged directory takes time proportional to its number of files; the first
+    snapshot of a directory still reads and hashes every byte.
+
+    Directories whose files are only ever replaced (written to a temporary file and
+    moved into place), never rewritten in place, can be snapshotted with `link=True`:
+    files are then hard-linked instead of copied, costing almost no space until the
+    live file is deleted or replaced. A linked file shares its inode with the live one,
+    so an in-place write would change the snapshot too; `restore` checks every file
+    against its recorded hash and refuses to restore a snapshot that has changed.
+    Restored files are copies, so they can be modified freely.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        Initialize the SnapshotStore.
+
+        Args:
+            root (Optional[str]): Directory holding the snapshots. Defaults to SNAPSHOT_DIR or DEFAULT_SNAPSHOT_DIR.
+        """
+        self.root = root or os.getenv("SNAPSHOT_DIR") or DEFAULT_SNAPSHOT_DIR
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.manifests_dir = os.path.join(self.root, "manifests")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _manifest_path(self, snapshot_id: str) -> str:
+        return os.path.join(self.manifests_dir, snapshot_id + ".json")
+
+    def _copy_object(self, path: str) -> str:
+        """Copy a file into the object store unless its contents are already there; returns its hash."""
+        os.makedirs(self.objects_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.objects_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            # Hash the copy rather than the live file, so a concurrent write can't make them disagree
+            digest = _copy_and_hash(path, temp_path)
+            object_path = self._object_path(digest)
+            if os.path.exists(object_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(temp_path, object_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return digest
+
+    def _link_object(self, path: str) -> str:
+        """Hard-link a file into the object store unless its contents are already there; returns its hash."""
+        digest = _file_hash(path)
+        object_path = self._object_path(digest)
+        if os.path.exists(object_path):
+            return digest
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        try:
+            os.link(path, object_path)
+            return digest
+        except FileExistsError:
+            return digest
+        except OSError:
+            # No hard links here (e.g. another file system, or FAT): fall back to a copy
+            return self._copy_object(path)
+
+    def create(self, source_dir: str, label: str = "", files: Optional[List[str]] = None,
+               link: bool = False) -> str:
+        """
+        Snapshot a directory.
+
+        Args:
+            source_dir (str): Directory to snapshot.
+            label (str): Free-text note shown by `list`, e.g. why the snapshot was taken.
+            files (Optional[List[str]]): Only snapshot these paths, relative to `source_dir`.
+                Defaults to every file under it.
+            link (bool): Hard-link files instead of copying them. Only safe for directories whose
+                files are never rewritten in place.
+
+        Returns:
+            str: The snapshot id.
+        """
+        source_dir = os.path.abspath(source_dir)
+        if files is None:
+            files = []
+            for dirpath, dirnames, filenames in os.walk(source_dir):
+                for name in filenames:
+                    files.append(os.path.relpath(os.path.join(dirpath, name), source_dir))
+
+        # Files unchanged since the previous snapshot keep their hash
+        previous = self.latest(source_dir)
+        known = previous["files"] if previous else {}
+
+        entries = {}
+        for relative_path in sorted(files):
+            path = os.path.join(source_dir, relative_path)
+            stat = os.stat(path)
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino}
+            old = known.get(relative_path)
+            if old and all(old.get(key) == value for key, value in entry.items()) \
+                    and os.path.exists(self._object_path(old["hash"])):
+                entry["hash"] = old["hash"]
+            else:
+                entry["hash"] = self._link_object(path) if link else self._copy_object(path)
+            entries[relative_path.replace(os.sep, "/")] = entry
+
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        created = datetime.now()
+        name = os.path.basename(source_dir.rstrip(os.sep)) or "root"
+        snapshot_id = f"{name}-{created.strftime('%Y%m%d_%H%M%S_%f')}"
+        _write_json(self._manifest_path(snapshot_id), {
+            "id": snapshot_id, "source": source_dir, "label": label, "linked": link,
+            "created": created.isoformat(timespec="seconds"), "files": entries,
+        })
+        logger.info(f"Snapshot {snapshot_id}: {len(entries)} files from {source_dir}")
+        return snapshot_id
+
+    def get(self, snapshot_id: str) -> Dict[str, Any]:
+        """
+        Read a snapshot manifest.
+
+        Raises:
+            KeyError: If there is no such snapshot.
+        """
+        try:
+            with open(self._manifest_path(snapshot_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(f"No snapshot {snapshot_id}")
+
+    def list(self, source_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Snapshot manifests, oldest first.
+
+        Args:
+            source_dir (Optional[str]): Only list snapshots of this directory.
+
+        Returns:
+            List[Dict[str, Any]]: Manifests with "id", "source", "label", "created" and "files".
+        """
+        if not os.path.isdir(self.manifests_dir):
+            return []
+        source_dir = os.path.abspath(source_dir) if source_dir else None
+        snapshots = []
+        for name in os.listdir(self.manifests_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                snapshot = self.get(name[:-len(".json")])
+            except (KeyError, ValueError):
+                logger.warning(f"Skipping unreadable snapshot manifest {name}")
+                continue
+            if source_dir is None or snapshot["source"] == source_dir:
+                snapshots.append(snapshot)
+        # Ids end in a timestamp with microseconds, so they sort in creation order per source
+        return sorted(snapshots, key=lambda snapshot: (snapshot["created"], snapshot["id"]))
+
+    def latest(self, source_dir: str) -> Optional[Dict[str, Any]]:
+        """The most recent snapshot of a directory, or None."""
+        snapshots = self.list(source_dir)
+        return snapshots[-1] if snapshots else None
+
+    def restore(self, snapshot_id: str, target_dir: Optional[str] = None) -> str:
+        """
+        Restore a snapshot, replacing the target directory.
+
+        Files are copied out of the store into a temporary directory next to the target,
+        which is then swapped in, so the target is never left half restored. Each file is
+        checked against its recorded hash as it is copied. Whatever the target held
+        before is snapshotted first.
+
+        Args:
+            snapshot_id (str): Snapshot to restore.
+            target_dir (Optional[str]): Directory to restore into. Defaults to the snapshot's source.
+
+        Returns:
+            str: The restored directory.
+
+        Raises:
+            KeyError: If there is no such snapshot.
+            FileNotFoundError: If a file of the snapshot is missing from the store.
+            SnapshotCorruptedError: If a stored file has changed since the snapshot was taken.
+        """
+        snapshot = self.get(snapshot_id)
+        target_dir = os.path.abspath(target_dir or snapshot["source"])
+        parent = os.path.dirname(target_dir)
+        os.makedirs(parent, exist_ok=True)
+
+        temp_dir = tempfile.mkdtemp(dir=parent, prefix=".restore_")
+        try:
+            for relative_path, entry in snapshot["files"].items():
+                object_path = self._object_path(entry["hash"])
+                if not os.path.exists(object_path):
+                    raise FileNotFoundError(f"Snapshot {snapshot_id} is missing {relative_path} ({entry['hash']})")
+                destination = os.path.join(temp_dir, *relative_path.split("/"))
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                if _copy_and_hash(object_path, destination) != entry["hash"]:
+                    raise SnapshotCorruptedError(f"Snapshot {snapshot_id} is corrupted: {relative_path} no longer "
+                                                 f"matches its hash ({entry['hash']}); was the live file rewritten "
+                                                 f"in place?")
+
+            if os.path.isdir(target_dir) and os.listdir(target_dir):
+                self.create(target_dir, label=f"before restoring {snapshot_id}", link=snapshot.get("linked", False))
+            old_dir = None
+            if os.path.exists(target_dir):
+                old_dir = tempfile.mkdtemp(dir=parent, prefix=".replaced_")
+                os.rmdir(old_dir)
+                os.rename(target_dir, old_dir)
+            os.rename(temp_dir, target_dir)
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+        logger.info(f"Restored snapshot {snapshot_id} to {target_dir}")
+        return target_dir
+
+    def gc(self, keep: int = 5) -> Dict[str, int]:
+        """
+        Delete old snapshots and the stored files no remaining snapshot refers to.
+
+        Args:
+            keep (int): Snapshots to keep per source directory, newest first.
+
+        Returns:
+            Dict[str, int]: Numbers of "snapshots" and "objects" deleted, and "bytes" freed on disk.
+
+        Raises:
+            ValueError: If `keep` is negative.
+        """
+        if keep < 0:
+            raise ValueError(f"keep must be 0 or more, got {keep}")
+        by_source: Dict[str, List[Dict[str, Any]]] = {}
+        for snapshot in self.list():
+            by_source.setdefault(snapshot["source"], []).append(snapshot)
+
+        deleted_snapshots = 0
+        referenced = set()
+        for snapshots in by_source.values():
+            cut = max(len(snapshots) - keep, 0)
+            for snapshot in snapshots[:cut]:
+                os.remove(self._manifest_path(snapshot["id"]))
+                deleted_snapshots += 1
+            for snapshot in snapshots[cut:]:
+                referenced.update(entry["hash"] for entry in snapshot["files"].values())
+
+        deleted_objects, freed = 0, 0
+        if os.path.isdir(self.objects_dir):
+            for dirpath, dirnames, filenames in os.walk(self.objects_dir):
+                for name in filenames:
+                    if name in referenced:
+                        continue
+                    path = os.path.join(dirpath, name)
+                    stat = os.stat(path)
+                    os.remove(path)
+                    deleted_objects += 1
+                    # Still linked from a live file: unlinking it here frees nothing
+                    if stat.st_nlink == 1:
+                        freed += stat.st_size
+
+        logger.info(f"Deleted {deleted_snapshots} snapshots and {deleted_objects} stored files, "
+                    f"freeing {freed / (1024*1024):.2f} MB")
+        return {"snapshots": deleted_snapshots, "objects": deleted_objects, "bytes": freed}
+
+    def disk_usage(self) -> int:
+        """Bytes used by stored files that aren't shared with a live file."""
+        total = 0
+        if os.path.isdir(self.objects_dir):
+            for dirpath, dirnames, filenames in os.walk(self.objects_dir):
+                for name in filenames:
+                    stat = os.stat(os.path.join(dirpath, name))
+                    if stat.st_nlink == 1:
+                        total += stat.st_size
+        return total
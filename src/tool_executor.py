@@ -0,0 +1,289 @@
+import os
+import time
+import queue
+import signal
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Windows: no CPU or memory caps, timeouts still apply
+    resource = None
+
+from .tools import CalculatorTool
+from . import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Seconds a tool may take before its caller gets an error instead
+DEFAULT_TIMEOUTS = {"calculator": 5.0, "dictionary": 15.0}
+
+# Key holding the value in each tool's result dictionary
+RESULT_KEYS = {"calculator": "value", "dictionary": "definition"}
+
+# Exit code of a calculator worker that ran out of memory
+_OUT_OF_MEMORY_EXIT_CODE = 3
+
+# Exit codes of calculator workers stopped by their CPU or memory caps: killed by the
+# kernel past RLIMIT_CPU (SIGXCPU, or SIGKILL past the hard limit) or out of memory
+_LIMIT_EXIT_CODES = {_OUT_OF_MEMORY_EXIT_CODE} | {-getattr(signal, name) for name in ("SIGKILL", "SIGXCPU")
+                                                   if hasattr(signal, name)}
+
+
+def _error_result(tool: str, message: str) -> Dict[str, Any]:
+    """A tool result dictionary reporting an error."""
+    return {"status": "error", "error": message, RESULT_KEYS.get(tool, "value"): None}
+
+
+def _limit_memory(memory_bytes: int):
+    """Let the current process map at most `memory_bytes` more than it already has."""
+    try:
+        with open("/proc/self/statm") as statm:
+            mapped = int(statm.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        mapped = 0
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = mapped + memory_bytes
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _limit_cpu(cpu_seconds: int):
+    """Let the current process use at most `cpu_seconds` more CPU time; the kernel kills it beyond that."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    limit = int(usage.ru_utime + usage.ru_stime) + cpu_seconds + 1
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+
+def _calculator_worker(connection, cpu_seconds: int, memory_bytes: int):
+    """Evaluate calculator queries received over `connection` until it is closed."""
+    if resource is not None:
+        _limit_memory(memory_bytes)
+    calculator = CalculatorTool()
+    while True:
+        try:
+            query = connection.recv()
+        except EOFError:
+            return
+        if resource is not None:
+            _limit_cpu(cpu_seconds)
+        try:
+            connection.send(calculator.run(query))
+        except MemoryError:
+            os._exit(_OUT_OF_MEMORY_EXIT_CODE)
+
+
+class _CalculatorProcess:
+    """One calculator worker process, evaluating one query at a time."""
+
+    def __init__(self, context, cpu_seconds: int, memory_bytes: int):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_calculator_worker, name="calculator-worker",
+                                       args=(child_connection, cpu_seconds, memory_bytes), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def evaluate(self, query: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Evaluate a query.
+
+        Returns:
+            Optional[Dict[str, Any]]: The calculator result, or None if the worker didn't answer in time.
+
+        Raises:
+            EOFError: If the worker died, e.g. killed for exceeding its CPU or memory limit.
+        """
+        self.connection.send(query)
+        if not self.connection.poll(timeout):
+            return None
+        return self.connection.recv()
+
+    def exitcode(self, timeout: float = 1.0) -> Optional[int]:
+        """The worker's exit code once it has died, waiting up to `timeout` seconds; None if still running."""
+        self.process.join(timeout)
+        return self.process.exitcode
+
+    def kill(self):
+        """Stop the worker, whatever it is doing."""
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class ToolExecutor:
+    """
+    Runs tool calls with time limits, so a slow or pathological query can't stall its caller.
+
+    Calculator queries run in a small pool of worker processes with CPU and memory
+    caps (where the `resource` module is available); a worker that runs out of time
+    or exceeds a cap is killed and replaced without affecting the others. Other tools
+    run on a bounded thread pool: a call that runs out of time is abandoned, and calls
+    fail fast while every thread is busy. Each call is recorded as stage
+    "tool_<name>", and timeouts are counted as "tool_<name>_timeouts".
+    """
+
+    def __init__(self, max_threads: int = 8, calculator_processes: int = 2,
+                 timeouts: Optional[Dict[str, float]] = None, calculator_cpu_seconds: int = 2,
+                 calculator_memory_mb: int = 256):
+        """
+        Initialize the ToolExecutor.
+
+        Args:
+            max_threads (int): Maximum number of tool calls running on threads at once.
+            calculator_processes (int): Number of calculator worker processes, started on first use.
+            timeouts (Optional[Dict[str, float]]): Seconds allowed per tool, overriding DEFAULT_TIMEOUTS.
+            calculator_cpu_seconds (int): CPU seconds a calculator worker may spend on one query.
+            calculator_memory_mb (int): Memory a calculator worker may allocate, in megabytes.
+        """
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.calculator_cpu_seconds = calculator_cpu_seconds
+        self.calculator_memory_bytes = calculator_memory_mb * 1024 * 1024
+        self._threads = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="tool")
+        self._thread_slots = threading.BoundedSemaphore(max_threads)
+        self._calculator_processes = calculator_processes
+        self._idle_calculators: Optional[queue.Queue] = None
+        self._missing_calculators = 0
+        self._calculators_lock = threading.Lock()
+        # Workers are started while other threads may hold locks, so they must not be forked
+        # from this process: a forkserver forks them from a clean single-threaded one instead
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload([__name__])
+        else:
+            self._context = multiprocessing.get_context("spawn")
+
+    def _timeout(self, tool: str) -> float:
+        """Seconds allowed for one call of `tool`."""
+        return self.timeouts.get(tool, max(DEFAULT_TIMEOUTS.values()))
+
+    def _new_calculator(self) -> _CalculatorProcess:
+        """Start a calculator worker process."""
+        return _CalculatorProcess(self._context, self.calculator_cpu_seconds, self.calculator_memory_bytes)
+
+    def _calculators(self) -> queue.Queue:
+        """The idle calculator workers, starting them on first use and replacing any that failed to start."""
+        with self._calculators_lock:
+            if self._idle_calculators is None:
+                self._idle_calculators = queue.Queue()
+                self._missing_calculators = self._calculator_processes
+            while self._missing_calculators:
+                try:
+                    self._idle_calculators.put(self._new_calculator())
+                except Exception as e:
+                    logger.error(f"Could not start a calculator worker: {e}")
+                    break
+                self._missing_calculators -= 1
+            return self._idle_calculators
+
+    def _replace_calculator(self, worker: _CalculatorProcess):
+        """Kill a worker and return a fresh one to the pool, or leave it to the next call if none can start."""
+        worker.kill()
+        try:
+            worker = self._new_calculator()
+        except Exception as e:
+            logger.error(f"Could not restart a calculator worker: {e}")
+            with self._calculators_lock:
+                self._missing_calculators += 1
+            return
+        self._calculators().put(worker)
+
+    def calculate(self, query: str) -> Dict[str, Any]:
+        """
+        Evaluate a calculator query in a worker process.
+
+        Args:
+            query (str): Calculator query.
+
+        Returns:
+            Dict[str, Any]: The CalculatorTool result, or an error result if the query ran out of
+                time or exceeded the worker's limits.
+        """
+        timeout = self._timeout("calculator")
+        # Starting the workers doesn't count against the query's time
+        idle = self._calculators()
+        with self._calculators_lock:
+            unavailable = self._missing_calculators == self._calculator_processes
+        if unavailable:
+            return _error_result("calculator", "The calculator is unavailable, please try again later")
+        start = time.perf_counter()
+        try:
+            worker = idle.get(timeout=timeout)
+        except queue.Empty:
+            metrics.count("tool_calculator_timeouts")
+            return _error_result("calculator", "The calculator is busy, please try again")
+
+        # A worker that timed out is still busy with the query; it is replaced like a dead one
+        replace = True
+        try:
+            result = worker.evaluate(query, timeout - (time.perf_counter() - start))
+            if result is None:
+                metrics.count("tool_calculator_timeouts")
+                logger.warning(f"Calculator timed out after {timeout:g}s on: {query}")
+                result = _error_result("calculator", f"The calculation took longer than {timeout:g} seconds")
+            else:
+                replace = False
+        except (EOFError, OSError):
+            exitcode = worker.exitcode()
+            if exitcode in _LIMIT_EXIT_CODES:
+                logger.warning(f"Calculator worker exceeded its limits on: {query}")
+                result = _error_result("calculator", "The calculation exceeded its CPU or memory limit")
+            else:
+                logger.error(f"Calculator worker failed with exit code {exitcode} on: {query}")
+                result = _error_result("calculator", "The calculator worker failed")
+
+        if replace:
+            self._replace_calculator(worker)
+        else:
+            idle.put(worker)
+        metrics.record("tool_calculator", time.perf_counter() - start)
+        return result
+
+    def run(self, tool: str, fn: Callable[[str], Dict[str, Any]], query: str) -> Dict[str, Any]:
+        """
+        Run a tool call on the thread pool, giving up after the tool's timeout.
+
+        A call that times out keeps its thread until it returns, but the caller gets an
+        error result straight away.
+
+        Args:
+            tool (str): Tool name, e.g. "dictionary", selecting the timeout.
+            fn (Callable[[str], Dict[str, Any]]): The tool's run method.
+            query (str): Query passed to `fn`.
+
+        Returns:
+            Dict[str, Any]: The tool result, or an error result if it didn't finish in time.
+        """
+        timeout = self._timeout(tool)
+        start = time.perf_counter()
+        if not self._thread_slots.acquire(timeout=timeout):
+            metrics.count(f"tool_{tool}_timeouts")
+            return _error_result(tool, f"The {tool} is busy, please try again")
+
+        future = metrics.submit(self._threads, fn, query)
+        future.add_done_callback(lambda _: self._thread_slots.release())
+        try:
+            return future.result(timeout=timeout - (time.perf_counter() - start))
+        except FutureTimeoutError:
+            future.cancel()
+            metrics.count(f"tool_{tool}_timeouts")
+            logger.warning(f"The {tool} tool timed out after {timeout:g}s on: {query}")
+            return _error_result(tool, f"The {tool} took longer than {timeout:g} seconds")
+        finally:
+            metrics.record(f"tool_{tool}", time.perf_counter() - start)
+
+    def shutdown(self):
+        """Stop the worker processes and threads."""
+        self._threads.shutdown(wait=False)
+        with self._calculators_lock:
+            idle, self._idle_calculators = self._idle_calculators, None
+        while idle is not None and not idle.empty():
+            idle.get_nowait().kill()
@@ -1,8 +1,135 @@
+import os
 import re
+import ast
 import math
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
 import requests
 import wikipedia
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .encyclopedia import DEFAULT_INDEX_PATH, LocalEncyclopedia
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Functions and constants a calculator expression may use, by name or as math.<name>
+MATH_FUNCTIONS = {
+    name: getattr(math, name) for name in (
+        "sqrt", "exp", "log", "log10", "log2", "sin", "cos", "tan", "asin", "acos", "atan",
+        "sinh", "cosh", "tanh", "floor", "ceil", "fabs", "factorial", "radians", "degrees", "hypot"
+    )
+}
+MATH_FUNCTIONS.update({"abs": abs, "pow": pow, "round": round, "min": min, "max": max})
+MATH_CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+# The same names evaluated element-wise over NumPy arrays
+ARRAY_FUNCTIONS = {
+    "sqrt": np.sqrt, "exp": np.exp, "log": np.log, "log10": np.log10, "log2": np.log2,
+    "sin": np.sin, "cos": np.cos, "tan": np.tan, "asin": np.arcsin, "acos": np.arccos, "atan": np.arctan,
+    "sinh": np.sinh, "cosh": np.cosh, "tanh": np.tanh, "floor": np.floor, "ceil": np.ceil,
+    "fabs": np.fabs, "radians": np.radians, "degrees": np.degrees, "hypot": np.hypot,
+    "abs": np.abs, "pow": np.power, "round": np.round, "min": np.minimum, "max": np.maximum
+}
+
+BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+UNARY_OPERATORS = (ast.UAdd, ast.USub)
+
+
+class _ExpressionValidator(ast.NodeTransformer):
+    """Rejects anything but arithmetic on numbers, whitelisted names and calls; rewrites math.f to f."""
+
+    def __init__(self, variables: Tuple[str, ...], functions: Dict[str, Any]):
+        self.functions = functions
+        self.allowed_names = set(functions) | set(MATH_CONSTANTS) | set(variables)
+
+    def generic_visit(self, node):
+        if not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name,
+                                 ast.Call, ast.Attribute, ast.Load) + BINARY_OPERATORS + UNARY_OPERATORS):
+            raise ValueError(f"Unsupported syntax in expression: {type(node).__name__}")
+        return super().generic_visit(node)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ValueError(f"Unsupported constant in expression: {node.value!r}")
+        return node
+
+    def visit_Name(self, node):
+        if node.id not in self.allowed_names:
+            raise ValueError(f"Unknown name in expression: {node.id}")
+        return node
+
+    def visit_Attribute(self, node):
+        # math.sqrt(...) and friends, as produced by _normalize_expression
+        if not (isinstance(node.value, ast.Name) and node.value.id == "math"
+                and (node.attr in self.functions or node.attr in MATH_CONSTANTS)):
+            raise ValueError("Only math functions and constants may be accessed as attributes")
+        return ast.copy_location(ast.Name(id=node.attr, ctx=ast.Load()), node)
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, (ast.Name, ast.Attribute)) or node.keywords:
+            raise ValueError("Only plain calls to math functions are allowed")
+        node = self.generic_visit(node)
+        if node.func.id not in self.functions:
+            raise ValueError(f"Unknown function in expression: {node.func.id}")
+        return node
+
+
+@lru_cache(maxsize=4096)
+def compile_expression(expression: str, variables: Tuple[str, ...] = (), arrays: bool = False):
+    """
+    Parse an arithmetic expression once into a restricted, compiled form.
+
+    Only numbers, arithmetic operators, the functions in MATH_FUNCTIONS (ARRAY_FUNCTIONS
+    with `arrays`), the constants in MATH_CONSTANTS (optionally prefixed with "math.")
+    and the given variable names are accepted. Results are cached, so repeated
+    expressions skip parsing entirely.
+
+    Args:
+        expression (str): Expression such as "2 * math.sqrt(16) + 1".
+        variables (Tuple[str, ...]): Names the expression may use as inputs.
+        arrays (bool): Only accept functions that can be evaluated element-wise over NumPy arrays.
+
+    Returns:
+        code: Code object to evaluate with `evaluate_expression`.
+
+    Raises:
+        ValueError: If the expression is not valid arithmetic or uses anything not whitelisted.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression: {expression}") from e
+    functions = ARRAY_FUNCTIONS if arrays else MATH_FUNCTIONS
+    tree = ast.fix_missing_locations(_ExpressionValidator(variables, functions).visit(tree))
+    return compile(tree, "<calculator>", "eval")
+
+
+def evaluate_expression(expression: str, arrays: bool = False, **variables) -> Union[float, np.ndarray]:
+    """
+    Evaluate an arithmetic expression safely.
+
+    Args:
+        expression (str): Expression to evaluate.
+        arrays (bool): Evaluate element-wise over NumPy arrays passed as variables.
+        **variables: Values for the variable names used in the expression.
+
+    Returns:
+        Union[float, np.ndarray]: The value of the expression.
+    """
+    code = compile_expression(expression, tuple(sorted(variables)), arrays)
+    namespace = dict(ARRAY_FUNCTIONS if arrays else MATH_FUNCTIONS)
+    namespace.update(MATH_CONSTANTS)
+    namespace.update(variables)
+    return eval(code, {"__builtins__": {}}, namespace)
 
 
 class CalculatorTool:
@@ -68,25 +195,180 @@ class CalculatorTool:
         return expression
     
     def _safe_eval(self, expression: str) -> float:
-        """Safely evaluate a mathematical expression."""
-        # List of allowed names for evaluation
-        allowed_names = {
-            'math': math,
-            'abs': abs,
-            'pow': pow,
-            'round': round
-        }
+        """Safely evaluate a mathematical expression through its cached, whitelisted compiled form."""
+        return evaluate_expression(expression)
+    
+    def run_batch(self, queries: List[str]) -> List[Dict[str, Any]]:
+        """
+        Evaluate many calculator queries in one call.
         
-        # Evaluate the expression with limited built-in functions
-        return eval(expression, {"__builtins__": {}}, allowed_names)
+        Repeated queries are evaluated once, and queries sharing an expression reuse its compiled form.
+        
+        Args:
+            queries (List[str]): Queries or expressions to evaluate.
+            
+        Returns:
+            List[Dict[str, Any]]: One result dictionary per query, as returned by `run`.
+        """
+        results = {}
+        outputs = []
+        for query in queries:
+            if query not in results:
+                results[query] = self.run(query)
+            outputs.append(dict(results[query]))
+        return outputs
+    
+    def evaluate_array(self, expression: str, **arrays) -> np.ndarray:
+        """
+        Evaluate one expression element-wise over NumPy arrays in a single call.
+        
+        Args:
+            expression (str): Expression using the names of `arrays`, e.g. "sqrt(x) + y * 2".
+            **arrays: Arrays (or scalars) for the names used in the expression.
+            
+        Returns:
+            np.ndarray: The element-wise result.
+            
+        Raises:
+            ValueError: If the expression is not valid or uses anything not whitelisted.
+        """
+        arrays = {name: np.asarray(value, dtype=float) for name, value in arrays.items()}
+        return evaluate_expression(self._normalize_expression(expression), arrays=True, **arrays)
+
+
+class DefinitionCache:
+    """
+    Persistent cache of dictionary lookups, keyed by normalized term.
+    
+    Definitions and definite misses (no such page, unresolvable disambiguation) are
+    kept with separate time-to-live values, and the least recently used entries are
+    evicted beyond `max_entries`. Entries live in a SQLite database in WAL mode, so
+    every thread and process on the host (e.g. several Streamlit sessions) shares it.
+    """
+    
+    def __init__(self, path: Optional[str] = None, success_ttl: float = 30 * 24 * 3600,
+                 failure_ttl: float = 24 * 3600, max_entries: int = 10000):
+        """
+        Initialize the DefinitionCache.
+        
+        Args:
+            path (Optional[str]): Database file. Defaults to DICTIONARY_CACHE_FILE or a file
+                in the temp directory.
+            success_ttl (float): Seconds a definition is reused.
+            failure_ttl (float): Seconds a miss is remembered before Wikipedia is asked again.
+            max_entries (int): Maximum number of cached terms.
+        """
+        self.path = path or os.getenv("DICTIONARY_CACHE_FILE") or os.path.join(
+            tempfile.gettempdir(), "rag_qa_dictionary_cache.db")
+        self.success_ttl = success_ttl
+        self.failure_ttl = failure_ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS definitions (
+                term TEXT PRIMARY KEY, result TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS definitions_last_used ON definitions (last_used)")
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Autocommit mode; writers wait up to 10 seconds for each other
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            self._local.connection = connection
+        return connection
+    
+    @staticmethod
+    def _key(term: str) -> str:
+        """Normalize a term so that case and spacing variants share an entry."""
+        return " ".join(term.lower().split())
+    
+    def get(self, term: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached result for a term, if it hasn't expired.
+        
+        Args:
+            term (str): Term being defined.
+            
+        Returns:
+            Optional[Dict[str, Any]]: The cached result dictionary, or None.
+        """
+        key, now = self._key(term), time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT result FROM definitions WHERE term = ? AND expires_at > ?",
+                                     (key, now)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE definitions SET last_used = ? WHERE term = ?", (now, key))
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            logger.warning(f"Dictionary cache read failed for '{term}': {e}")
+            return None
+    
+    def put(self, term: str, result: Dict[str, Any]):
+        """
+        Cache the result of a lookup.
+        
+        Args:
+            term (str): Term being defined.
+            result (Dict[str, Any]): Result dictionary; its status selects the time-to-live.
+        """
+        key, now = self._key(term), time.time()
+        ttl = self.success_ttl if result.get("status") == "success" else self.failure_ttl
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute("INSERT OR REPLACE INTO definitions VALUES (?, ?, ?, ?)",
+                                   (key, json.dumps(result), now + ttl, now))
+                connection.execute("DELETE FROM definitions WHERE expires_at <= ?", (now,))
+                connection.execute("""
+                    DELETE FROM definitions WHERE term IN (
+                        SELECT term FROM definitions ORDER BY last_used DESC LIMIT -1 OFFSET ?)
+                """, (self.max_entries,))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Dictionary cache write failed for '{term}': {e}")
 
 
 class DictionaryTool:
     """A tool that provides definitions for words and concepts."""
     
+    def __init__(self, encyclopedia_path: Optional[str] = None, use_network: bool = True,
+                 use_cache: bool = True):
+        """
+        Initialize the DictionaryTool.
+        
+        Args:
+            encyclopedia_path (Optional[str]): Local encyclopedia index built with
+                `encyclopedia.build_index`. Defaults to ENCYCLOPEDIA_INDEX or encyclopedia.db
+                in the project root; without an index every lookup goes to Wikipedia.
+            use_network (bool): Fall back to Wikipedia for terms the local index doesn't have.
+            use_cache (bool): Remember Wikipedia lookups in the persistent DefinitionCache.
+        """
+        encyclopedia_path = encyclopedia_path or os.getenv("ENCYCLOPEDIA_INDEX") or DEFAULT_INDEX_PATH
+        self.encyclopedia = LocalEncyclopedia(encyclopedia_path) if os.path.exists(encyclopedia_path) else None
+        self.use_network = use_network
+        self.cache = None
+        if use_cache:
+            try:
+                self.cache = DefinitionCache()
+            except sqlite3.Error as e:
+                logger.warning(f"Dictionary cache unavailable, looking every term up: {e}")
+        if self.encyclopedia:
+            logger.info(f"Using local encyclopedia index {encyclopedia_path}")
+    
     def run(self, query: str) -> Dict[str, Any]:
         """
-        Get the definition of a word or concept using Wikipedia.
+        Get the definition of a word or concept from the local index, or else from Wikipedia.
         
         Args:
             query (str): Word or concept to define.
@@ -104,6 +386,66 @@ class DictionaryTool:
                 "definition": None
             }
         
+        if self.encyclopedia:
+            result = self._local_lookup(term)
+            if result:
+                return result
+        
+        if not self.use_network:
+            return {
+                "status": "error",
+                "error": f"No definition found for '{term}'",
+                "definition": None
+            }
+        
+        return self._wikipedia_lookup(term)
+    
+    def _local_lookup(self, term: str) -> Optional[Dict[str, Any]]:
+        """Look the term up in the local encyclopedia; None if it isn't there."""
+        try:
+            summary = self.encyclopedia.summary(term, sentences=3)
+            if summary:
+                return {
+                    "status": "success",
+                    "term": term,
+                    "definition": summary
+                }
+            
+            # If no exact match found, try searching
+            search_results = self.encyclopedia.search(term, results=1)
+            if search_results:
+                return {
+                    "status": "success",
+                    "term": search_results[0],
+                    "definition": self.encyclopedia.summary(search_results[0], sentences=3),
+                    "note": f"No exact match found. Showing definition for '{search_results[0]}'"
+                }
+        except sqlite3.Error as e:
+            logger.warning(f"Local encyclopedia lookup failed for '{term}': {e}")
+        return None
+    
+    def _wikipedia_lookup(self, term: str) -> Dict[str, Any]:
+        """Look the term up on Wikipedia, or in the definition cache if it was looked up recently."""
+        if self.cache:
+            result = self.cache.get(term)
+            if result is not None:
+                return result
+        
+        result, definitive = self._query_wikipedia(term)
+        
+        # Network failures are not cached, so the next query retries them
+        if self.cache and definitive:
+            self.cache.put(term, result)
+        return result
+    
+    def _query_wikipedia(self, term: str) -> Tuple[Dict[str, Any], bool]:
+        """
+        Look the term up on Wikipedia.
+        
+        Returns:
+            Tuple[Dict[str, Any], bool]: The result dictionary, and whether it is Wikipedia's
+                answer (a definition or a definite miss) rather than a failed request.
+        """
         try:
             # Try to get a Wikipedia summary for the term
             summary = wikipedia.summary(term, sentences=3, auto_suggest=True)
@@ -112,7 +454,7 @@ class DictionaryTool:
                 "status": "success",
                 "term": term,
                 "definition": summary
-            }
+            }, True
         except wikipedia.exceptions.DisambiguationError as e:
             # If there are multiple matches, choose the first option
             try:
@@ -122,13 +464,20 @@ class DictionaryTool:
                     "term": e.options[0],
                     "definition": summary,
                     "note": f"Multiple matches found. Showing definition for '{e.options[0]}'"
-                }
-            except:
+                }, True
+            except (wikipedia.exceptions.PageError, wikipedia.exceptions.DisambiguationError):
                 return {
                     "status": "error",
                     "error": f"Multiple matches found: {', '.join(e.options[:5])}...",
                     "definition": None
-                }
+                }, True
+            except Exception as error:
+                # A failed request, not Wikipedia's answer: don't cache it
+                return {
+                    "status": "error",
+                    "error": str(error),
+                    "definition": None
+                }, False
         except wikipedia.exceptions.PageError:
             # If no exact match found, try searching
             try:
@@ -140,25 +489,25 @@ class DictionaryTool:
                         "term": search_results[0],
                         "definition": summary,
                         "note": f"No exact match found. Showing definition for '{search_results[0]}'"
-                    }
+                    }, True
                 else:
                     return {
                         "status": "error",
                         "error": f"No definition found for '{term}'",
                         "definition": None
-                    }
-            except:
+                    }, True
+            except Exception:
                 return {
                     "status": "error",
                     "error": f"Failed to find definition for '{term}'",
                     "definition": None
-                }
+                }, False
         except Exception as e:
             return {
                 "status": "error",
                 "error": str(e),
                 "definition": None
-            }
+            }, False
     
     def _extract_term(self, query: str) -> str:
         """Extract the term to define from the query."""
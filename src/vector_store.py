@@ -1,8 +1,17 @@
-from typing import List, Tuple
+import os
+import uuid
+import shutil
+import hashlib
+import tempfile
+import faiss
+import numpy as np
+from typing import List, Tuple, Optional
 from langchain.vectorstores import FAISS
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.schema import Document
 
+from . import metrics
+
 
 class VectorStore:
     def __init__(self, embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
@@ -12,28 +21,52 @@ class VectorStore:
         Args:
             embedding_model_name (str): Name of the Hugging Face embedding model to use.
         """
+        self.embedding_model_name = embedding_model_name
         self.embedding_model = HuggingFaceEmbeddings(model_name=embedding_model_name)
         self.vector_store = None
+        # Identifies the index contents; stores loaded from the same files share a version
+        self.index_version: Optional[str] = None
     
-    def create_vector_store(self, documents: List[Document]):
+    def create_vector_store(self, documents: List[Document], embeddings: Optional[List[List[float]]] = None):
         """
         Create a vector store from documents.
         
         Args:
             documents (List[Document]): List of document chunks to index.
+            embeddings (Optional[List[List[float]]]): Embeddings already computed for the documents,
+                in the same order. Defaults to embedding them with the embedding model.
         """
-        self.vector_store = FAISS.from_documents(documents, self.embedding_model)
+        if embeddings is None:
+            self.vector_store = FAISS.from_documents(documents, self.embedding_model)
+        else:
+            self.vector_store = FAISS.from_embeddings(
+                [(doc.page_content, embedding) for doc, embedding in zip(documents, embeddings)],
+                self.embedding_model, metadatas=[doc.metadata for doc in documents])
+        self.index_version = uuid.uuid4().hex
         print(f"Created vector store with {len(documents)} documents")
     
     def save_vector_store(self, path: str):
         """
         Save the vector store to disk.
         
+        The index is written to a temporary directory and its files are moved into
+        place, so readers never see a partial index and the files they replace (which
+        snapshots may hard-link) are left untouched.
+        
         Args:
             path (str): Path to save the vector store.
         """
         if self.vector_store:
-            self.vector_store.save_local(path)
+            path = os.path.abspath(path)
+            os.makedirs(path, exist_ok=True)
+            temp_dir = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=".saving_")
+            try:
+                self.vector_store.save_local(temp_dir)
+                for name in os.listdir(temp_dir):
+                    os.replace(os.path.join(temp_dir, name), os.path.join(path, name))
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            self.index_version = self._fingerprint(path)
             print(f"Saved vector store to {path}")
         else:
             print("No vector store to save")
@@ -46,8 +79,53 @@ class VectorStore:
             path (str): Path to load the vector store from.
         """
         self.vector_store = FAISS.load_local(path, self.embedding_model)
+        self.index_version = self._fingerprint(path)
         print(f"Loaded vector store from {path}")
     
+    def _fingerprint(self, path: str) -> str:
+        """
+        Build a version string for the index files saved at a path.
+        
+        Args:
+            path (str): Directory holding the saved vector store.
+            
+        Returns:
+            str: Hash of the path and the size/modification time of its files.
+        """
+        digest = hashlib.sha1(os.path.abspath(path).encode("utf-8"))
+        for name in sorted(os.listdir(path)):
+            stat = os.stat(os.path.join(path, name))
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        return digest.hexdigest()
+    
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a query with the store's embedding model.
+        
+        Args:
+            query (str): Query text.
+            
+        Returns:
+            List[float]: Query embedding.
+        """
+        with metrics.span("embedding"):
+            return self.embedding_model.embed_query(query)
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed several queries in one batch.
+        
+        Args:
+            queries (List[str]): Query texts.
+            
+        Returns:
+            List[List[float]]: One embedding per query, in order.
+        """
+        if not queries:
+            return []
+        with metrics.span("embedding"):
+            return self.embedding_model.embed_documents(queries)
+    
     def retrieve(self, query: str, top_k: int = 3) -> List[Tuple[Document, float]]:
         """
         Retrieve relevant documents for a query.
@@ -63,5 +141,62 @@ class VectorStore:
             print("No vector store available for retrieval")
             return []
         
-        docs_with_scores = self.vector_store.similarity_search_with_score(query, k=top_k)
-        return docs_with_scores 
\ No newline at end of file
+        return self.retrieve_by_vector(self.embed_query(query), top_k)
+    
+    def retrieve_by_vector(self, embedding: List[float], top_k: int = 3) -> List[Tuple[Document, float]]:
+        """
+        Retrieve relevant documents for an already computed query embedding.
+        
+        Args:
+            embedding (List[float]): Query embedding from `embed_query`.
+            top_k (int): Number of documents to retrieve.
+            
+        Returns:
+            List[Tuple[Document, float]]: List of (document, score) tuples.
+        """
+        if not self.vector_store:
+            print("No vector store available for retrieval")
+            return []
+        
+        with metrics.span("search"):
+            docs_with_scores = self.vector_store.similarity_search_with_score_by_vector(embedding, k=top_k)
+        return docs_with_scores
+    
+    def retrieve_batch_by_vectors(self, embeddings: List[List[float]], top_k: int = 3) -> List[List[Tuple[Document, float]]]:
+        """
+        Retrieve relevant documents for several query embeddings with a single index search.
+        
+        Args:
+            embeddings (List[List[float]]): Query embeddings from `embed_queries` or `embed_query`.
+            top_k (int): Number of documents to retrieve per query.
+            
+        Returns:
+            List[List[Tuple[Document, float]]]: (document, score) tuples for each embedding, in order,
+            scored like `retrieve_by_vector`.
+        """
+        if not self.vector_store:
+            print("No vector store available for retrieval")
+            return [[] for _ in embeddings]
+        if not embeddings:
+            return []
+        
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.vector_store._normalize_L2:
+            faiss.normalize_L2(vectors)
+        with metrics.span("search"):
+            scores, indices = self.vector_store.index.search(vectors, top_k)
+        
+        results = []
+        for row_scores, row_indices in zip(scores, indices):
+            docs_with_scores = []
+            for score, index in zip(row_scores, row_indices):
+                if index == -1:
+                    # Fewer than top_k vectors in the index
+                    continue
+                doc_id = self.vector_store.index_to_docstore_id[index]
+                doc = self.vector_store.docstore.search(doc_id)
+                if not isinstance(doc, Document):
+                    raise ValueError(f"Could not find document for id {doc_id}, got {doc}")
+                docs_with_scores.append((doc, float(score)))
+            results.append(docs_with_scores)
+        return results
@@ -4,13 +4,14 @@ import time
 from dotenv import load_dotenv
 import json
 import sys
-import shutil
 
 # Add the current directory to the path so that Python can find our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src.document_loader import DocumentLoader
 from src.vector_store import VectorStore
+from src import metrics
+from src.snapshots import SnapshotStore
 from src.llm_integration import LLMIntegration
 from src.agent import Agent
 
@@ -65,8 +66,10 @@ def main_app():
             saved_files = []
             for uploaded_file in uploaded_files:
                 file_path = os.path.join(data_dir, uploaded_file.name)
-                with open(file_path, "wb") as f:
+                # Replace rather than overwrite, so a half-written upload is never loaded
+                with open(file_path + ".uploading", "wb") as f:
                     f.write(uploaded_file.getbuffer())
+                os.replace(file_path + ".uploading", file_path)
                 
                 file_ext = os.path.splitext(uploaded_file.name)[1].lower()
                 saved_files.append(f"{uploaded_file.name} ({file_ext[1:]} file)")
@@ -98,14 +101,8 @@ def main_app():
                         st.text(doc)
                 
                 if st.button("Clear All Documents"):
-                    # Create backup directory
-                    backup_dir = os.path.join(os.path.dirname(data_dir), "data_backup")
-                    os.makedirs(backup_dir, exist_ok=True)
-                    
-                    # Copy files to backup
-                    for doc in docs:
-                        shutil.copy(os.path.join(data_dir, doc), 
-                                os.path.join(backup_dir, doc))
+                    # Snapshot the documents first; they are copied, since users may edit them in place
+                    snapshot_id = SnapshotStore().create(data_dir, label="before Clear All Documents", files=docs)
                     
                     # Clear data directory
                     for doc in docs:
@@ -113,7 +110,7 @@ def main_app():
                     
                     st.session_state.documents_uploaded = False
                     st.session_state.vector_store_initialized = False
-                    st.success(f"Cleared {len(docs)} documents. Documents backed up to data_backup directory.")
+                    st.success(f"Cleared {len(docs)} documents. Restore them with: python main.py --restore {snapshot_id}")
             else:
                 st.text("No documents in the data directory.")
 
@@ -193,6 +190,14 @@ def main_app():
         st.sidebar.info(f"Documents: {len(docs)} total ({len(text_docs)} text, {len(pdf_docs)} PDF)")
     else:
         st.sidebar.error("Status: Not Initialized")
+    
+    # Latency percentiles of the queries answered by this server process
+    latency = metrics.latency_summary()
+    if latency:
+        with st.sidebar.expander("Latency (ms)"):
+            st.table([{"stage": stage, "count": stats["count"], "p50": round(stats["p50"] * 1000, 1),
+                       "p95": round(stats["p95"] * 1000, 1), "p99": round(stats["p99"] * 1000, 1)}
+                      for stage, stats in latency.items()])
 
     st.sidebar.markdown("---")
     st.sidebar.markdown("### Instructions")
@@ -217,22 +222,24 @@ def main_app():
         else:
             # Create a placeholder for the spinning animation
             with st.status("Processing your question...") as status:
-                # Process the query using the agent
-                result = st.session_state.agent.process_query(query)
-                
-                # Add to history
-                st.session_state.history.append({
-                    "query": query,
-                    "result": result,
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-                })
+                # Route and retrieve; the answer itself is streamed below
+                result = st.session_state.agent.process_query_stream(query)
                 
                 # Mark as complete
                 status.update(label="Processing complete!", state="complete", expanded=False)
             
-            # Display the result
+            # Display the answer as it is generated
             st.markdown("### Answer")
-            st.write(result["answer"])
+            result["answer"] = st.write_stream(result.pop("answer_stream"))
+            if result.get("degraded"):
+                st.warning("LLM temporarily unavailable: showing retrieved documents only.")
+            
+            # Add to history
+            st.session_state.history.append({
+                "query": query,
+                "result": result,
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+            })
             
             # Show workflow information
             st.markdown("### Workflow Information")
@@ -241,6 +248,14 @@ def main_app():
                 st.info(f"Workflow: {result['workflow'].capitalize()}")
             with workflow_col2:
                 st.info(f"Query: {result['query']}")
+            if "context_stats" in result:
+                stats = result["context_stats"]
+                st.caption(f"Context: {stats['packed_tokens']} tokens "
+                           f"(saved {stats['tokens_saved']} of {stats['original_tokens']})")
+            if result.get("timings"):
+                st.caption("Timings: " + ", ".join(
+                    f"{name} {value * 1000:.0f} ms" if isinstance(value, float) else f"{name} {value}"
+                    for name, value in result["timings"].items()))
             
             # Show retrieved documents for RAG workflow
             if result["workflow"] == "rag" and "retrieved_docs" in result:
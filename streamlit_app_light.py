@@ -3,7 +3,6 @@ import streamlit as st
 import time
 from dotenv import load_dotenv
 import sys
-import shutil
 import re
 
 # Add the current directory to the path so that Python can find our modules
@@ -11,6 +10,8 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src.document_loader import DocumentLoader
 from src.vector_store import VectorStore
+from src import metrics
+from src.snapshots import SnapshotStore
 
 # Load environment variables
 load_dotenv()
@@ -63,8 +64,10 @@ def main_app():
             saved_files = []
             for uploaded_file in uploaded_files:
                 file_path = os.path.join(data_dir, uploaded_file.name)
-                with open(file_path, "wb") as f:
+                # Replace rather than overwrite, so a half-written upload is never loaded
+                with open(file_path + ".uploading", "wb") as f:
                     f.write(uploaded_file.getbuffer())
+                os.replace(file_path + ".uploading", file_path)
                 
                 file_ext = os.path.splitext(uploaded_file.name)[1].lower()
                 saved_files.append(f"{uploaded_file.name} ({file_ext[1:]} file)")
@@ -96,14 +99,8 @@ def main_app():
                         st.text(doc)
                 
                 if st.button("Clear All Documents"):
-                    # Create backup directory
-                    backup_dir = os.path.join(os.path.dirname(data_dir), "data_backup")
-                    os.makedirs(backup_dir, exist_ok=True)
-                    
-                    # Copy files to backup
-                    for doc in docs:
-                        shutil.copy(os.path.join(data_dir, doc), 
-                                  os.path.join(backup_dir, doc))
+                    # Snapshot the documents first; they are copied, since users may edit them in place
+                    snapshot_id = SnapshotStore().create(data_dir, label="before Clear All Documents", files=docs)
                     
                     # Clear data directory
                     for doc in docs:
@@ -111,7 +108,7 @@ def main_app():
                     
                     st.session_state.documents_uploaded = False
                     st.session_state.vector_store_initialized = False
-                    st.success(f"Cleared {len(docs)} documents. Documents backed up to data_backup directory.")
+                    st.success(f"Cleared {len(docs)} documents. Restore them with: python main.py --restore {snapshot_id}")
             else:
                 st.text("No documents in the data directory.")
 
@@ -167,6 +164,14 @@ def main_app():
         st.sidebar.info(f"Documents: {len(docs)} total ({len(text_docs)} text, {len(pdf_docs)} PDF)")
     else:
         st.sidebar.error("Status: Not Initialized")
+    
+    # Latency percentiles of the queries answered by this server process
+    latency = metrics.latency_summary()
+    if latency:
+        with st.sidebar.expander("Latency (ms)"):
+            st.table([{"stage": stage, "count": stats["count"], "p50": round(stats["p50"] * 1000, 1),
+                       "p95": round(stats["p95"] * 1000, 1), "p99": round(stats["p99"] * 1000, 1)}
+                      for stage, stats in latency.items()])
 
     st.sidebar.markdown("---")
     st.sidebar.markdown("### Instructions")